@@ -5,10 +5,17 @@ from common.enums import BI_DIR, BI_TYPE, DATA_FIELD, FX_TYPE, MACD_ALGO
 from common.chan_exception import ChanException, ErrCode
 from kline.kline import KLine
 from kline.kline_unit import KLineUnit
+from kline.metric_index import MACD_HALF_PARTS, MACD_PART, MACD_SUM_PART, RSI_PART, KLUMetricIndex
 
 
 class Bi:
-    def __init__(self, begin_klc: KLine, end_klc: KLine, idx: int, is_sure: bool):
+    __slots__ = (
+        "__dir", "__idx", "__type", "__begin_klc", "__end_klc", "__is_sure", "__sure_end", "__seg_idx",
+        "parent_seg", "bsp", "next", "pre", "metric_index", "_memoize_cache",
+    )
+
+
+    def __init__(self, begin_klc: KLine, end_klc: KLine, idx: int, is_sure: bool, metric_index: Optional[KLUMetricIndex] = None):
         # self.__begin_klc = begin_klc
         # self.__end_klc = end_klc
         self.__dir = None
@@ -31,8 +38,10 @@ class Bi:
         self.next: Optional[Bi] = None
         self.pre: Optional[Bi] = None
 
+        self.metric_index = metric_index  # 有则背驰指标用前缀和/区间最值计算
+
     def clean_cache(self):
-        self._memoize_cache = {}
+        self._memoize_cache = None
 
     @property
     def begin_klc(self): return self.__begin_klc
@@ -205,8 +214,26 @@ class Bi:
         else:
             raise ChanException(f"unsupport macd_algo={macd_algo}, should be one of area/full_area/peak/diff/slope/amp", ErrCode.PARA_ERROR)
 
+    def get_metric_index(self, begin_idx: int, end_idx: int, *parts: str) -> Optional[KLUMetricIndex]:
+        if self.metric_index is not None and self.metric_index.covers(begin_idx, end_idx, *parts):
+            return self.metric_index
+        return None
+
+    def klu_idx_range(self):
+        # klc_lst中所有KLU的序号范围
+        return self.begin_klc.lst[0].idx, self.end_klc.lst[-1].idx
+
     @make_cache
     def cal_rsi(self):
+        index = self.get_metric_index(*self.klu_idx_range(), RSI_PART)
+        res = index.rsi_peak(*self.klu_idx_range(), self.is_down()) if index else None
+        if res is None:
+            return self.cal_rsi_legacy()
+        if index.verify:
+            index.check("rsi", res, self.cal_rsi_legacy())
+        return res
+
+    def cal_rsi_legacy(self):
         rsi_lst: List[float] = []
         for klc in self.klc_lst:
             rsi_lst.extend(klu.rsi for klu in klc.lst)
@@ -214,6 +241,16 @@ class Bi:
 
     @make_cache
     def cal_macd_area(self):
+        begin_idx, end_idx = self.get_begin_klu().idx, self.get_end_klu().idx
+        index = self.get_metric_index(begin_idx, end_idx, MACD_SUM_PART)
+        if index is None:
+            return self.cal_macd_area_legacy()
+        res = index.macd_area(begin_idx, end_idx, self.is_up())
+        if index.verify:
+            index.check("area", res, self.cal_macd_area_legacy())
+        return res
+
+    def cal_macd_area_legacy(self):
         _s = 1e-7
         begin_klu = self.get_begin_klu()
         end_klu = self.get_end_klu()
@@ -227,6 +264,15 @@ class Bi:
 
     @make_cache
     def cal_macd_peak(self):
+        index = self.get_metric_index(*self.klu_idx_range(), MACD_PART)
+        if index is None:
+            return self.cal_macd_peak_legacy()
+        res = index.macd_peak(*self.klu_idx_range(), self.is_up())
+        if index.verify:
+            index.check("peak", res, self.cal_macd_peak_legacy())
+        return res
+
+    def cal_macd_peak_legacy(self):
         peak = 1e-7
         for klc in self.klc_lst:
             for klu in klc.lst:
@@ -245,6 +291,15 @@ class Bi:
 
     @make_cache
     def cal_macd_half_obverse(self):
+        index = self.get_metric_index(*self.klu_idx_range(), *MACD_HALF_PARTS)
+        if index is None:
+            return self.cal_macd_half_obverse_legacy()
+        res = index.macd_half(self.get_begin_klu().idx, *self.klu_idx_range(), is_reverse=False)
+        if index.verify:
+            index.check("half_obverse", res, self.cal_macd_half_obverse_legacy())
+        return res
+
+    def cal_macd_half_obverse_legacy(self):
         _s = 1e-7
         begin_klu = self.get_begin_klu()
         peak_macd = begin_klu.macd.macd
@@ -263,6 +318,15 @@ class Bi:
 
     @make_cache
     def cal_macd_half_reverse(self):
+        index = self.get_metric_index(*self.klu_idx_range(), *MACD_HALF_PARTS)
+        if index is None:
+            return self.cal_macd_half_reverse_legacy()
+        res = index.macd_half(self.get_end_klu().idx, *self.klu_idx_range(), is_reverse=True)
+        if index.verify:
+            index.check("half_reverse", res, self.cal_macd_half_reverse_legacy())
+        return res
+
+    def cal_macd_half_reverse_legacy(self):
         _s = 1e-7
         begin_klu = self.get_end_klu()
         peak_macd = begin_klu.macd.macd
@@ -284,6 +348,15 @@ class Bi:
         """
         macd红绿柱最大值最小值之差
         """
+        index = self.get_metric_index(*self.klu_idx_range(), MACD_PART)
+        if index is None:
+            return self.cal_macd_diff_legacy()
+        res = index.macd_diff(*self.klu_idx_range())
+        if index.verify:
+            index.check("diff", res, self.cal_macd_diff_legacy())
+        return res
+
+    def cal_macd_diff_legacy(self):
         _max, _min = float("-inf"), float("inf")
         for klc in self.klc_lst:
             for klu in klc.lst:
@@ -313,6 +386,16 @@ class Bi:
             return (end_klu.high-begin_klu.low)/begin_klu.low
 
     def cal_macd_trade_metric(self, metric: str, cal_avg=False) -> float:
+        index = self.get_metric_index(*self.klu_idx_range(), metric)
+        if index is None:
+            return self.cal_macd_trade_metric_legacy(metric, cal_avg)
+        _s = index.trade_metric_sum(metric, *self.klu_idx_range())
+        res = _s / self.get_klu_cnt() if cal_avg else _s
+        if index.verify:
+            index.check(metric, res, self.cal_macd_trade_metric_legacy(metric, cal_avg))
+        return res
+
+    def cal_macd_trade_metric_legacy(self, metric: str, cal_avg=False) -> float:
         _s = 0
         for klc in self.klc_lst:
             for klu in klc.lst:
@@ -1,12 +1,18 @@
 from typing import List, Optional, Union, overload
 
 from common.enums import FX_TYPE, KLINE_DIR
+from common.line_range import LineRange
+from common.range_extreme import RangeExtreme
 from kline.kline import KLine
+from kline.metric_index import KLUMetricIndex
 
 from .bi import Bi
 from .bi_config import BiConfig
 
 
+PEAK_SCAN_LEN = 16  # 区间较短时直接遍历比查线段树快
+
+
 class BiList:
     def __init__(self, bi_conf=BiConfig()):
         self.bi_list: List[Bi] = []
@@ -14,6 +20,8 @@ class BiList:
         self.config = bi_conf
 
         self.free_klc_lst = []  # 仅仅用作第一笔未画出来之前的缓存，为了获得更精准的结果而已，不加这块逻辑其实对后续计算没太大影响
+        self.klc_range: Optional[RangeExtreme] = None  # 合并K线高低点的区间索引，由KLineList维护
+        self.metric_index: Optional[KLUMetricIndex] = None  # KLU指标前缀和，由KLineList维护，传给每一笔
 
     def __str__(self):
         return "\n".join([str(bi) for bi in self.bi_list])
@@ -33,6 +41,10 @@ class BiList:
     def __len__(self):
         return len(self.bi_list)
 
+    def range_view(self, begin: Optional[int] = None, end: Optional[int] = None, step: Optional[int] = None) -> LineRange[Bi]:
+        # 元素和self[begin:end:step]相同，但不复制列表
+        return LineRange.from_slice(self.bi_list, begin, end, step)
+
     def try_create_first_bi(self, klc: KLine) -> bool:
         for exist_free_klc in self.free_klc_lst:
             if exist_free_klc.fx == klc.fx:
@@ -62,7 +74,7 @@ class BiList:
             return False
         if self.bi_list[-1].is_up() and klc.low > self.bi_list[-1].get_begin_val():
             return False
-        if not end_is_peak(self.bi_list[-2].begin_klc, klc):
+        if not end_is_peak(self.bi_list[-2].begin_klc, klc, self.klc_range):
             return False
         if self[-1].is_down() and self[-1].get_end_val() < self[-2].get_begin_val():
             return False
@@ -141,7 +153,7 @@ class BiList:
         return False
 
     def add_new_bi(self, pre_klc, cur_klc, is_sure=True):
-        self.bi_list.append(Bi(pre_klc, cur_klc, idx=len(self.bi_list), is_sure=is_sure))
+        self.bi_list.append(Bi(pre_klc, cur_klc, idx=len(self.bi_list), is_sure=is_sure, metric_index=self.metric_index))
         if len(self.bi_list) >= 2:
             self.bi_list[-2].next = self.bi_list[-1]
             self.bi_list[-1].pre = self.bi_list[-2]
@@ -150,6 +162,8 @@ class BiList:
         bi_span = self.get_klc_span(klc, last_end)
         if self.config.is_strict:
             return bi_span >= 4
+        if bi_span >= 3 and klc.idx - last_end.idx >= 4:  # 中间至少3根合并K线，单位K线数肯定够
+            return True
         uint_kl_cnt = 0
         tmp_klc = last_end.next
         while tmp_klc:
@@ -181,7 +195,7 @@ class BiList:
             return False
         if not last_end.check_fx_valid(klc, self.config.bi_fx_check, for_virtual):
             return False
-        if self.config.bi_end_is_peak and not end_is_peak(last_end, klc):
+        if self.config.bi_end_is_peak and not end_is_peak(last_end, klc, self.klc_range):
             return False
         return True
 
@@ -213,7 +227,14 @@ class BiList:
         return self.bi_list[-1].get_end_klu().idx if len(self) > 0 else None
 
 
-def end_is_peak(last_end: KLine, cur_end: KLine) -> bool:
+def end_is_peak(last_end: KLine, cur_end: KLine, klc_range: Optional[RangeExtreme] = None) -> bool:
+    # 两端之间的合并K线没有超过cur_end的高/低点
+    if klc_range is not None and cur_end.idx - last_end.idx > PEAK_SCAN_LEN:
+        if last_end.fx == FX_TYPE.BOTTOM:
+            return klc_range.query_max(last_end.idx+1, cur_end.idx) <= cur_end.high
+        elif last_end.fx == FX_TYPE.TOP:
+            return klc_range.query_min(last_end.idx+1, cur_end.idx) >= cur_end.low
+        return True
     if last_end.fx == FX_TYPE.BOTTOM:
         cmp_thred = cur_end.high  # 或者严格点选择get_klu_max_high()
         klc = last_end.get_next()
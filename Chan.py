@@ -3,9 +3,10 @@ import datetime
 import pickle
 import sys
 from collections import defaultdict
-from typing import Dict, Iterable, List, Optional, Union
+from typing import Callable, Dict, Iterable, List, Optional, Union
 
 from buy_sell_point.bs_point import BSPoint
+from buy_sell_point.bsp_event import BSPEvent
 from chan_config import ChanConfig
 from common.enums import AUTYPE, DATA_SRC, KL_TYPE
 from common.chan_exception import ChanException, ErrCode
@@ -46,6 +47,9 @@ class Chan:
 
         self.g_kl_iter = defaultdict(list)
 
+        self.bsp_event_handler: Optional[Callable[[BSPEvent], None]] = None
+        self.bsp_event_lst: List[BSPEvent] = []  # subscribe_bsp_event不传回调时缓存在这里
+
         self.do_init()
 
         if not config.trigger_step:
@@ -65,7 +69,9 @@ class Chan:
         obj.conf = copy.deepcopy(self.conf, memo)
         obj.kl_misalign_cnt = self.kl_misalign_cnt
         obj.kl_inconsistent_detail = copy.deepcopy(self.kl_inconsistent_detail, memo)
-        obj.g_kl_iter = copy.deepcopy(self.g_kl_iter, memo)
+        obj.g_kl_iter = defaultdict(list)  # 数据源迭代器可能是生成器，不能复制；复制出的对象可以继续trigger_load
+        obj.bsp_event_handler = None  # 回调不复制，需要时对新对象重新subscribe_bsp_event
+        obj.bsp_event_lst = []
         if hasattr(self, 'klu_cache'):
             obj.klu_cache = copy.deepcopy(self.klu_cache, memo)
         if hasattr(self, 'klu_last_t'):
@@ -82,10 +88,41 @@ class Chan:
                     memo[id(klu)].sub_kl_list = [memo[id(sub_kl)] for sub_kl in klu.sub_kl_list]
         return obj
 
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["bsp_event_handler"] = None
+        state["bsp_event_lst"] = []
+        state["g_kl_iter"] = defaultdict(list)  # 数据源迭代器可能是生成器，不能序列化；trigger_load时每次调用后都已耗尽
+        return state
+
     def do_init(self):
         self.kl_datas: Dict[KL_TYPE, KLineList] = {}
         for idx in range(len(self.lv_list)):
             self.kl_datas[self.lv_list[idx]] = KLineList(self.lv_list[idx], conf=self.conf)
+            if self.bsp_event_handler is not None:
+                self.kl_datas[self.lv_list[idx]].set_bsp_event_handler(self.bsp_event_handler)
+        self.bsp_event_lst.clear()
+
+    def subscribe_bsp_event(self, handler: Optional[Callable[[BSPEvent], None]] = None):
+        """
+        买卖点新增/增加类型/失效/确定时产生BSPEvent，在step_load/trigger_load之前调用
+        传入handler则每个事件立即回调，否则缓存起来，由pop_bsp_events取走
+        """
+        self.bsp_event_handler = handler if handler is not None else self.bsp_event_lst.append
+        for kl_list in self.kl_datas.values():
+            kl_list.set_bsp_event_handler(self.bsp_event_handler)
+
+    def unsubscribe_bsp_event(self):
+        self.bsp_event_handler = None
+        self.bsp_event_lst.clear()
+        for kl_list in self.kl_datas.values():
+            kl_list.set_bsp_event_handler(None)
+
+    def pop_bsp_events(self) -> List[BSPEvent]:
+        # 取走上次调用以来缓存的事件，按发生顺序
+        event_lst = self.bsp_event_lst[:]
+        self.bsp_event_lst.clear()
+        return event_lst
 
     def load_stock_data(self, stockapi_instance: CommonStockApi, lv) -> Iterable[KLineUnit]:
         for KLU_IDX, klu in enumerate(stockapi_instance.get_kl_data()):
@@ -121,14 +158,25 @@ class Chan:
         assert self.conf.trigger_step
         self.do_init()  # 清空数据，防止再次重跑没有数据
         yielded = False  # 是否曾经返回过结果
+        batch_skip = self.conf.skip_step_batch and self.conf.skip_step > 0
+        if batch_skip:
+            self.set_step_calculation(False)
         for idx, snapshot in enumerate(self.load(self.conf.trigger_step)):
             if idx < self.conf.skip_step:
+                if batch_skip and idx == self.conf.skip_step - 1:
+                    self.set_step_calculation(True)
                 continue
             yield snapshot
             yielded = True
         if not yielded:
+            if batch_skip:
+                self.set_step_calculation(True)  # K线数不足skip_step
             yield self
 
+    def set_step_calculation(self, step_calculation: bool):
+        for lv in self.lv_list:
+            self.kl_datas[lv].set_step_calculation(step_calculation)
+
     def trigger_load(self, inp):
         # {type: [klu, ...]}
         if not hasattr(self, 'klu_cache'):
@@ -144,7 +192,7 @@ class Chan:
                 klu.kl_type = lv
             assert isinstance(inp[lv], list)
             self.add_lv_iter(lv, iter(inp[lv]))
-        for _ in self.load_iterator(lv_idx=0, parent_klu=None, step=False):
+        for _ in self.get_load_iterator(step=False):
             ...
         if not self.conf.trigger_step:  # 非回放模式全部算完之后才算一次中枢和线段
             for lv in self.lv_list:
@@ -182,6 +230,9 @@ class Chan:
         elif self.data_src == DATA_SRC.FUTU:
             from data_api.futu_api import FutuApi
             _dict[DATA_SRC.FUTU] = FutuApi
+        elif self.data_src == DATA_SRC.LOCAL_CACHE:
+            from data_api.local_cache_api import LocalCacheApi
+            _dict[DATA_SRC.LOCAL_CACHE] = LocalCacheApi
         if self.data_src in _dict:
             return _dict[self.data_src]
         assert isinstance(self.data_src, str)
@@ -201,7 +252,7 @@ class Chan:
             self.klu_cache: List[Optional[KLineUnit]] = [None for _ in self.lv_list]
             self.klu_last_t = [CTime(1980, 1, 1, 0, 0) for _ in self.lv_list]
 
-            yield from self.load_iterator(lv_idx=0, parent_klu=None, step=step)  # 计算入口
+            yield from self.get_load_iterator(step=step)  # 计算入口
             if not step:  # 非回放模式全部算完之后才算一次中枢和线段
                 for lv in self.lv_list:
                     self.kl_datas[lv].cal_seg_and_zs()
@@ -218,9 +269,9 @@ class Chan:
         parent_klu.add_children(kline_unit)
         kline_unit.set_parent(parent_klu)
 
-    def add_new_kl(self, cur_lv: KL_TYPE, kline_unit):
+    def add_new_kl(self, cur_lv: KL_TYPE, kline_unit) -> KLineUnit:
         try:
-            self.kl_datas[cur_lv].add_single_klu(kline_unit)
+            return self.kl_datas[cur_lv].add_single_klu(kline_unit)
         except Exception:
             if self.conf.print_err_time:
                 print(f"[ERROR-{self.code}]在计算{kline_unit.time}K线时发生错误!")
@@ -234,6 +285,58 @@ class Chan:
         else:
             kline_unit.set_idx(self[lv_idx][-1][-1].idx + 1)
 
+    def get_load_iterator(self, step):
+        if self.conf.iterative_load:
+            return self.multi_lv_load_iterator(step)
+        return self.load_iterator(lv_idx=0, parent_klu=None, step=step)
+
+    def get_next_klu(self, lv_idx) -> Optional[KLineUnit]:
+        # 优先取上次因超过父级别时间而缓存的K线，数据读完返回None
+        if self.klu_cache[lv_idx]:
+            kline_unit = self.klu_cache[lv_idx]
+            self.klu_cache[lv_idx] = None
+            return kline_unit
+        try:
+            kline_unit = self.get_next_lv_klu(lv_idx)
+        except StopIteration:
+            return None
+        self.try_set_klu_idx(lv_idx, kline_unit)
+        if not kline_unit.time > self.klu_last_t[lv_idx]:
+            raise ChanException(f"kline time err, cur={kline_unit.time}, last={self.klu_last_t[lv_idx]}, or refer to quick_guide.md, try set auto=False in the CTime returned by your data source class", ErrCode.KL_NOT_MONOTONOUS)
+        self.klu_last_t[lv_idx] = kline_unit.time
+        return kline_unit
+
+    def multi_lv_load_iterator(self, step):
+        # load_iterator的非递归版本，结果完全一致：
+        # 每个级别一个游标，加入一根K线后下钻到次级别，把时间不超过它的次级别K线都加入后再回到父级别
+        lv_cnt = len(self.lv_list)
+        pre_klu: List[Optional[KLineUnit]] = [self[lv_idx][-1][-1] if len(self[lv_idx]) > 0 and len(self[lv_idx][-1]) > 0 else None for lv_idx in range(lv_cnt)]
+        parent_klu: List[Optional[KLineUnit]] = [None for _ in range(lv_cnt)]  # parent_klu[i]即pre_klu[i-1]
+        lv_idx = 0
+        while lv_idx >= 0:
+            kline_unit = self.get_next_klu(lv_idx)
+            parent = parent_klu[lv_idx]
+            if kline_unit is None or (parent and kline_unit.time > parent.time):
+                if kline_unit is not None:
+                    self.klu_cache[lv_idx] = kline_unit
+                # 当前级别已追上父级别K线，回到父级别
+                lv_idx -= 1
+                if lv_idx >= 0:
+                    self.check_kl_align(parent, lv_idx)
+                    if lv_idx == 0 and step:
+                        yield self
+                continue
+            kline_unit = self.add_new_kl(self.lv_list[lv_idx], kline_unit)
+            kline_unit.set_pre_klu(pre_klu[lv_idx])
+            pre_klu[lv_idx] = kline_unit
+            if parent:
+                self.set_klu_parent_relation(parent, kline_unit, self.lv_list[lv_idx], lv_idx)
+            if lv_idx != lv_cnt-1:
+                lv_idx += 1
+                parent_klu[lv_idx] = kline_unit
+            elif lv_idx == 0 and step:
+                yield self
+
     def load_iterator(self, lv_idx, parent_klu, step):
         # K线时间天级别以下描述的是结束时间，如60M线，每天第一根是10点30的
         # 天以上是当天日期
@@ -257,9 +360,9 @@ class Chan:
             if parent_klu and kline_unit.time > parent_klu.time:
                 self.klu_cache[lv_idx] = kline_unit
                 break
+            kline_unit = self.add_new_kl(cur_lv, kline_unit)
             kline_unit.set_pre_klu(pre_klu)
             pre_klu = kline_unit
-            self.add_new_kl(cur_lv, kline_unit)
             if parent_klu:
                 self.set_klu_parent_relation(parent_klu, kline_unit, cur_lv, lv_idx)
             if lv_idx != len(self.lv_list)-1:
@@ -302,12 +405,23 @@ class Chan:
         assert len(self.lv_list) == 1
         return self[0].bs_point_lst.getSortedBspList()
 
-    def get_latest_bsp(self, idx=None, number=1) -> List[BSPoint]:
-        # number=0则取全部bsp，从最新到最旧排序
+    def get_latest_bsp(self, idx=None, number=1, bs_type=None, is_buy=None) -> List[BSPoint]:
+        # number=0则取全部bsp，从最新到最旧排序；bs_type可以是单个BSP_TYPE或列表，is_buy为None时不区分买卖
         if idx is not None:
-            return self[idx].bs_point_lst.get_latest_bsp(number)
+            return self[idx].bs_point_lst.get_latest_bsp(number, bs_type, is_buy)
         assert len(self.lv_list) == 1
-        return self[0].bs_point_lst.get_latest_bsp(number)
+        return self[0].bs_point_lst.get_latest_bsp(number, bs_type, is_buy)
+
+    def get_profile_report(self) -> Dict[str, Dict[str, dict]]:
+        # 需要开启profile配置，返回{级别: {阶段: {call_cnt, total_time, avg_time, item_cnt, avg_item, 阶段自定义计数}}}
+        if not self.conf.profile:
+            raise ChanException("profile is not enabled in ChanConfig", ErrCode.CONFIG_ERROR)
+        return {lv.name: self.kl_datas[lv].profiler.report() for lv in self.lv_list}
+
+    def reset_profile(self):
+        for lv in self.lv_list:
+            if self.kl_datas[lv].profiler:
+                self.kl_datas[lv].profiler.reset()
 
     def chan_dump_pickle(self, file_path):
         _pre_limit = sys.getrecursionlimit()
@@ -335,6 +449,21 @@ class Chan:
 
         sys.setrecursionlimit(_pre_limit)
 
+    def save_checkpoint(self, file_path):
+        # 保存完整增量状态，Chan.load_checkpoint恢复后可继续trigger_load，见chan_checkpoint.py
+        from chan_checkpoint import save_checkpoint
+        save_checkpoint(self, file_path)
+
+    @staticmethod
+    def load_checkpoint(file_path) -> 'Chan':
+        from chan_checkpoint import load_checkpoint
+        return load_checkpoint(file_path)
+
+    def chan_dump_flat(self, file_path):
+        # 扁平二进制格式，见chan_flat.py；读取用ChanFlat(file_path, lv_list)
+        from chan_flat import dump_chan_flat
+        dump_chan_flat(self, file_path)
+
     @staticmethod
     def chan_load_pickle(file_path) -> 'Chan':
         with open(file_path, "rb") as f:
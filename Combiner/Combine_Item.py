@@ -1,25 +1,42 @@
+from typing import Callable, Dict
+
 from common.chan_exception import ChanException, ErrCode
 
 
+def _read_bi(item):
+    return item.begin_klc.idx, item.end_klc.idx, item._high(), item._low()
+
+
+def _read_klu(item):
+    return item.time, item.time, item.high, item.low
+
+
+def _read_seg(item):
+    return item.start_bi.begin_klc.idx, item.end_bi.end_klc.idx, item._high(), item._low()
+
+
+_ITEM_READER: Dict[type, Callable] = {}  # 类型 -> 读取(time_begin, time_end, high, low)的函数，每个类型只判断一次
+
+
+def get_item_reader(item_cls: type) -> Callable:
+    from bi.bi import Bi
+    from kline.kline_unit import KLineUnitComm
+    from seg.seg import Seg
+    if issubclass(item_cls, Bi):
+        reader = _read_bi
+    elif issubclass(item_cls, KLineUnitComm):
+        reader = _read_klu
+    elif issubclass(item_cls, Seg):
+        reader = _read_seg
+    else:
+        raise ChanException(f"{item_cls} is unsupport sub class of CombineItem", ErrCode.COMMON_ERROR)
+    _ITEM_READER[item_cls] = reader
+    return reader
+
+
 class CombineItem:
+    __slots__ = ("time_begin", "time_end", "high", "low")
+
     def __init__(self, item):
-        from bi.bi import Bi
-        from kline.kline_unit import KLineUnit
-        from seg.seg import Seg
-        if isinstance(item, Bi):
-            self.time_begin = item.begin_klc.idx
-            self.time_end = item.end_klc.idx
-            self.high = item._high()
-            self.low = item._low()
-        elif isinstance(item, KLineUnit):
-            self.time_begin = item.time
-            self.time_end = item.time
-            self.high = item.high
-            self.low = item.low
-        elif isinstance(item, Seg):
-            self.time_begin = item.start_bi.begin_klc.idx
-            self.time_end = item.end_bi.end_klc.idx
-            self.high = item._high()
-            self.low = item._low()
-        else:
-            raise ChanException(f"{type(item)} is unsupport sub class of CombineItem", ErrCode.COMMON_ERROR)
+        reader = _ITEM_READER.get(type(item)) or get_item_reader(type(item))
+        self.time_begin, self.time_end, self.high, self.low = reader(item)
@@ -3,7 +3,7 @@ from typing import Generic, Iterable, List, Optional, Self, TypeVar, Union, over
 from common.cache import make_cache
 from common.enums import FX_TYPE, KLINE_DIR
 from common.chan_exception import ChanException, ErrCode
-from kline.kline_unit import KLineUnit
+from kline.kline_unit import KLineUnitComm
 
 from .combine_item import CombineItem
 
@@ -11,6 +11,9 @@ T = TypeVar('T')
 
 
 class KLineCombiner(Generic[T]):
+    __slots__ = ("__time_begin", "__time_end", "__high", "__low", "__lst", "__dir", "__fx", "__pre", "__next", "_memoize_cache")
+
+
     def __init__(self, kl_unit: T, _dir):
         item = CombineItem(kl_unit)
         self.__time_begin = item.time_begin
@@ -26,7 +29,22 @@ class KLineCombiner(Generic[T]):
         self.__next: Optional[Self] = None
 
     def clean_cache(self):
-        self._memoize_cache = {}
+        self._memoize_cache = None
+
+    def copy(self) -> Self:
+        # 浅拷贝，lst单独复制，之后try_add不影响原对象
+        res = object.__new__(type(self))
+        res.__time_begin = self.__time_begin
+        res.__time_end = self.__time_end
+        res.__high = self.__high
+        res.__low = self.__low
+        res.__lst = list(self.__lst)
+        res.__dir = self.__dir
+        res.__fx = self.__fx
+        res.__pre = self.__pre
+        res.__next = self.__next
+        res._memoize_cache = None
+        return res
 
     @property
     def time_begin(self): return self.__time_begin
@@ -85,6 +103,12 @@ class KLineCombiner(Generic[T]):
         # only for deepcopy
         self.__fx = fx
 
+    def set_combine_range(self, time_end, high, low):
+        # only for deepcopy，合并后的高低点和结束时间不能由add重新得到
+        self.__time_end = time_end
+        self.__high = high
+        self.__low = low
+
     def try_add(self, unit_kl: T, exclude_included=False, allow_top_equal=None):
         # allow_top_equal = None普通模式
         # allow_top_equal = 1 被包含，顶部相等不合并
@@ -93,7 +117,7 @@ class KLineCombiner(Generic[T]):
         _dir = self.test_combine(combine_item, exclude_included, allow_top_equal)
         if _dir == KLINE_DIR.COMBINE:
             self.__lst.append(unit_kl)
-            if isinstance(unit_kl, KLineUnit):
+            if isinstance(unit_kl, KLineUnitComm):
                 unit_kl.set_klc(self)
             if self.dir == KLINE_DIR.UP:
                 if combine_item.high != combine_item.low or combine_item.high != self.high:  # 处理一字K线
@@ -2,7 +2,22 @@ import inspect
 import types
 
 
+class _Missing:
+    # pickle后仍是同一个对象，否则加载的Chan中未计算的缓存项会被当成已有结果
+    def __reduce__(self):
+        return "_MISSING"
+
+
+_MISSING = _Missing()
+
+
 class make_cache:
+    """
+    缓存无参方法的返回值
+
+    每个被装饰的方法在类创建时分配一个固定下标，实例的_memoize_cache是按下标存放结果的list，
+    不再是以str(func)为key的dict；使用的类需要在__slots__中声明_memoize_cache，clean_cache时置为None即可
+    """
     def __init__(self, func):
         self.func = func
 
@@ -10,25 +25,28 @@ class make_cache:
         if len(fargspec.args) != 1 or fargspec.args[0] != "self":
             raise Exception("@memoize must be `(self)`")
 
-        # set key for this function
-        self.func_key = str(func)
+        self.cache_idx = -1
+
+    def __set_name__(self, owner, name):
+        # 子类在父类已分配的下标之后继续分配
+        self.cache_idx = getattr(owner, "_memoize_cache_size", 0)
+        owner._memoize_cache_size = self.cache_idx + 1
 
     def __get__(self, instance, cls):
         if instance is None:
             raise Exception("@memoize's must be bound")
 
-        if not hasattr(instance, "_memoize_cache"):
-            setattr(instance, "_memoize_cache", {})
-
         return types.MethodType(self, instance)
 
     def __call__(self, *args, **kwargs):
         instance = args[0]
-        cache = instance._memoize_cache
-
-        if self.func_key in cache:
-            return cache[self.func_key]
-
-        result = self.func(*args, **kwargs)
-        cache[self.func_key] = result
+        cache = getattr(instance, "_memoize_cache", None)
+        if cache is None:
+            cache = [_MISSING] * type(instance)._memoize_cache_size
+            instance._memoize_cache = cache
+
+        result = cache[self.cache_idx]
+        if result is _MISSING:
+            result = self.func(*args, **kwargs)
+            cache[self.cache_idx] = result
         return result
@@ -7,6 +7,7 @@ class DATA_SRC(Enum):
     CCXT = auto()
     CSV = auto()
     FUTU = auto()
+    LOCAL_CACHE = auto()
 
 
 class KL_TYPE(Enum):
@@ -67,6 +68,13 @@ class BSP_TYPE(Enum):
         return self.value[0]  # type: ignore
 
 
+class BSP_EVENT_TYPE(Enum):
+    BSP_ADDED = auto()  # 新买卖点
+    BSP_TYPE_ADDED = auto()  # 已有买卖点增加了一个类型
+    BSP_REMOVED = auto()  # 末尾不确定的买卖点失效
+    BSP_CONFIRMED = auto()  # 买卖点之后不会再失效
+
+
 class AUTYPE(Enum):
     QFQ = auto()
     HFQ = auto()
@@ -1,3 +1,6 @@
+import pickle
+
+from .chan_exception import ChanException, ErrCode
 from .enums import BI_DIR, KL_TYPE
 
 
@@ -52,3 +55,26 @@ def _parse_inf(v):
         if v == float("-inf"):
             v = 'float("-inf")'
     return v
+
+
+def get_state(obj):
+    # 和pickle/deepcopy取的状态一致：__dict__、(__dict__, __slots__字典)或自定义__getstate__的结果
+    reduce_value = obj.__reduce_ex__(pickle.HIGHEST_PROTOCOL)
+    if reduce_value[1] != (type(obj),):
+        raise ChanException(f"{type(obj).__name__} can not be rebuilt from state", ErrCode.COMMON_ERROR)
+    return reduce_value[2] if len(reduce_value) > 2 else None
+
+
+def set_state(obj, state):
+    # 同pickle的BUILD指令
+    if hasattr(obj, "__setstate__"):
+        obj.__setstate__(state)
+        return
+    slot_state = None
+    if isinstance(state, tuple) and len(state) == 2:
+        state, slot_state = state
+    if state:
+        obj.__dict__.update(state)
+    if slot_state:
+        for key, value in slot_state.items():
+            setattr(obj, key, value)
@@ -0,0 +1,44 @@
+from typing import Generic, Iterator, List, Optional, TypeVar, Union, overload
+
+T = TypeVar('T')
+
+
+class LineRange(Generic[T]):
+    """
+    列表按下标区间的只读视图，遍历时不复制列表，元素和同样参数的切片一致
+    笔/线段列表只会在尾部增删，视图读到的总是当前位置上的对象
+    """
+    __slots__ = ("lst", "idx_range")
+
+    def __init__(self, lst: List[T], idx_range: range):
+        self.lst = lst
+        self.idx_range = idx_range
+
+    @classmethod
+    def from_slice(cls, lst: List[T], begin: Optional[int] = None, end: Optional[int] = None, step: Optional[int] = None) -> 'LineRange[T]':
+        # 和lst[begin:end:step]的下标规则完全一致，包括负数和越界
+        return cls(lst, range(*slice(begin, end, step).indices(len(lst))))
+
+    def __len__(self):
+        return len(self.idx_range)
+
+    def __iter__(self) -> Iterator[T]:
+        return map(self.lst.__getitem__, self.idx_range)
+
+    def __reversed__(self) -> Iterator[T]:
+        return map(self.lst.__getitem__, reversed(self.idx_range))
+
+    @overload
+    def __getitem__(self, index: int) -> T: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> 'LineRange[T]': ...
+
+    def __getitem__(self, index: Union[slice, int]) -> Union['LineRange[T]', T]:
+        if isinstance(index, slice):
+            return LineRange(self.lst, self.idx_range[index])
+        return self.lst[self.idx_range[index]]
+
+    def same_view(self, other) -> bool:
+        # other是同一列表同一下标区间上的视图
+        return isinstance(other, LineRange) and other.lst is self.lst and other.idx_range == self.idx_range
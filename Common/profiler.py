@@ -0,0 +1,65 @@
+import time
+from typing import Dict
+
+
+class StageStat:
+    __slots__ = ("call_cnt", "total_time", "item_cnt", "counters")
+
+    def __init__(self):
+        self.call_cnt = 0
+        self.total_time = 0.0
+        self.item_cnt = 0  # 每次调用结束时结果列表长度之和，除以call_cnt即平均规模
+        self.counters: Dict[str, int] = {}  # 阶段自定义计数(如实际更新的元素数)之和
+
+    def to_dict(self) -> dict:
+        res = {
+            "call_cnt": self.call_cnt,
+            "total_time": self.total_time,
+            "avg_time": self.total_time / self.call_cnt if self.call_cnt else 0.0,
+            "item_cnt": self.item_cnt,
+            "avg_item": self.item_cnt / self.call_cnt if self.call_cnt else 0.0,
+        }
+        for name, cnt in self.counters.items():
+            res[name] = cnt
+            res[f"avg_{name}"] = cnt / self.call_cnt if self.call_cnt else 0.0
+        return res
+
+
+class ChanProfiler:
+    """
+    按阶段累计耗时，start()开始计时，之后每次lap()把距上一次start/lap的时间记到对应阶段
+    调用方在关闭profile时不创建本对象，用`if profiler:`判断，不产生额外开销
+    """
+    def __init__(self):
+        self.stats: Dict[str, StageStat] = {}
+        self.last_t = 0.0
+
+    def start(self):
+        self.last_t = time.perf_counter()
+
+    def lap(self, stage: str, item_cnt: int = 0, **counters: int):
+        now = time.perf_counter()
+        stat = self.stats.get(stage)
+        if stat is None:
+            stat = self.stats[stage] = StageStat()
+        stat.call_cnt += 1
+        stat.total_time += now - self.last_t
+        stat.item_cnt += item_cnt
+        for name, cnt in counters.items():
+            stat.counters[name] = stat.counters.get(name, 0) + cnt
+        self.last_t = now
+
+    def reset(self):
+        self.stats = {}
+
+    def report(self) -> Dict[str, dict]:
+        return {stage: stat.to_dict() for stage, stat in self.stats.items()}
+
+
+def format_profile_report(report: Dict[str, Dict[str, dict]]) -> str:
+    # report: {级别: {阶段: 统计}}，即Chan.get_profile_report()的返回值
+    lines = [f"{'level':<10}{'stage':<22}{'calls':>10}{'total(s)':>12}{'avg(us)':>12}{'avg_items':>12}"]
+    for lv, stage_dict in report.items():
+        for stage, stat in stage_dict.items():
+            lines.append(f"{lv:<10}{stage:<22}{stat['call_cnt']:>10}{stat['total_time']:>12.4f}{stat['avg_time']*1e6:>12.2f}{stat['avg_item']:>12.1f}")
+    return "\n".join(lines)
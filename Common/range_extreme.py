@@ -0,0 +1,109 @@
+from typing import List
+
+
+class RangeExtreme:
+    """
+    可追加的线段树，维护序列中每个元素的(high, low)，O(log n)查询区间[begin, end)的最高high和最低low
+    支持修改任意位置(一般是最后一个元素，比如最后一根合并K线的高低点还在变化)
+    """
+    def __init__(self, capacity: int = 1024):
+        self.size = 0
+        self.capacity = 1
+        while self.capacity < capacity:
+            self.capacity *= 2
+        self.max_tree: List[float] = [float("-inf")] * (2 * self.capacity)  # 叶子在[capacity, 2*capacity)
+        self.min_tree: List[float] = [float("inf")] * (2 * self.capacity)
+
+    def __len__(self):
+        return self.size
+
+    def grow(self, min_capacity: int):
+        leaf_high = self.max_tree[self.capacity:self.capacity+self.size]
+        leaf_low = self.min_tree[self.capacity:self.capacity+self.size]
+        while self.capacity < min_capacity:
+            self.capacity *= 2
+        self.max_tree = [float("-inf")] * (2 * self.capacity)
+        self.min_tree = [float("inf")] * (2 * self.capacity)
+        self.max_tree[self.capacity:self.capacity+self.size] = leaf_high
+        self.min_tree[self.capacity:self.capacity+self.size] = leaf_low
+        self.rebuild(self.capacity >> 1, self.capacity - 1)
+
+    def rebuild(self, lo: int, hi: int):
+        # 逐层重算[lo, hi]范围内的内部节点
+        max_tree, min_tree = self.max_tree, self.min_tree
+        while lo:
+            for pos in range(lo, hi + 1):
+                max_tree[pos] = max(max_tree[2*pos], max_tree[2*pos+1])
+                min_tree[pos] = min(min_tree[2*pos], min_tree[2*pos+1])
+            lo >>= 1
+            hi >>= 1
+
+    def append(self, high: float, low: float):
+        if self.size == self.capacity:
+            self.grow(self.size + 1)
+        self.size += 1
+        self.set(self.size - 1, high, low)
+
+    def extend(self, highs: List[float], lows: List[float]):
+        # 批量追加，只重算受影响的内部节点
+        if not highs:
+            return
+        if self.size + len(highs) > self.capacity:
+            self.grow(self.size + len(highs))
+        begin = self.capacity + self.size
+        end = begin + len(highs)
+        self.max_tree[begin:end] = highs
+        self.min_tree[begin:end] = lows
+        self.size += len(highs)
+        self.rebuild(begin >> 1, (end - 1) >> 1)
+
+    def set(self, idx: int, high: float, low: float):
+        max_tree, min_tree = self.max_tree, self.min_tree
+        pos = idx + self.capacity
+        if max_tree[pos] == high and min_tree[pos] == low:
+            return
+        max_tree[pos] = high
+        min_tree[pos] = low
+        pos >>= 1
+        while pos:
+            max_tree[pos] = max(max_tree[2*pos], max_tree[2*pos+1])
+            min_tree[pos] = min(min_tree[2*pos], min_tree[2*pos+1])
+            pos >>= 1
+
+    def query_max(self, begin: int, end: int) -> float:
+        # 区间为空时返回-inf
+        res = float("-inf")
+        tree = self.max_tree
+        begin += self.capacity
+        end += self.capacity
+        while begin < end:
+            if begin & 1:
+                if tree[begin] > res:
+                    res = tree[begin]
+                begin += 1
+            if end & 1:
+                end -= 1
+                if tree[end] > res:
+                    res = tree[end]
+            begin >>= 1
+            end >>= 1
+        return res
+
+    def query_min(self, begin: int, end: int) -> float:
+        # 区间为空时返回inf
+        res = float("inf")
+        tree = self.min_tree
+        begin += self.capacity
+        end += self.capacity
+        while begin < end:
+            if begin & 1:
+                if tree[begin] < res:
+                    res = tree[begin]
+                begin += 1
+            if end & 1:
+                end -= 1
+                if tree[end] < res:
+                    res = tree[end]
+            begin >>= 1
+            end >>= 1
+        return res
@@ -7,11 +7,33 @@ from kline.kline_unit import KLineUnit
 
 # 合并后的K线
 class KLine(KLineCombiner[KLineUnit]):
+    __slots__ = ("idx", "kl_type", "klu_max_high", "klu_min_low")
+
+
     def __init__(self, kl_unit: KLineUnit, idx, _dir=KLINE_DIR.UP):
         super(KLine, self).__init__(kl_unit, _dir)
         self.idx: int = idx
         self.kl_type = kl_unit.kl_type
         kl_unit.set_klc(self)
+        # 单位K线的最高/最低价，随合并增量维护
+        self.klu_max_high = kl_unit.high
+        self.klu_min_low = kl_unit.low
+
+    def add(self, unit_kl: KLineUnit):
+        super(KLine, self).add(unit_kl)
+        self.update_klu_peak(unit_kl)
+
+    def try_add(self, unit_kl: KLineUnit, exclude_included=False, allow_top_equal=None):
+        _dir = super(KLine, self).try_add(unit_kl, exclude_included, allow_top_equal)
+        if _dir == KLINE_DIR.COMBINE:
+            self.update_klu_peak(unit_kl)
+        return _dir
+
+    def update_klu_peak(self, unit_kl: KLineUnit):
+        if unit_kl.high > self.klu_max_high:
+            self.klu_max_high = unit_kl.high
+        if unit_kl.low < self.klu_min_low:
+            self.klu_min_low = unit_kl.low
 
     def __str__(self):
         fx_token = ""
@@ -32,10 +54,10 @@ class KLine(KLineCombiner[KLineUnit]):
                     yield sub_klu.klc
 
     def get_klu_max_high(self) -> float:
-        return max(x.high for x in self.lst)
+        return self.klu_max_high
 
     def get_klu_min_low(self) -> float:
-        return min(x.low for x in self.lst)
+        return self.klu_min_low
 
     def has_gap_with_next(self) -> bool:
         assert self.next is not None
@@ -1,12 +1,16 @@
 import copy
-from typing import List, Union, overload
+from typing import List, Tuple, Union, overload
 
 from bi.bi import Bi
 from bi.bi_list import BiList
 from buy_sell_point.bs_point_list import BSPointList
 from chan_config import ChanConfig
 from common.enums import KLINE_DIR, SEG_TYPE
+from common.func_util import get_state, set_state
 from common.chan_exception import ChanException, ErrCode
+from common.profiler import ChanProfiler
+from common.range_extreme import RangeExtreme
+from math_util.metric_registry import bind_metric_updaters, get_metric_plugin
 from seg.seg import Seg
 from seg.seg_config import SegConfig
 from seg.seg_list_comm import SegListComm
@@ -14,6 +18,7 @@ from zs.zs_list import ZSList
 
 from .kline import KLine
 from .kline_unit import KLineUnit
+from .metric_index import KLUMetricIndex
 
 
 def get_seglist_instance(seg_config: SegConfig, lv) -> SegListComm:
@@ -38,6 +43,10 @@ class KLineList:
         self.config = conf
         self.lst: List[KLine] = []  # K线列表，可递归  元素KLine类型
         self.bi_list = BiList(bi_conf=conf.bi_conf)
+        self.klc_range = RangeExtreme()  # 合并K线high/low的区间最值，和lst一一对应
+        self.bi_list.klc_range = self.klc_range
+        self.metric_index = KLUMetricIndex(self.klu_iter, verify=conf.metric_verify) if conf.metric_index else None  # 笔的MACD面积/峰值等指标用
+        self.bi_list.metric_index = self.metric_index
         self.seg_list: SegListComm[Bi] = get_seglist_instance(seg_config=conf.seg_conf, lv=SEG_TYPE.BI)
         self.segseg_list: SegListComm[Seg[Bi]] = get_seglist_instance(seg_config=conf.seg_conf, lv=SEG_TYPE.SEG)
 
@@ -49,14 +58,28 @@ class KLineList:
 
         self.metric_model_lst = conf.get_metric_model()
 
+        self.store = None  # array_store模式下K线数据和指标存在这里，KLineUnit只是其中一行的视图
+        if conf.array_store:
+            from .kline_store import KLineStore
+            self.store = KLineStore()
+
+        self.profiler = ChanProfiler() if conf.profile else None  # 各计算阶段耗时统计
+
         self.step_calculation = self.need_cal_step_by_step()
 
+        # 非逐K线模式下，能批量计算的指标等数据全部加入后在cal_metric_batch里一次算完
+        self.batch_metric = conf.batch_metric and not self.step_calculation
+        self.metric_pending_klu: List[KLineUnit] = []
+        self.metric_updater_lst = self.bind_metric_updaters()  # 每根K线依次调用，已按指标类型绑定好输入输出
+
         self.last_sure_seg_start_bi_idx = -1
         self.last_sure_segseg_start_bi_idx = -1
 
     def __deepcopy__(self, memo):
-        new_obj = KLine_List(self.kl_type, self.config)
+        # K线和合并K线逐个复制并重新连接pre/next，避免沿链表递归；其余属性按memo深拷贝，array_store时K线是新store上同一行的视图
+        new_obj = KLineList.__new__(KLineList)
         memo[id(self)] = new_obj
+        new_obj.lst = []
         for klc in self.lst:
             klus_new = []
             for klu in klc.lst:
@@ -68,6 +91,7 @@ class KLineList:
 
             new_klc = KLine(klus_new[0], idx=klc.idx, _dir=klc.dir)
             new_klc.set_fx(klc.fx)
+            new_klc.set_combine_range(klc.time_end, klc.high, klc.low)
             new_klc.kl_type = klc.kl_type
             for idx, klu in enumerate(klus_new):
                 klu.set_klc(new_klc)
@@ -78,17 +102,30 @@ class KLineList:
                 new_obj.lst[-1].set_next(new_klc)
                 new_klc.set_pre(new_obj.lst[-1])
             new_obj.lst.append(new_klc)
-        new_obj.bi_list = copy.deepcopy(self.bi_list, memo)
-        new_obj.seg_list = copy.deepcopy(self.seg_list, memo)
-        new_obj.segseg_list = copy.deepcopy(self.segseg_list, memo)
-        new_obj.zs_list = copy.deepcopy(self.zs_list, memo)
-        new_obj.segzs_list = copy.deepcopy(self.segzs_list, memo)
-        new_obj.bs_point_lst = copy.deepcopy(self.bs_point_lst, memo)
-        new_obj.metric_model_lst = copy.deepcopy(self.metric_model_lst, memo)
-        new_obj.step_calculation = copy.deepcopy(self.step_calculation, memo)
-        new_obj.seg_bs_point_lst = copy.deepcopy(self.seg_bs_point_lst, memo)
+        # 笔/线段之间pre/next、parent_seg等互相引用，先登记空对象再逐个复制内容，递归深度和笔数无关
+        line_lst = list({id(line): line for line_list in self.iter_line_lists() for line in line_list}.values())
+        for line in line_lst:
+            memo[id(line)] = type(line).__new__(type(line))
+        for line in line_lst:
+            set_state(memo[id(line)], copy.deepcopy(get_state(line), memo))
+        for name, value in self.__dict__.items():
+            if name not in ("lst", "metric_updater_lst"):
+                setattr(new_obj, name, copy.deepcopy(value, memo))
+        new_obj.metric_updater_lst = new_obj.bind_metric_updaters()
         return new_obj
 
+    def iter_line_lists(self):
+        yield self.bi_list
+        for seg_list in [self.seg_list, self.segseg_list]:
+            while seg_list is not None:
+                yield seg_list
+                seg_list = getattr(seg_list, "legacy", None)  # seg_verify时的对照线段列表
+
+    def set_bsp_event_handler(self, handler):
+        # handler(BSPEvent)，None表示关闭
+        self.bs_point_lst.set_event_handler(handler, self.kl_type, is_seg_bsp=False)
+        self.seg_bs_point_lst.set_event_handler(handler, self.kl_type, is_seg_bsp=True)
+
     @overload
     def __getitem__(self, index: int) -> KLine: ...
 
@@ -101,38 +138,129 @@ class KLineList:
     def __len__(self):
         return len(self.lst)
 
+    def bind_metric_updaters(self):
+        if self.store is None:
+            return bind_metric_updaters(self.metric_model_lst, KLineUnit)
+        from .kline_store import ArrayKLineUnit
+        return bind_metric_updaters(self.metric_model_lst, ArrayKLineUnit)
+
+    def __getstate__(self):
+        # 更新函数是闭包，不能pickle，加载后重新绑定
+        state = self.__dict__.copy()
+        del state["metric_updater_lst"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.metric_updater_lst = self.bind_metric_updaters()
+
+    def cal_metric_batch(self):
+        # 把metric_pending_klu中的K线一次性算完指标，BOLL/均线和逐根计算有1e-12量级的浮点尾差，其余完全一致
+        klu_lst = self.metric_pending_klu
+        input_cache = {}
+        for metric_model in self.metric_model_lst:
+            get_metric_plugin(metric_model).update_batch(metric_model, klu_lst, input_cache, verify=self.config.metric_verify)
+        if self.metric_index is not None:
+            for klu in klu_lst:
+                self.metric_index.add(klu)
+        self.metric_pending_klu = []
+
     def cal_seg_and_zs(self):
+        profiler = self.profiler
+        if profiler:
+            profiler.start()
+        if self.metric_pending_klu:
+            metric_cnt = len(self.metric_pending_klu)
+            self.cal_metric_batch()
+            if profiler:
+                profiler.lap("metric_batch", metric_cnt)
         if not self.step_calculation:
             self.bi_list.try_add_virtual_bi(self.lst[-1])
+            if profiler:
+                profiler.lap("update_bi", len(self.bi_list))
         self.last_sure_seg_start_bi_idx = cal_seg(self.bi_list, self.seg_list, self.last_sure_seg_start_bi_idx)
+        if profiler:
+            profiler.lap("cal_seg", len(self.seg_list))
         self.zs_list.cal_bi_zs(self.bi_list, self.seg_list)
-        update_zs_in_seg(self.bi_list, self.seg_list, self.zs_list)  # 计算seg的zs_lst，以及中枢的bi_in, bi_out
+        if profiler:
+            profiler.lap("cal_bi_zs", len(self.zs_list))
+        seg_touched, zs_touched = update_zs_in_seg(self.bi_list, self.seg_list, self.zs_list)  # 计算seg的zs_lst，以及中枢的bi_in, bi_out
+        if profiler:
+            profiler.lap("update_zs_in_seg", len(self.seg_list), seg_touched=seg_touched, zs_touched=zs_touched)
 
         self.last_sure_segseg_start_bi_idx = cal_seg(self.seg_list, self.segseg_list, self.last_sure_segseg_start_bi_idx)
+        if profiler:
+            profiler.lap("cal_segseg", len(self.segseg_list))
         self.segzs_list.cal_bi_zs(self.seg_list, self.segseg_list)
-        update_zs_in_seg(self.seg_list, self.segseg_list, self.segzs_list)  # 计算segseg的zs_lst，以及中枢的bi_in, bi_out
+        if profiler:
+            profiler.lap("cal_seg_zs", len(self.segzs_list))
+        seg_touched, zs_touched = update_zs_in_seg(self.seg_list, self.segseg_list, self.segzs_list)  # 计算segseg的zs_lst，以及中枢的bi_in, bi_out
+        if profiler:
+            profiler.lap("update_segzs_in_seg", len(self.segseg_list), seg_touched=seg_touched, zs_touched=zs_touched)
 
         # 计算买卖点
         self.seg_bs_point_lst.cal(self.seg_list, self.segseg_list)  # 线段线段买卖点
+        if profiler:
+            profiler.lap("seg_bsp", len(self.seg_bs_point_lst))
         self.bs_point_lst.cal(self.bi_list, self.seg_list)  # 再算笔买卖点
+        if profiler:
+            profiler.lap("bsp", len(self.bs_point_lst))
 
     def need_cal_step_by_step(self):
         return self.config.trigger_step
 
-    def add_single_klu(self, klu: KLineUnit):
-        klu.set_metric(self.metric_model_lst)
+    def set_step_calculation(self, step_calculation: bool):
+        # skip_step_batch用：跳过的K线按非逐步方式加入，切回逐步模式前整体算一次线段中枢买卖点，之后和一直逐步计算的状态一致
+        if step_calculation and not self.step_calculation and len(self.lst) > 0:
+            self.cal_seg_and_zs()
+        self.step_calculation = step_calculation
+        self.batch_metric = self.config.batch_metric and not step_calculation
+
+    def add_single_klu(self, klu: KLineUnit) -> KLineUnit:
+        # 返回实际加入的KLU，array_store模式下不是传入的对象
+        profiler = self.profiler
+        if profiler:
+            profiler.start()
+        if self.store is not None:
+            klu = self.store.add_klu(klu)
+        if self.batch_metric:
+            self.metric_pending_klu.append(klu)
+        else:
+            for metric_updater in self.metric_updater_lst:
+                metric_updater(klu)
+            if self.metric_index is not None:
+                self.metric_index.add(klu)
+        if profiler:
+            profiler.lap("metric", 1)
         if len(self.lst) == 0:
             self.lst.append(KLine(klu, idx=0))
+            self.klc_range.append(klu.high, klu.low)
+            if profiler:
+                profiler.lap("combine", len(self.lst))
         else:
             _dir = self.lst[-1].try_add(klu)
             if _dir != KLINE_DIR.COMBINE:  # 不需要合并K线
                 self.lst.append(KLine(klu, idx=len(self.lst), _dir=_dir))
+                self.klc_range.append(klu.high, klu.low)
                 if len(self.lst) >= 3:
                     self.lst[-2].update_fx(self.lst[-3], self.lst[-1])
-                if self.bi_list.update_bi(self.lst[-2], self.lst[-1], self.step_calculation) and self.step_calculation:
+                if profiler:
+                    profiler.lap("combine", len(self.lst))
+                bi_updated = self.bi_list.update_bi(self.lst[-2], self.lst[-1], self.step_calculation)
+                if profiler:
+                    profiler.lap("update_bi", len(self.bi_list))
+                if bi_updated and self.step_calculation:
+                    self.cal_seg_and_zs()
+            else:
+                self.klc_range.set(len(self.lst) - 1, self.lst[-1].high, self.lst[-1].low)
+                if profiler:
+                    profiler.lap("combine", len(self.lst))
+                need_cal = self.step_calculation and self.bi_list.try_add_virtual_bi(self.lst[-1], need_del_end=True)  # 这里的必要性参见issue#175
+                if profiler and self.step_calculation:
+                    profiler.lap("update_bi", len(self.bi_list))
+                if need_cal:
                     self.cal_seg_and_zs()
-            elif self.step_calculation and self.bi_list.try_add_virtual_bi(self.lst[-1], need_del_end=True):  # 这里的必要性参见issue#175
-                self.cal_seg_and_zs()
+        return klu
 
     def klu_iter(self, klc_begin_idx=0):
         for klc in self.lst[klc_begin_idx:]:
@@ -174,31 +302,56 @@ def cal_seg(bi_list, seg_list: SegListComm, last_sure_seg_start_bi_idx):
     return last_sure_seg_start_bi_idx
 
 
-def update_zs_in_seg(bi_list, seg_list, zs_list):
+def update_zs_in_seg(bi_list, seg_list, zs_list) -> Tuple[int, int]:
+    """
+    计算ele_inside_is_sure之前的线段的zs_lst，以及这些线段范围内中枢的bi_in, bi_out, bi_lst
+    线段和中枢都按起点有序，从后往前各扫描一遍；和上次结果相同的不重新设置
+    返回(zs_lst有变化的线段数, 重新绑定的中枢数)
+    """
+    seg_touched = zs_touched = 0
     sure_seg_cnt = 0
     seg_idx = len(seg_list) - 1
+    inside_end = len(zs_list)  # zs_list[inside_end:]的起点都在当前线段之后
+    bind_begin = len(zs_list)  # zs_list[bind_begin:]的结束点不早于已处理线段的起点，都需要检查绑定
     while seg_idx >= 0:
         seg = seg_list[seg_idx]
         if seg.ele_inside_is_sure:
             break
         if seg.is_sure:
             sure_seg_cnt += 1
-        seg.clear_zs_lst()
-        _zs_idx = len(zs_list) - 1
-        while _zs_idx >= 0:
-            zs = zs_list[_zs_idx]
-            if zs.end.idx < seg.start_bi.get_begin_klu().idx:
-                break
-            if zs.is_inside(seg):
-                seg.add_zs(zs)
-            assert zs.begin_bi.idx > 0
-            zs.set_bi_in(bi_list[zs.begin_bi.idx-1])
-            if zs.end_bi.idx+1 < len(bi_list):
-                zs.set_bi_out(bi_list[zs.end_bi.idx+1])
-            zs.set_bi_lst(list(bi_list[zs.begin_bi.idx:zs.end_bi.idx+1]))
-            _zs_idx -= 1
+        while inside_end > 0 and zs_list[inside_end-1].begin_bi.idx > seg.end_bi.idx:
+            inside_end -= 1
+        inside_begin = inside_end
+        while inside_begin > 0 and zs_list[inside_begin-1].begin_bi.idx >= seg.start_bi.idx:
+            inside_begin -= 1
+        if not same_items(seg.zs_lst, zs_list, inside_begin, inside_end):
+            seg.set_zs_lst(zs_list[inside_begin:inside_end])
+            seg_touched += 1
+        inside_end = inside_begin
+        seg_begin_klu_idx = seg.start_bi.get_begin_klu().idx
+        while bind_begin > 0 and zs_list[bind_begin-1].end.idx >= seg_begin_klu_idx:
+            bind_begin -= 1
 
         if sure_seg_cnt > 2:
             if not seg.ele_inside_is_sure:
                 seg.ele_inside_is_sure = True
         seg_idx -= 1
+
+    for zs in zs_list[bind_begin:]:
+        assert zs.begin_bi.idx > 0
+        bi_in = bi_list[zs.begin_bi.idx-1]
+        bi_out = bi_list[zs.end_bi.idx+1] if zs.end_bi.idx+1 < len(bi_list) else zs.bi_out  # 没有出中枢笔时保持原值
+        bi_lst = bi_list.range_view(zs.begin_bi.idx, zs.end_bi.idx+1)
+        if zs.bi_in is bi_in and zs.bi_out is bi_out and bi_lst.same_view(zs.bi_lst):
+            continue
+        zs.set_bi_in(bi_in)
+        zs.set_bi_out(bi_out)
+        zs.set_bi_lst(bi_lst)
+        zs_touched += 1
+    return seg_touched, zs_touched
+
+
+def same_items(lst, zs_list, begin: int, end: int) -> bool:
+    if len(lst) != end - begin:
+        return False
+    return all(item is zs_list[idx] for idx, item in enumerate(lst, begin))
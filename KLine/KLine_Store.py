@@ -0,0 +1,385 @@
+import copy
+import datetime
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+from common.enums import TRADE_INFO_LST, TREND_TYPE
+from common.chan_exception import ChanException, ErrCode
+from common.ctime import CTime
+from math_util.boll import BOLL_Metric
+from math_util.demark import T_DEMARK_INDEX, DemarkIndex
+from math_util.kdj import KDJ_Item
+from math_util.macd import MACDItem
+
+from .kline_unit import KLineUnit, KLineUnitComm
+from .trade_info import TradeInfo
+
+MACD_COLS = ("macd_fast_ema", "macd_slow_ema", "macd_dif", "macd_dea")
+BOLL_COLS = ("boll_theta", "boll_up", "boll_down", "boll_mid")
+KDJ_COLS = ("kdj_k", "kdj_d", "kdj_j")
+ARRAY_KLU_STATE = ("store", "row", "kl_type", "pre", "next", "sup_kl", "sub_kl_list", "_KLineUnitComm__klc", "_KLineUnitComm__idx")
+
+
+def encode_time(t: CTime) -> int:
+    return ((((t.year * 100 + t.month) * 100 + t.day) * 100 + t.hour) * 100 + t.minute) * 100 + t.second
+
+
+def decode_time(key: int, ts: float, auto: bool) -> CTime:
+    # 不走CTime.__init__，避免每次访问都重新计算时间戳
+    t = CTime.__new__(CTime)
+    key, t.second = divmod(key, 100)
+    key, t.minute = divmod(key, 100)
+    key, t.hour = divmod(key, 100)
+    key, t.day = divmod(key, 100)
+    t.year, t.month = divmod(key, 100)
+    t.auto = auto
+    t.ts = ts
+    return t
+
+
+def decode_time_bulk(time_code: np.ndarray, ts: np.ndarray, auto: bool = True) -> List[CTime]:
+    # decode_time的批量版本，拆分字段在numpy里完成
+    date_code, hms = np.divmod(time_code, 1000000)
+    year, month_day = np.divmod(date_code, 10000)
+    month, day = np.divmod(month_day, 100)
+    hour, minute_second = np.divmod(hms, 10000)
+    minute, second = np.divmod(minute_second, 100)
+    res = []
+    new_ctime = CTime.__new__
+    for t_year, t_month, t_day, t_hour, t_minute, t_second, t_ts in zip(year.tolist(), month.tolist(), day.tolist(), hour.tolist(), minute.tolist(), second.tolist(), ts.tolist()):
+        t = new_ctime(CTime)
+        t.year, t.month, t.day, t.hour, t.minute, t.second, t.auto, t.ts = t_year, t_month, t_day, t_hour, t_minute, t_second, auto, t_ts
+        res.append(t)
+    return res
+
+
+def date_str2time_code(date_str: str, is_end: bool) -> int:
+    # 支持2021-09-13、2021/09/13、20210913，可带时分(秒)；结束时间只给日期时包含当天所有K线
+    digits = "".join(c for c in date_str if c.isdigit())
+    if len(digits) == 8:
+        digits += "235959" if is_end else "000000"
+    elif len(digits) == 12:
+        digits += "59" if is_end else "00"
+    elif len(digits) != 14:
+        raise ChanException(f"unknown date format: {date_str}", ErrCode.PARA_ERROR)
+    return int(digits)
+
+
+def time_code2ts(time_code: np.ndarray) -> np.ndarray:
+    # 向量化计算CTime(auto=True).ts，本地时区偏移按小时去重后才调用datetime.timestamp()
+    date_code, hms = np.divmod(time_code, 1000000)
+    year, month_day = np.divmod(date_code, 10000)
+    month, day = np.divmod(month_day, 100)
+    hour, minute_second = np.divmod(hms, 10000)
+    minute, second = np.divmod(minute_second, 100)
+    is_day = (hour == 0) & (minute == 0)  # 和CTime.set_timestamp一致，日线按当天23:59计算
+    hour = np.where(is_day, 23, hour)
+    minute = np.where(is_day, 59, minute)
+    month_begin = (year - 1970).astype("datetime64[Y]").astype("datetime64[M]") + (month - 1).astype("timedelta64[M]")
+    days = (month_begin.astype("datetime64[D]") + (day - 1).astype("timedelta64[D]")).astype(np.int64)
+    naive_ts = days * 86400 + hour * 3600 + minute * 60 + second
+    hour_key, inverse = np.unique(naive_ts // 3600, return_inverse=True)
+    epoch = datetime.datetime(1970, 1, 1)
+    offset = np.array([(epoch + datetime.timedelta(hours=int(h))).timestamp() - int(h) * 3600 for h in hour_key])
+    return naive_ts + offset[inverse.reshape(-1)]
+
+
+class KLineStore:
+    """
+    KLineList的列式存储，每个字段/指标一列numpy数组，按容量倍增
+    列在第一次写入时创建，未计算的指标不会占用内存
+    """
+    def __init__(self, capacity: int = 1024):
+        self.size = 0
+        self.capacity = capacity
+        self.cols: Dict[str, np.ndarray] = {}
+        self.trend_keys: List[Tuple[TREND_TYPE, int]] = []
+        self.demark: Dict[int, DemarkIndex] = {}  # 结构不定长，只保存非空的
+        self.ext_metric: Dict[str, Dict[int, Any]] = {}  # 自定义指标插件的结果，名称 -> {行号: 值}
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        # 返回有效部分的视图，可直接用于向量化计算
+        return self.cols[name][:self.size]
+
+    def has_col(self, name: str) -> bool:
+        return name in self.cols
+
+    def get_col(self, name: str, dtype=np.float64) -> np.ndarray:
+        if name not in self.cols:
+            self.cols[name] = np.full(self.capacity, np.nan) if dtype == np.float64 else np.zeros(self.capacity, dtype=dtype)
+        return self.cols[name]
+
+    def append_row(self) -> int:
+        if self.size == self.capacity:
+            self.capacity *= 2
+            for name, col in self.cols.items():
+                new_col = np.full(self.capacity, np.nan) if col.dtype == np.float64 else np.zeros(self.capacity, dtype=col.dtype)
+                new_col[:self.size] = col[:self.size]
+                self.cols[name] = new_col
+        self.size += 1
+        return self.size - 1
+
+    def get(self, name: str, row: int):
+        return self.cols[name][row].item()
+
+    def set(self, name: str, row: int, value, dtype=np.float64):
+        self.get_col(name, dtype)[row] = value
+
+    def add_klu(self, klu: KLineUnit) -> 'ArrayKLineUnit':
+        row = self.append_row()
+        self.set("time_code", row, encode_time(klu.time), np.int64)
+        self.set("time_ts", row, klu.time.ts)
+        self.set("time_auto", row, klu.time.auto, np.bool_)
+        for name in ("open", "high", "low", "close"):
+            self.set(name, row, getattr(klu, name))
+        for metric_name in TRADE_INFO_LST:
+            value = klu.trade_info.metric.get(metric_name)
+            self.set(metric_name, row, np.nan if value is None else value)
+        if klu.limit_flag:
+            self.set("limit_flag", row, klu.limit_flag, np.int8)
+        return ArrayKLineUnit(self, row, klu)
+
+    def trend_col(self, trend_type: TREND_TYPE, T: int) -> str:
+        if (trend_type, T) not in self.trend_keys:
+            self.trend_keys.append((trend_type, T))
+        return f"trend_{trend_type.name}_{T}"
+
+
+class StoreTradeMetric(Mapping[str, Optional[float]]):
+    """KLineStore中一行成交量等字段的视图，读写都直接对应store的列，None存为nan"""
+    __slots__ = ("store", "row")
+
+    def __init__(self, store: KLineStore, row: int):
+        self.store = store
+        self.row = row
+
+    def __getitem__(self, metric_name: str) -> Optional[float]:
+        if metric_name not in TRADE_INFO_LST:
+            raise KeyError(metric_name)
+        value = self.store.get(metric_name, self.row)
+        return None if np.isnan(value) else value
+
+    def __setitem__(self, metric_name: str, value: Optional[float]):
+        if metric_name not in TRADE_INFO_LST:
+            raise KeyError(metric_name)
+        self.store.set(metric_name, self.row, np.nan if value is None else value)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(TRADE_INFO_LST)
+
+    def __len__(self):
+        return len(TRADE_INFO_LST)
+
+
+class StoreTradeInfo(TradeInfo):
+    # metric是store上的视图而不是dict，klu.trade_info.metric[...] = x会写回store
+    def __init__(self, store: KLineStore, row: int):
+        self.metric = StoreTradeMetric(store, row)  # type: ignore[assignment]
+
+
+class StoreDemarkIndex(DemarkIndex):
+    """
+    KLineStore中一行的Demark视图，store只保存非空的DemarkIndex
+    add/update写回store；data为空时是只读的()，直接修改data会报错而不是丢失
+    """
+    def __init__(self, store: KLineStore, row: int):
+        self.store = store
+        self.row = row
+
+    @property
+    def data(self) -> List[T_DEMARK_INDEX]:  # type: ignore[override]
+        demark_index = self.store.demark.get(self.row)
+        return demark_index.data if demark_index else ()  # type: ignore[return-value]
+
+    def target(self) -> DemarkIndex:
+        if self.row not in self.store.demark:
+            self.store.demark[self.row] = DemarkIndex()
+        return self.store.demark[self.row]
+
+    def add(self, _dir, _type, idx, series):
+        self.target().add(_dir, _type, idx, series)
+
+    def update(self, demark_index: DemarkIndex):
+        if demark_index.data:
+            self.target().update(demark_index)
+
+
+class ArrayKLineUnit(KLineUnitComm):
+    """
+    KLineStore中一行的视图，价格、成交量和指标都存在KLineStore里
+    只保留K线之间的结构关系(klc/pre/next/父子级别)，macd/boll/trade_info等对象访问时才构造
+    trade_info/demark返回store上的视图，修改会写回store；macd/boll/kdj等返回的是副本，要整体赋值才会写回
+    """
+    __slots__ = ("store", "row")
+
+    def __init__(self, store: KLineStore, row: int, klu: KLineUnit):
+        # 数据已经由KLineStore.add_klu写入
+        self.store = store
+        self.row = row
+        self.kl_type = klu.kl_type
+        self.pre: Optional[KLineUnit] = None
+        self.next: Optional[KLineUnit] = None
+        self.sup_kl: Optional[KLineUnit] = klu.sup_kl
+        self.sub_kl_list = list(klu.sub_kl_list) if klu.sub_kl_list else ()  # 没有次级别时不分配list
+        self.set_klc(None)
+        self.set_idx(klu.idx)
+
+    def add_children(self, child):
+        if not self.sub_kl_list:
+            self.sub_kl_list = []
+        self.sub_kl_list.append(child)
+
+    def __getstate__(self):
+        # 只序列化结构关系，数据随store一起序列化
+        return {name: getattr(self, name) for name in ARRAY_KLU_STATE}
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    def __deepcopy__(self, memo):
+        # 深拷贝得到复制出的store上同一行的视图，K线之间的结构关系由KLineList/Chan的__deepcopy__重新连接
+        obj = ArrayKLineUnit.__new__(ArrayKLineUnit)
+        memo[id(self)] = obj
+        obj.store = copy.deepcopy(self.store, memo)
+        obj.row = self.row
+        obj.kl_type = self.kl_type
+        obj.pre = None
+        obj.next = None
+        obj.sup_kl = None
+        obj.sub_kl_list = ()
+        obj.set_klc(None)
+        obj.set_idx(self.idx)
+        return obj
+
+    @property
+    def time(self) -> CTime:
+        return decode_time(int(self.store.cols["time_code"][self.row]), self.store.get("time_ts", self.row), bool(self.store.cols["time_auto"][self.row]))
+
+    @property
+    def open(self) -> float:
+        return self.store.get("open", self.row)
+
+    @open.setter
+    def open(self, value):
+        self.store.set("open", self.row, value)
+
+    @property
+    def high(self) -> float:
+        return self.store.get("high", self.row)
+
+    @high.setter
+    def high(self, value):
+        self.store.set("high", self.row, value)
+
+    @property
+    def low(self) -> float:
+        return self.store.get("low", self.row)
+
+    @low.setter
+    def low(self, value):
+        self.store.set("low", self.row, value)
+
+    @property
+    def close(self) -> float:
+        return self.store.get("close", self.row)
+
+    @close.setter
+    def close(self, value):
+        self.store.set("close", self.row, value)
+
+    @property
+    def limit_flag(self) -> int:
+        return int(self.store.cols["limit_flag"][self.row]) if self.store.has_col("limit_flag") else 0
+
+    @limit_flag.setter
+    def limit_flag(self, value):
+        self.store.set("limit_flag", self.row, value, np.int8)
+
+    @property
+    def trade_info(self) -> TradeInfo:
+        return StoreTradeInfo(self.store, self.row)
+
+    @trade_info.setter
+    def trade_info(self, trade_info: TradeInfo):
+        for metric_name in TRADE_INFO_LST:
+            value = trade_info.metric.get(metric_name)
+            self.store.set(metric_name, self.row, np.nan if value is None else value)
+
+    @property
+    def macd(self) -> MACDItem:
+        if not self.store.has_col(MACD_COLS[0]):
+            raise AttributeError("macd")
+        return MACDItem(*(self.store.get(name, self.row) for name in MACD_COLS))
+
+    @macd.setter
+    def macd(self, item: MACDItem):
+        for name, value in zip(MACD_COLS, (item.fast_ema, item.slow_ema, item.DIF, item.DEA)):
+            self.store.set(name, self.row, value)
+
+    @property
+    def boll(self) -> BOLL_Metric:
+        if not self.store.has_col(BOLL_COLS[0]):
+            raise AttributeError("boll")
+        item = BOLL_Metric.__new__(BOLL_Metric)  # theta可能被截断过，不能用ma和theta重新计算
+        item.theta, item.UP, item.DOWN, item.MID = (self.store.get(name, self.row) for name in BOLL_COLS)
+        return item
+
+    @boll.setter
+    def boll(self, item: BOLL_Metric):
+        for name, value in zip(BOLL_COLS, (item.theta, item.UP, item.DOWN, item.MID)):
+            self.store.set(name, self.row, value)
+
+    @property
+    def rsi(self) -> float:
+        if not self.store.has_col("rsi"):
+            raise AttributeError("rsi")
+        return self.store.get("rsi", self.row)
+
+    @rsi.setter
+    def rsi(self, value):
+        self.store.set("rsi", self.row, value)
+
+    @property
+    def kdj(self) -> KDJ_Item:
+        if not self.store.has_col(KDJ_COLS[0]):
+            raise AttributeError("kdj")
+        return KDJ_Item(*(self.store.get(name, self.row) for name in KDJ_COLS))
+
+    @kdj.setter
+    def kdj(self, item: KDJ_Item):
+        for name, value in zip(KDJ_COLS, (item.k, item.d, item.j)):
+            self.store.set(name, self.row, value)
+
+    @property
+    def trend(self) -> Dict[TREND_TYPE, Dict[int, float]]:
+        res: Dict[TREND_TYPE, Dict[int, float]] = {}
+        for trend_type, T in self.store.trend_keys:
+            res.setdefault(trend_type, {})[T] = self.store.get(self.store.trend_col(trend_type, T), self.row)
+        return res
+
+    def set_trend(self, trend_type: TREND_TYPE, T: int, value: float) -> None:
+        self.store.set(self.store.trend_col(trend_type, T), self.row, value)
+
+    @property
+    def demark(self) -> DemarkIndex:
+        return self.store.demark.get(self.row) or StoreDemarkIndex(self.store, self.row)
+
+    @demark.setter
+    def demark(self, demark_index: DemarkIndex):
+        if demark_index.data:
+            self.store.demark[self.row] = demark_index
+        else:
+            self.store.demark.pop(self.row, None)
+
+    @property
+    def ext_metric(self) -> Optional[Dict[str, Any]]:
+        res = {name: values[self.row] for name, values in self.store.ext_metric.items() if self.row in values}
+        return res or None
+
+    def set_ext_metric(self, name: str, value) -> None:
+        self.store.ext_metric.setdefault(name, {})[self.row] = value
@@ -1,20 +1,87 @@
 import copy
-from typing import Dict, Optional
+from typing import Any, Dict, Optional
 
 from common.enums import DATA_FIELD, TRADE_INFO_LST, TREND_TYPE
 from common.chan_exception import ChanException, ErrCode
 from common.ctime import CTime
-from math_util.boll import BOLL_Metric, BollModel
-from math_util.demark import DemarkEngine, DemarkIndex
-from math_util.kdj import KDJ
-from math_util.macd import MACD, MACDItem
-from math_util.rsi import RSI
-from math_util.trend_model import TrendModel
+from math_util.boll import BOLL_Metric
+from math_util.demark import DemarkIndex
+from math_util.macd import MACDItem
+from math_util.metric_registry import get_metric_plugin
 
 from .trade_info import TradeInfo
 
 
-class KLineUnit:
+class KLineUnitComm:
+    # KLineUnit和ArrayKLineUnit共用的部分：K线之间的结构关系，价格和指标由子类提供
+    __slots__ = ("kl_type", "sub_kl_list", "sup_kl", "__klc", "pre", "next", "__idx")
+
+    @property
+    def klc(self):
+        assert self.__klc is not None
+        return self.__klc
+
+    def set_klc(self, klc):
+        self.__klc = klc
+
+    @property
+    def idx(self):
+        return self.__idx
+
+    def set_idx(self, idx):
+        self.__idx: int = idx
+
+    def __str__(self):
+        return f"{self.idx}:{self.time}/{self.kl_type} open={self.open} close={self.close} high={self.high} low={self.low} {self.trade_info}"
+
+    def add_children(self, child):
+        self.sub_kl_list.append(child)
+
+    def set_parent(self, parent: 'KLineUnitComm'):
+        self.sup_kl = parent
+
+    def get_children(self):
+        yield from self.sub_kl_list
+
+    def _low(self):
+        return self.low
+
+    def _high(self):
+        return self.high
+
+    def get_parent_klc(self):
+        assert self.sup_kl is not None
+        return self.sup_kl.klc
+
+    def include_sub_lv_time(self, sub_lv_t: str) -> bool:
+        if self.time.to_str() == sub_lv_t:
+            return True
+        for sub_klu in self.sub_kl_list:
+            if sub_klu.time.to_str() == sub_lv_t:
+                return True
+            if sub_klu.include_sub_lv_time(sub_lv_t):
+                return True
+        return False
+
+    def get_ext_metric(self, name: str):
+        # 注册指标插件时KLU上没有对应属性的结果，见math_util.metric_registry
+        return self.ext_metric[name] if self.ext_metric and name in self.ext_metric else None
+
+    def set_metric(self, metric_model_lst: list) -> None:
+        # 逐个模型查找插件，KLineList里用预先绑定的更新函数，不走这里
+        for metric_model in metric_model_lst:
+            get_metric_plugin(metric_model).bind(metric_model, type(self))(self)
+
+    def set_pre_klu(self, pre_klu: Optional['KLineUnitComm']):
+        if pre_klu is None:
+            return
+        pre_klu.next = self
+        self.pre = pre_klu
+
+
+class KLineUnit(KLineUnitComm):
+    __slots__ = ("time", "close", "open", "high", "low", "trade_info", "demark", "trend", "limit_flag", "macd", "boll", "rsi", "kdj", "ext_metric")
+
     def __init__(self, kl_dict, autofix=False):
         # _time, _close, _open, _high, _low, _extra_info={}
         self.kl_type = None
@@ -33,12 +100,12 @@ class KLineUnit:
         self.sub_kl_list = []  # 次级别KLU列表
         self.sup_kl: Optional[KLineUnit] = None  # 指向更高级别KLU
 
-        from kline.kline import KLine
-        self.__klc: Optional[KLine] = None  # 指向KLine
+        self.set_klc(None)  # 指向KLine
 
         # self.macd: Optional[MACDItem] = None
         # self.boll: Optional[BOLL_Metric] = None
         self.trend: Dict[TREND_TYPE, Dict[int, float]] = {}  # int -> float
+        self.ext_metric: Optional[Dict[str, Any]] = None  # 自定义指标插件的结果
 
         self.limit_flag = 0  # 0:普通 -1:跌停，1:涨停
         self.pre: Optional[KLineUnit] = None
@@ -58,6 +125,7 @@ class KLineUnit:
             if metric in self.trade_info.metric:
                 _dict[metric] = self.trade_info.metric[metric]
         obj = KLineUnit(_dict)
+        obj.kl_type = self.kl_type
         obj.demark = copy.deepcopy(self.demark, memo)
         obj.trend = copy.deepcopy(self.trend, memo)
         obj.limit_flag = self.limit_flag
@@ -67,28 +135,11 @@ class KLineUnit:
             obj.rsi = copy.deepcopy(self.rsi, memo)
         if hasattr(self, "kdj"):
             obj.kdj = copy.deepcopy(self.kdj, memo)
+        obj.ext_metric = copy.deepcopy(self.ext_metric, memo)
         obj.set_idx(self.idx)
         memo[id(self)] = obj
         return obj
 
-    @property
-    def klc(self):
-        assert self.__klc is not None
-        return self.__klc
-
-    def set_klc(self, klc):
-        self.__klc = klc
-
-    @property
-    def idx(self):
-        return self.__idx
-
-    def set_idx(self, idx):
-        self.__idx: int = idx
-
-    def __str__(self):
-        return f"{self.idx}:{self.time}/{self.kl_type} open={self.open} close={self.close} high={self.high} low={self.low} {self.trade_info}"
-
     def check(self, autofix=False):
         if self.low > min([self.low, self.open, self.high, self.close]):
             if autofix:
@@ -101,54 +152,12 @@ class KLineUnit:
             else:
                 raise ChanException(f"{self.time} high price={self.high} is not max of [low={self.low}, open={self.open}, high={self.high}, close={self.close}]", ErrCode.KL_DATA_INVALID)
 
-    def add_children(self, child):
-        self.sub_kl_list.append(child)
-
-    def set_parent(self, parent: 'KLineUnit'):
-        self.sup_kl = parent
-
-    def get_children(self):
-        yield from self.sub_kl_list
+    def set_trend(self, trend_type: TREND_TYPE, T: int, value: float) -> None:
+        if trend_type not in self.trend:
+            self.trend[trend_type] = {}
+        self.trend[trend_type][T] = value
 
-    def _low(self):
-        return self.low
-
-    def _high(self):
-        return self.high
-
-    def set_metric(self, metric_model_lst: list) -> None:
-        for metric_model in metric_model_lst:
-            if isinstance(metric_model, MACD):
-                self.macd: MACDItem = metric_model.add(self.close)
-            elif isinstance(metric_model, TrendModel):
-                if metric_model.type not in self.trend:
-                    self.trend[metric_model.type] = {}
-                self.trend[metric_model.type][metric_model.T] = metric_model.add(self.close)
-            elif isinstance(metric_model, BollModel):
-                self.boll: BOLL_Metric = metric_model.add(self.close)
-            elif isinstance(metric_model, DemarkEngine):
-                self.demark = metric_model.update(idx=self.idx, close=self.close, high=self.high, low=self.low)
-            elif isinstance(metric_model, RSI):
-                self.rsi = metric_model.add(self.close)
-            elif isinstance(metric_model, KDJ):
-                self.kdj = metric_model.add(self.high, self.low, self.close)
-
-    def get_parent_klc(self):
-        assert self.sup_kl is not None
-        return self.sup_kl.klc
-
-    def include_sub_lv_time(self, sub_lv_t: str) -> bool:
-        if self.time.to_str() == sub_lv_t:
-            return True
-        for sub_klu in self.sub_kl_list:
-            if sub_klu.time.to_str() == sub_lv_t:
-                return True
-            if sub_klu.include_sub_lv_time(sub_lv_t):
-                return True
-        return False
-
-    def set_pre_klu(self, pre_klu: Optional['KLineUnit']):
-        if pre_klu is None:
-            return
-        pre_klu.next = self
-        self.pre = pre_klu
+    def set_ext_metric(self, name: str, value) -> None:
+        if self.ext_metric is None:
+            self.ext_metric = {}
+        self.ext_metric[name] = value
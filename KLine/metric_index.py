@@ -0,0 +1,199 @@
+from itertools import islice
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from common.enums import TRADE_INFO_LST
+from common.chan_exception import ChanException, ErrCode
+
+from .kline_unit import KLineUnitComm
+
+MACD_PART = "macd"  # MACD柱，峰值/柱差/半面积用
+MACD_SUM_PART = "macd_sum"  # 红柱、绿柱绝对值的前缀和，面积/半面积用
+MACD_RUN_PART = "macd_run"  # MACD柱同号区间的起点，半面积用
+RSI_PART = "rsi"
+MACD_HALF_PARTS = (MACD_PART, MACD_SUM_PART, MACD_RUN_PART)
+# 另外TRADE_INFO_LST中每个字段一部分：前缀和、缺失值个数的前缀和
+
+
+class GrowArray:
+    """按容量倍增的一维numpy数组，只在尾部追加"""
+    __slots__ = ("buf", "size")
+
+    def __init__(self, dtype=np.float64, capacity: int = 256):
+        self.buf = np.empty(capacity, dtype=dtype)
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def arr(self) -> np.ndarray:
+        return self.buf[:self.size]
+
+    def extend(self, values):
+        new_size = self.size + len(values)
+        if new_size > len(self.buf):
+            new_buf = np.empty(max(new_size, 2 * len(self.buf)), dtype=self.buf.dtype)
+            new_buf[:self.size] = self.buf[:self.size]
+            self.buf = new_buf
+        self.buf[self.size:new_size] = values
+        self.size = new_size
+
+    def last(self, default):
+        return self.buf[self.size - 1].item() if self.size else default
+
+
+def extend_prefix(prefix: GrowArray, values: list):
+    # accumulate是顺序相加，和逐个累加的浮点结果完全一致
+    prefix.extend(np.add.accumulate(np.array([prefix.last(0)] + values, dtype=prefix.buf.dtype))[1:])
+
+
+class KLUMetricIndex:
+    """
+    按KLU序号维护笔的背驰指标(Bi.cal_macd_*)要用的数据：MACD柱及其正负前缀和、同号区间起点，RSI，成交量等前缀和
+    笔的指标据此在O(1)/O(log n)内或对连续数组切片求最值得到，不再遍历笔内每根K线
+    各部分在第一次被查询时才从已有K线建立，之后随K线增量追加，没用到的部分不占内存
+    KLU序号不连续或缺少MACD时valid置为False，调用方退回逐根计算
+    """
+    def __init__(self, klu_iter: Callable[[], Iterable[KLineUnitComm]], verify=False):
+        self.klu_iter = klu_iter  # 建立新的部分时从头遍历已有K线
+        self.verify = verify  # 同时按逐根计算的旧逻辑算一遍并比较，调试用
+        self.valid = True
+        self.begin_idx = 0
+        self.size = 0
+        self.parts: Dict[str, Tuple[GrowArray, ...]] = {}
+        self.last_sign = 0  # MACD_RUN_PART最后一根柱的符号
+        self.rsi_valid = True  # 有KLU没有RSI时RSI部分不可用
+        self.pending: List[KLineUnitComm] = []  # 已加入还没同步到各部分的KLU
+
+    def add(self, klu: KLineUnitComm):
+        # 先缓存，查询时再批量计算
+        if self.valid:
+            self.pending.append(klu)
+
+    def sync(self):
+        klu_lst, self.pending = self.pending, []
+        if not self.valid or not klu_lst:
+            return
+        if self.size == 0:
+            self.begin_idx = klu_lst[0].idx
+        if klu_lst[-1].idx - klu_lst[0].idx != len(klu_lst) - 1 or klu_lst[0].idx != self.begin_idx + self.size:
+            self.valid = False
+            return
+        for part in self.parts:
+            self.extend_part(part, klu_lst, self.size)
+        self.size += len(klu_lst)
+
+    def build_part(self, part: str):
+        if part == MACD_RUN_PART:
+            self.parts[part] = (GrowArray(np.int64),)
+        elif part == MACD_SUM_PART or part in TRADE_INFO_LST:
+            self.parts[part] = (GrowArray(), GrowArray(np.int64 if part in TRADE_INFO_LST else np.float64))
+        else:
+            self.parts[part] = (GrowArray(),)
+        if self.size:
+            klu_lst = list(islice((klu for klu in self.klu_iter() if klu.idx >= self.begin_idx), self.size))
+            self.extend_part(part, klu_lst, 0)
+
+    def extend_part(self, part: str, klu_lst: List[KLineUnitComm], begin_pos: int):
+        if part == RSI_PART:
+            rsi_lst = [getattr(klu, "rsi", None) for klu in klu_lst]
+            if None in rsi_lst:
+                self.rsi_valid = False
+            elif self.rsi_valid:
+                self.parts[part][0].extend(rsi_lst)
+            return
+        if part in TRADE_INFO_LST:
+            prefix, none_cnt = self.parts[part]
+            value_lst = [klu.trade_info.metric[part] for klu in klu_lst]
+            extend_prefix(prefix, [value or 0.0 for value in value_lst])
+            extend_prefix(none_cnt, [value is None for value in value_lst])
+            return
+        try:
+            macd_lst = [klu.macd.macd for klu in klu_lst]
+        except AttributeError:
+            self.valid = False
+            return
+        if part == MACD_PART:
+            self.parts[part][0].extend(macd_lst)
+        elif part == MACD_SUM_PART:
+            pos_sum, neg_sum = self.parts[part]
+            extend_prefix(pos_sum, [macd if macd > 0 else 0.0 for macd in macd_lst])
+            extend_prefix(neg_sum, [-macd if macd < 0 else 0.0 for macd in macd_lst])
+        elif part == MACD_RUN_PART:
+            run_begin: List[int] = []
+            last_sign = self.last_sign if begin_pos else 0
+            for pos, macd in enumerate(macd_lst, start=begin_pos):
+                sign = (macd > 0) - (macd < 0)
+                if sign == 0 or sign != last_sign:
+                    run_begin.append(pos)
+                last_sign = sign
+            self.last_sign = last_sign
+            self.parts[part][0].extend(run_begin)
+
+    def covers(self, begin_idx: int, end_idx: int, *parts: str) -> bool:
+        # parts是查询要用到的部分，没有建立的先建立
+        if self.pending:
+            self.sync()
+        for part in parts:
+            if self.valid and part not in self.parts:
+                self.build_part(part)
+        return self.valid and begin_idx >= self.begin_idx and end_idx < self.begin_idx + self.size
+
+    def range_sum(self, prefix: GrowArray, begin: int, end: int):
+        # 下标[begin, end]相对begin_idx
+        return prefix.buf[end].item() - (prefix.buf[begin-1].item() if begin > 0 else 0)
+
+    def macd_slice(self, begin_idx: int, end_idx: int) -> np.ndarray:
+        return self.parts[MACD_PART][0].buf[begin_idx - self.begin_idx:end_idx - self.begin_idx + 1]
+
+    def macd_area(self, begin_idx: int, end_idx: int, is_up: bool) -> float:
+        # [begin_idx, end_idx]内与笔同向的MACD柱面积
+        prefix = self.parts[MACD_SUM_PART][0 if is_up else 1]
+        return 1e-7 + self.range_sum(prefix, begin_idx - self.begin_idx, end_idx - self.begin_idx)
+
+    def macd_peak(self, begin_idx: int, end_idx: int, is_up: bool) -> float:
+        if is_up:
+            return max(1e-7, self.macd_slice(begin_idx, end_idx).max().item())
+        return max(1e-7, -self.macd_slice(begin_idx, end_idx).min().item())
+
+    def macd_diff(self, begin_idx: int, end_idx: int) -> float:
+        macd_arr = self.macd_slice(begin_idx, end_idx)
+        return macd_arr.max().item() - macd_arr.min().item()
+
+    def macd_half(self, start_idx: int, begin_idx: int, end_idx: int, is_reverse: bool) -> float:
+        # 从start_idx开始(is_reverse时往前)与其同号的连续MACD柱面积，不超出[begin_idx, end_idx]
+        start = start_idx - self.begin_idx
+        macd = self.parts[MACD_PART][0].buf[start].item()
+        if macd == 0:
+            return 1e-7
+        prefix = self.parts[MACD_SUM_PART][0 if macd > 0 else 1]
+        run_begin = self.parts[MACD_RUN_PART][0].arr
+        run_pos = int(np.searchsorted(run_begin, start, side="right"))
+        if is_reverse:
+            begin, end = max(run_begin[run_pos-1].item(), begin_idx - self.begin_idx), start
+        else:
+            run_end = run_begin[run_pos].item() - 1 if run_pos < len(run_begin) else self.size - 1
+            begin, end = start, min(run_end, end_idx - self.begin_idx)
+        return 1e-7 + self.range_sum(prefix, begin, end)
+
+    def rsi_peak(self, begin_idx: int, end_idx: int, is_down: bool) -> Optional[float]:
+        if not self.rsi_valid:
+            return None
+        rsi_arr = self.parts[RSI_PART][0].buf[begin_idx - self.begin_idx:end_idx - self.begin_idx + 1]
+        if is_down:
+            return 10000.0/(rsi_arr.min().item()+1e-7)
+        return rsi_arr.max().item()
+
+    def trade_metric_sum(self, metric: str, begin_idx: int, end_idx: int) -> float:
+        # 区间内有缺失值时和逐根计算一样返回0
+        begin, end = begin_idx - self.begin_idx, end_idx - self.begin_idx
+        prefix, none_cnt = self.parts[metric]
+        if self.range_sum(none_cnt, begin, end) != 0:
+            return 0.0
+        return self.range_sum(prefix, begin, end)
+
+    def check(self, name: str, fast_value: float, legacy_value: float):
+        if abs(fast_value - legacy_value) > 1e-9 * max(1.0, abs(legacy_value)):
+            raise ChanException(f"metric {name} mismatch: index={fast_value}, legacy={legacy_value}", ErrCode.COMMON_ERROR)
@@ -10,7 +10,7 @@ from chan import Chan
 from common.enums import BI_DIR, FX_TYPE, KL_TYPE, KLINE_DIR, TREND_TYPE
 from common.chan_exception import ChanException, ErrCode
 from common.ctime import CTime
-from math_util.demark import T_DEMARK_INDEX, DemarkEngine
+from math_util.demark import T_DEMARK_INDEX
 
 from .plot_meta import Bi_meta, ChanPlotMeta, ZS_meta
 
@@ -744,11 +744,11 @@ class PlotDriver:
     def draw_demark_begin_line(self, ax, begin_line_color, plot_begin_set: set, linestyle: str, demark_idx: T_DEMARK_INDEX):
         if begin_line_color is not None and demark_idx['series'].TDST_peak is not None and id(demark_idx['series']) not in plot_begin_set:
             if demark_idx['series'].countdown is not None:
-                end_idx = demark_idx['series'].countdown.kl_list[-1].idx
+                end_idx = demark_idx['series'].countdown.end_kl_idx
             else:
-                end_idx = demark_idx['series'].kl_list[-1].idx
+                end_idx = demark_idx['series'].end_kl_idx
             ax.plot(
-                [demark_idx['series'].kl_list[DemarkEngine.SETUP_BIAS].idx, end_idx],
+                [demark_idx['series'].begin_kl_idx, end_idx],
                 [demark_idx['series'].TDST_peak, demark_idx['series'].TDST_peak],
                 c=begin_line_color,
                 linestyle=linestyle
@@ -817,7 +817,7 @@ class PlotDriver:
                 else:
                     upper_bias += getTextBox(ax, txt_instance).height
             for demark_idx in klu.demark.get_countdown():
-                box_bias = 0.5*text_height if text_height is not None and demark_idx['idx'] == DemarkEngine.MAX_COUNTDOWN else 0
+                box_bias = 0.5*text_height if text_height is not None and demark_idx['idx'] == demark_idx['series'].engine.max_countdown else 0
                 txt_instance = ax.text(
                     klu.idx,
                     klu.low-under_bias-box_bias if demark_idx['dir'] == BI_DIR.DOWN else klu.high+upper_bias+box_bias,
@@ -829,7 +829,7 @@ class PlotDriver:
                 )
                 if text_height is None:
                     text_height = getTextBox(ax, txt_instance).height
-                if demark_idx['idx'] == DemarkEngine.MAX_COUNTDOWN:
+                if demark_idx['idx'] == demark_idx['series'].engine.max_countdown:
                     txt_instance.set_bbox(dict(facecolor=max_countdown_background, edgecolor=max_countdown_background, pad=0))
                 if demark_idx['dir'] == BI_DIR.DOWN:
                     under_bias += getTextBox(ax, txt_instance).height
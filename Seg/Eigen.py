@@ -16,6 +16,11 @@ class Eigen(KLineCombiner[Bi]):
            (self.fx == FX_TYPE.BOTTOM and _pre.low > self.high):
             self.gap = True
 
+    def copy(self) -> Self:
+        res = super(Eigen, self).copy()
+        res.gap = self.gap
+        return res
+
     def __str__(self):
         return f"{self.lst[0].idx}~{self.lst[-1].idx} gap={self.gap} fx={self.fx}"
 
@@ -1,4 +1,4 @@
-from typing import Generic, List, Optional, Self, TypeVar
+from typing import Generic, List, Optional, Self, Tuple, TypeVar
 
 from bi.bi import Bi
 from common.enums import BI_DIR, MACD_ALGO, TREND_LINE_SIDE
@@ -12,6 +12,12 @@ LINE_TYPE = TypeVar('LINE_TYPE', Bi, "Seg")
 
 
 class Seg(Generic[LINE_TYPE]):
+    __slots__ = (
+        "idx", "start_bi", "end_bi", "is_sure", "dir", "zs_lst", "eigen_fx", "seg_idx", "parent_seg", "pre", "next",
+        "bsp", "bi_list", "reason", "trend_lines", "ele_inside_is_sure",
+    )
+
+
     def __init__(self, idx: int, start_bi: LINE_TYPE, end_bi: LINE_TYPE, is_sure=True, seg_dir=None, reason="normal"):
         assert start_bi.idx == 0 or start_bi.dir == end_bi.dir or not is_sure, f"{start_bi.idx} {end_bi.idx} {start_bi.dir} {end_bi.dir}"
         self.idx = idx
@@ -34,8 +40,7 @@ class Seg(Generic[LINE_TYPE]):
 
         self.bi_list: List[LINE_TYPE] = []  # 仅通过self.update_bi_list来更新
         self.reason = reason
-        self.support_trend_line = None
-        self.resistance_trend_line = None
+        self.trend_lines: Optional[Tuple[Optional[TrendLine], Optional[TrendLine]]] = None  # 用到时才计算
         if end_bi.idx - start_bi.idx < 2:
             self.is_sure = False
         self.check()
@@ -75,6 +80,9 @@ class Seg(Generic[LINE_TYPE]):
     def clear_zs_lst(self):
         self.zs_lst = []
 
+    def set_zs_lst(self, zs_lst):
+        self.zs_lst = zs_lst
+
     def _low(self):
         return self.end_bi.get_end_klu().low if self.is_down() else self.start_bi.get_begin_klu().low
 
@@ -133,9 +141,24 @@ class Seg(Generic[LINE_TYPE]):
         for bi_idx in range(idx1, idx2+1):
             bi_lst[bi_idx].parent_seg = self
             self.bi_list.append(bi_lst[bi_idx])
-        if len(self.bi_list) >= 3:
-            self.support_trend_line = TrendLine(self.bi_list, TREND_LINE_SIDE.INSIDE)
-            self.resistance_trend_line = TrendLine(self.bi_list, TREND_LINE_SIDE.OUTSIDE)
+        self.trend_lines = None
+
+    def get_trend_lines(self) -> Tuple[Optional[TrendLine], Optional[TrendLine]]:
+        # 不确定线段每次计算都会重建，趋势线只有画图用，不在创建线段时计算
+        if self.trend_lines is None:
+            if len(self.bi_list) >= 3:
+                self.trend_lines = (TrendLine(self.bi_list, TREND_LINE_SIDE.INSIDE), TrendLine(self.bi_list, TREND_LINE_SIDE.OUTSIDE))
+            else:
+                self.trend_lines = (None, None)
+        return self.trend_lines
+
+    @property
+    def support_trend_line(self) -> Optional[TrendLine]:
+        return self.get_trend_lines()[0]
+
+    @property
+    def resistance_trend_line(self) -> Optional[TrendLine]:
+        return self.get_trend_lines()[1]
 
     def get_first_multi_bi_zs(self):
         return next((zs for zs in self.zs_lst if not zs.is_one_bi_zs()), None)
@@ -101,6 +101,14 @@ class EigenFX:
         assert self.last_evidence_bi is not None
         return next((False for bi in self.lst if not bi.is_sure), self.last_evidence_bi.is_sure)
 
+    def copy(self) -> 'EigenFX':
+        # 保存/恢复扫描状态用，ele和lst都复制，之后继续add不影响原对象
+        res = EigenFX(self.dir, exclude_included=self.exclude_included, lv=self.lv)
+        res.ele = [None if ele is None else ele.copy() for ele in self.ele]
+        res.lst = list(self.lst)
+        res.last_evidence_bi = self.last_evidence_bi
+        return res
+
     def clear(self):
         self.ele = [None, None, None]
         self.lst = []
@@ -132,7 +140,7 @@ class EigenFX:
         # 如果返回None，表示找到最后了
         first_bi_dir = bi_list[begin_idx].dir  # down则是要找顶分型
         egien_fx = EigenFX(revert_bi_dir(first_bi_dir), exclude_included=not COMMON_COMBINE, lv=self.lv)  # 顶分型的话要找上升线段
-        for bi in bi_list[begin_idx::2]:
+        for bi in bi_list.range_view(begin_idx, None, 2):
             if egien_fx.add(bi):
                 if COMMON_COMBINE:
                     return True
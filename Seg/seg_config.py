@@ -3,8 +3,10 @@ from common.chan_exception import ChanException, ErrCode
 
 
 class SegConfig:
-    def __init__(self, seg_algo="chan", left_method="peak"):
+    def __init__(self, seg_algo="chan", left_method="peak", incremental=True, verify=False):
         self.seg_algo = seg_algo
+        self.incremental = incremental  # chan算法保留特征序列扫描状态，每次只处理新增/变化的笔
+        self.verify = verify  # 同时用原算法重算一遍并比较，调试用
         if left_method == "all":
             self.left_method = LEFT_SEG_METHOD.ALL
         elif left_method == "peak":
@@ -1,14 +1,69 @@
+import copy
+from typing import List, Optional
+
 from bi.bi_list import BiList
 from common.enums import BI_DIR, SEG_TYPE
+from common.chan_exception import ChanException, ErrCode
 
 from .eigen_fx import EigenFX
+from .seg import Seg
 from .seg_config import SegConfig
 from .seg_list_comm import SegListComm
 
 
+class SegScanState:
+    """
+    cal_seg_sure扫描到某根笔之后的特征序列状态，下次update时从这里继续，不用从上一个确定线段末尾重新扫描
+    一轮扫描只由起点begin_idx和上一线段方向base_dir(没有线段时为None)决定，和上一线段是不是同一个对象无关，
+    所以每次都会重建的不确定线段之后的扫描也能接着用；扫描过程最远读到后面第2根笔(actual_break)，记为frontier
+    BiList/SegList只会修改或删除末尾元素，frontier还是原来的对象且值没变就说明之前读到的笔都没变
+    """
+    __slots__ = ("base_dir", "begin_idx", "next_idx", "up_eigen", "down_eigen", "last_seg_dir", "frontier", "frontier_key")
+
+    def __init__(self, base_dir, begin_idx, next_idx, up_eigen: EigenFX, down_eigen: EigenFX, last_seg_dir, frontier):
+        self.base_dir: Optional[BI_DIR] = base_dir
+        self.begin_idx = begin_idx
+        self.next_idx = next_idx
+        self.up_eigen = up_eigen
+        self.down_eigen = down_eigen
+        self.last_seg_dir = last_seg_dir
+        self.frontier = frontier
+        self.frontier_key = line_key(frontier)
+
+    def is_valid(self, bi_lst) -> bool:
+        frontier_idx = self.frontier.idx
+        return frontier_idx < len(bi_lst) and bi_lst[frontier_idx] is self.frontier and line_key(self.frontier) == self.frontier_key
+
+
+def line_key(line):
+    return line._high(), line._low(), line.is_sure
+
+
+def line_is_stable(line) -> bool:
+    # 不确定的笔/线段每次计算都可能变化或重建，确定线段的分形第三元素含不确定笔时也会被do_init删掉重算
+    if isinstance(line, Seg):
+        return line.is_sure and line.eigen_fx is not None and line.eigen_fx.ele[-1] is not None and line.eigen_fx.ele[-1].lst[-1].is_sure
+    return line.is_sure
+
+
+def get_save_idx(bi_lst) -> int:
+    # 扫描状态保存在其后第2根(frontier)是稳定元素的位置，frontier也不能是最后一根
+    frontier_idx = len(bi_lst) - 2
+    while frontier_idx >= 0 and not line_is_stable(bi_lst[frontier_idx]):
+        frontier_idx -= 1
+    return frontier_idx - 2
+
+
 class SegListChan(SegListComm):
     def __init__(self, seg_config=SegConfig(), lv=SEG_TYPE.BI):
         super(SegListChan, self).__init__(seg_config=seg_config, lv=lv)
+        self.scan_state_lst: List[SegScanState] = []
+        self.legacy: Optional[SegListChan] = None  # seg_verify时用原算法计算的对照
+        if seg_config.verify:
+            legacy_config = copy.copy(seg_config)
+            legacy_config.incremental = False
+            legacy_config.verify = False
+            self.legacy = SegListChan(legacy_config, lv)
 
     def do_init(self):
         # 删除末尾不确定的线段
@@ -26,12 +81,93 @@ class SegListChan(SegListComm):
                 self.lst.pop()
 
     def update(self, bi_lst: BiList):
+        if self.legacy is not None:
+            # 先算对照组，parent_seg等最终指向本对象的线段
+            self.legacy.update(bi_lst)
         self.do_init()
-        if len(self) == 0:
-            self.cal_seg_sure(bi_lst, begin_idx=0)
+        begin_idx = 0 if len(self) == 0 else self[-1].end_bi.idx+1
+        if self.config.incremental:
+            self.drop_scan_state(bi_lst)
+            while begin_idx is not None:
+                begin_idx = self.scan_eigen(bi_lst, begin_idx)
         else:
-            self.cal_seg_sure(bi_lst, begin_idx=self[-1].end_bi.idx+1)
+            self.cal_seg_sure(bi_lst, begin_idx=begin_idx)
         self.collect_left_seg(bi_lst)
+        if self.legacy is not None:
+            self.check_with_legacy()
+
+    def drop_scan_state(self, bi_lst):
+        # 起点在最后一个线段之前的扫描不会再发生，读过的笔有变化的状态也不能再用
+        begin_idx = self[-1].end_bi.idx+1 if len(self) else 0
+        self.scan_state_lst = [state for state in self.scan_state_lst if state.begin_idx >= begin_idx and state.is_valid(bi_lst)]
+
+    def get_scan_state(self, base_dir, begin_idx) -> Optional[SegScanState]:
+        return next((state for state in self.scan_state_lst if state.begin_idx == begin_idx and state.base_dir == base_dir), None)
+
+    def save_scan_state(self, state: SegScanState):
+        self.scan_state_lst = [_state for _state in self.scan_state_lst if _state.begin_idx != state.begin_idx or _state.base_dir != state.base_dir]
+        self.scan_state_lst.append(state)
+
+    def scan_eigen(self, bi_lst, begin_idx: int) -> Optional[int]:
+        # 和cal_seg_sure逻辑一致，返回下一轮扫描的起点，None表示扫描结束
+        base_dir = self.lst[-1].dir if len(self) else None
+        state = self.get_scan_state(base_dir, begin_idx)
+        if state is not None and state.is_valid(bi_lst):
+            up_eigen, down_eigen = state.up_eigen.copy(), state.down_eigen.copy()
+            last_seg_dir = state.last_seg_dir
+            bi_idx = state.next_idx
+        else:
+            up_eigen = EigenFX(BI_DIR.UP, lv=self.lv)  # 上升线段下降笔
+            down_eigen = EigenFX(BI_DIR.DOWN, lv=self.lv)  # 下降线段上升笔
+            last_seg_dir = base_dir
+            bi_idx = begin_idx
+        save_idx = get_save_idx(bi_lst)
+        while bi_idx < len(bi_lst):
+            bi = bi_lst[bi_idx]
+            fx_eigen = None
+            if bi.is_down() and last_seg_dir != BI_DIR.UP:
+                if up_eigen.add(bi):
+                    fx_eigen = up_eigen
+            elif bi.is_up() and last_seg_dir != BI_DIR.DOWN:
+                if down_eigen.add(bi):
+                    fx_eigen = down_eigen
+            if base_dir is None:  # 尝试确定第一段方向，不要以谁先成为分形来决定，反例：US.EVRG
+                if up_eigen.ele[1] is not None and bi.is_down():
+                    last_seg_dir = BI_DIR.DOWN
+                    down_eigen.clear()
+                elif down_eigen.ele[1] is not None and bi.is_up():
+                    up_eigen.clear()
+                    last_seg_dir = BI_DIR.UP
+                if up_eigen.ele[1] is None and last_seg_dir == BI_DIR.DOWN and bi.dir == BI_DIR.DOWN:
+                    last_seg_dir = None
+                elif down_eigen.ele[1] is None and last_seg_dir == BI_DIR.UP and bi.dir == BI_DIR.UP:
+                    last_seg_dir = None
+
+            if fx_eigen:
+                return self.treat_fx_eigen_incremental(fx_eigen, bi_lst)
+            if bi_idx == save_idx:
+                self.save_scan_state(SegScanState(base_dir, begin_idx, bi_idx+1, up_eigen.copy(), down_eigen.copy(), last_seg_dir, bi_lst[bi_idx+2]))
+            bi_idx += 1
+        return None
+
+    def treat_fx_eigen_incremental(self, fx_eigen: EigenFX, bi_lst) -> Optional[int]:
+        _test = fx_eigen.can_be_end(bi_lst)
+        end_bi_idx = fx_eigen.get_peak_bi_idx()
+        if _test in [True, None]:  # None表示反向分型找到尾部也没找到
+            is_true = _test is not None  # 如果是正常结束
+            if not self.add_new_seg(bi_lst, end_bi_idx, is_sure=is_true and fx_eigen.all_bi_is_sure()):  # 防止第一根线段的方向与首尾值异常
+                return end_bi_idx+1
+            self.lst[-1].eigen_fx = fx_eigen
+            return end_bi_idx+1 if is_true else None
+        return fx_eigen.lst[1].idx
+
+    def check_with_legacy(self):
+        assert self.legacy is not None
+        if len(self) != len(self.legacy):
+            raise ChanException(f"incremental seg cnt={len(self)} != legacy seg cnt={len(self.legacy)}", ErrCode.COMMON_ERROR)
+        for seg, legacy_seg in zip(self.lst, self.legacy.lst):
+            if seg_key(seg) != seg_key(legacy_seg):
+                raise ChanException(f"incremental seg {seg_key(seg)} != legacy seg {seg_key(legacy_seg)}", ErrCode.COMMON_ERROR)
 
     def cal_seg_sure(self, bi_lst: BiList, begin_idx: int):
         up_eigen = EigenFX(BI_DIR.UP, lv=self.lv)  # 上升线段下降笔
@@ -74,3 +210,7 @@ class SegListChan(SegListComm):
                 self.cal_seg_sure(bi_lst, end_bi_idx + 1)
         else:
             self.cal_seg_sure(bi_lst, fx_eigen.lst[1].idx)
+
+
+def seg_key(seg: Seg):
+    return seg.start_bi.idx, seg.end_bi.idx, seg.is_sure, seg.dir, seg.reason, None if seg.eigen_fx is None else str(seg.eigen_fx)
@@ -1,10 +1,11 @@
 import abc
-from typing import Generic, List, TypeVar, Union, overload
+from typing import Generic, Iterable, List, Optional, TypeVar, Union, overload
 
 from bi.bi import Bi
 from bi.bi_list import BiList
 from common.enums import BI_DIR, LEFT_SEG_METHOD, SEG_TYPE
 from common.chan_exception import ChanException, ErrCode
+from common.line_range import LineRange
 
 from .seg import Seg
 from .seg_config import SegConfig
@@ -37,12 +38,16 @@ class SegListComm(Generic[SUB_LINE_TYPE]):
     def __len__(self):
         return len(self.lst)
 
+    def range_view(self, begin: Optional[int] = None, end: Optional[int] = None, step: Optional[int] = None) -> LineRange[Seg[SUB_LINE_TYPE]]:
+        # 元素和self[begin:end:step]相同，但不复制列表
+        return LineRange.from_slice(self.lst, begin, end, step)
+
     def left_bi_break(self, bi_lst: BiList):
         # 最后一个确定线段之后的笔有突破该线段最后一笔的
         if len(self) == 0:
             return False
         last_seg_end_bi = self[-1].end_bi
-        for bi in bi_lst[last_seg_end_bi.idx+1:]:
+        for bi in bi_lst.range_view(last_seg_end_bi.idx+1):
             if last_seg_end_bi.is_up() and bi._high() > last_seg_end_bi._high():
                 return True
             elif last_seg_end_bi.is_down() and bi._low() < last_seg_end_bi._low():
@@ -72,11 +77,11 @@ class SegListComm(Generic[SUB_LINE_TYPE]):
 
     def collect_left_seg_peak_method(self, last_seg_end_bi, bi_lst):
         if last_seg_end_bi.is_down():
-            peak_bi = find_peak_bi(bi_lst[last_seg_end_bi.idx+3:], is_high=True)
+            peak_bi = find_peak_bi(bi_lst.range_view(last_seg_end_bi.idx+3), is_high=True)
             if peak_bi and peak_bi.idx - last_seg_end_bi.idx >= 3:
                 self.add_new_seg(bi_lst, peak_bi.idx, is_sure=False, seg_dir=BI_DIR.UP, reason="collectleft_find_high")
         else:
-            peak_bi = find_peak_bi(bi_lst[last_seg_end_bi.idx+3:], is_high=False)
+            peak_bi = find_peak_bi(bi_lst.range_view(last_seg_end_bi.idx+3), is_high=False)
             if peak_bi and peak_bi.idx - last_seg_end_bi.idx >= 3:
                 self.add_new_seg(bi_lst, peak_bi.idx, is_sure=False, seg_dir=BI_DIR.DOWN, reason="collectleft_find_low")
         last_seg_end_bi = self[-1].end_bi
@@ -89,11 +94,11 @@ class SegListComm(Generic[SUB_LINE_TYPE]):
         if last_bi.idx-last_seg_end_bi.idx < 3:
             return
         if last_seg_end_bi.is_down() and last_bi.get_end_val() <= last_seg_end_bi.get_end_val():
-            if peak_bi := find_peak_bi(bi_lst[last_seg_end_bi.idx+3:], is_high=True):
+            if peak_bi := find_peak_bi(bi_lst.range_view(last_seg_end_bi.idx+3), is_high=True):
                 self.add_new_seg(bi_lst, peak_bi.idx, is_sure=False, seg_dir=BI_DIR.UP, reason="collectleft_find_high_force")
                 self.collect_left_seg(bi_lst)
         elif last_seg_end_bi.is_up() and last_bi.get_end_val() >= last_seg_end_bi.get_end_val():
-            if peak_bi := find_peak_bi(bi_lst[last_seg_end_bi.idx+3:], is_high=False):
+            if peak_bi := find_peak_bi(bi_lst.range_view(last_seg_end_bi.idx+3), is_high=False):
                 self.add_new_seg(bi_lst, peak_bi.idx, is_sure=False, seg_dir=BI_DIR.DOWN, reason="collectleft_find_low_force")
                 self.collect_left_seg(bi_lst)
         # 剩下线段的尾部相比于最后一个线段的尾部，高低关系和最后一个虚线段的方向一致
@@ -122,7 +127,7 @@ class SegListComm(Generic[SUB_LINE_TYPE]):
 
     def try_add_new_seg(self, bi_lst, end_bi_idx: int, is_sure=True, seg_dir=None, split_first_seg=True, reason="normal"):
         if len(self) == 0 and split_first_seg and end_bi_idx >= 3:
-            if peak_bi := find_peak_bi(bi_lst[end_bi_idx-3::-1], bi_lst[end_bi_idx].is_down()):
+            if peak_bi := find_peak_bi(bi_lst.range_view(end_bi_idx-3, None, -1), bi_lst[end_bi_idx].is_down()):
                 if (peak_bi.is_down() and (peak_bi._low() < bi_lst[0]._low() or peak_bi.idx == 0)) or \
                    (peak_bi.is_up() and (peak_bi._high() > bi_lst[0]._high() or peak_bi.idx == 0)):  # 要比第一笔开头还高/低（因为没有比较到）
                     self.add_new_seg(bi_lst, peak_bi.idx, is_sure=False, seg_dir=peak_bi.dir, reason="split_first_1st")
@@ -157,7 +162,7 @@ class SegListComm(Generic[SUB_LINE_TYPE]):
         return any(seg.is_sure for seg in self.lst)
 
 
-def find_peak_bi(bi_lst: Union[BiList, List[Bi]], is_high):
+def find_peak_bi(bi_lst: Iterable, is_high):
     peak_val = float("-inf") if is_high else float("inf")
     peak_bi = None
     for bi in bi_lst:
@@ -1,9 +1,10 @@
-from typing import Generic, List, Optional, TypeVar
+from typing import Generic, List, Optional, TypeVar, Union
 
 from bi.bi import Bi
 from buy_sell_point.bs_point_config import PointConfig
 from common.chan_exception import ChanException, ErrCode
 from common.func_util import has_overlap
+from common.line_range import LineRange
 from kline.kline_unit import KLineUnit
 from seg.seg import Seg
 
@@ -11,6 +12,12 @@ LINE_TYPE = TypeVar('LINE_TYPE', Bi, "Seg")
 
 
 class ZS(Generic[LINE_TYPE]):
+    __slots__ = (
+        "__is_sure", "__sub_zs_lst", "__begin", "__begin_bi", "__low", "__high", "__mid", "__end", "__end_bi",
+        "__peak_high", "__peak_low", "__bi_in", "__bi_out", "__bi_lst", "_memoize_cache",
+    )
+
+
     def __init__(self, lst: Optional[List[LINE_TYPE]], is_sure=True):
         # begin/end：永远指向 klu
         # low/high: 中枢的范围
@@ -39,10 +46,10 @@ class ZS(Generic[LINE_TYPE]):
         self.__bi_in: Optional[LINE_TYPE] = None  # 进中枢那一笔
         self.__bi_out: Optional[LINE_TYPE] = None  # 出中枢那一笔
 
-        self.__bi_lst: List[LINE_TYPE] = []  # begin_bi~end_bi之间的笔，在update_zs_in_seg函数中更新
+        self.__bi_lst: Union[List[LINE_TYPE], LineRange[LINE_TYPE]] = []  # begin_bi~end_bi之间的笔(列表视图，不复制)，在update_zs_in_seg函数中更新
 
     def clean_cache(self):
-        self._memoize_cache = {}
+        self._memoize_cache = None
 
     @property
     def is_sure(self): return self.__is_sure
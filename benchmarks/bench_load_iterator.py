@@ -0,0 +1,105 @@
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import argparse
+import time
+from typing import Dict, List
+
+from chan import Chan
+from chan_config import ChanConfig
+from common.enums import KL_TYPE
+from kline.kline_unit import KLineUnit
+
+from benchmarks.synthetic import gen_kl_dict
+
+
+class SchedulerOnlyChan(Chan):
+    # 不做任何缠论计算，只衡量多级别K线调度本身的开销
+    def add_new_kl(self, cur_lv: KL_TYPE, kline_unit):
+        return kline_unit
+
+
+def new_chan(chan_cls, lv_list, iterative_load: bool, trigger_step: bool) -> Chan:
+    config = ChanConfig({
+        "trigger_step": True,  # 构造时不从数据源加载，数据通过trigger_load喂入
+        "iterative_load": iterative_load,
+        "kl_data_check": True,
+        "print_warning": False,
+    })
+    chan = chan_cls(code="synthetic", lv_list=lv_list, config=config)
+    chan.conf.trigger_step = trigger_step
+    chan.do_init()
+    return chan
+
+
+def fingerprint(chan: Chan, inp: Dict[KL_TYPE, List[KLineUnit]]):
+    # SchedulerOnlyChan没有加入K线，递归版本每次取不到pre_klu，所以只比较父子级别关系
+    pos = {id(klu): idx for lst in inp.values() for idx, klu in enumerate(lst)}
+    res = []
+    for lv, lst in inp.items():
+        for klu in lst:
+            res.append((pos.get(id(klu.sup_kl)), [pos[id(sub_klu)] for sub_klu in klu.sub_kl_list]))
+        res.append((len(chan[lv]), len(chan[lv].bi_list), len(chan[lv].seg_list), len(chan[lv].zs_list)))
+    return res, chan.kl_misalign_cnt
+
+
+def run_once(chan_cls, kl_dict: Dict[KL_TYPE, List[dict]], iterative_load: bool, trigger_step: bool, batch: int):
+    lv_list = list(kl_dict.keys())
+    chan = new_chan(chan_cls, lv_list, iterative_load, trigger_step)
+    inp = {lv: [KLineUnit(item) for item in lst] for lv, lst in kl_dict.items()}
+    top_lst = inp[lv_list[0]]
+    sub_pos = {lv: 0 for lv in lv_list[1:]}
+    start = time.perf_counter()
+    if batch <= 0:
+        chan.trigger_load(inp)
+    else:
+        # 每次喂batch根最高级别K线及其对应的次级别K线，模拟实盘增量推送
+        for begin in range(0, len(top_lst), batch):
+            top_batch = top_lst[begin:begin+batch]
+            end_time = top_batch[-1].time
+            cur_inp = {lv_list[0]: top_batch}
+            for lv in lv_list[1:]:
+                end = sub_pos[lv]
+                while end < len(inp[lv]) and not inp[lv][end].time > end_time:
+                    end += 1
+                cur_inp[lv] = inp[lv][sub_pos[lv]:end]
+                sub_pos[lv] = end
+            chan.trigger_load(cur_inp)
+    return time.perf_counter() - start, fingerprint(chan, inp), sum(len(lst) for lst in inp.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="递归load_iterator vs 非递归multi_lv_load_iterator")
+    parser.add_argument("--days", type=int, default=60)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--batch", type=int, default=0, help="每次trigger_load喂入的最高级别K线数，0表示一次全部喂入")
+    parser.add_argument("--full", action="store_true", help="包含缠论计算（默认只测调度开销）")
+    parser.add_argument("--step", action="store_true", help="trigger_step模式，每根K线都计算线段中枢")
+    args = parser.parse_args()
+
+    chan_cls = Chan if args.full else SchedulerOnlyChan
+    trigger_step = args.step or not args.full  # 只测调度时没有K线，不能在最后统一计算线段中枢
+    scenarios = [
+        [KL_TYPE.K_DAY],
+        [KL_TYPE.K_DAY, KL_TYPE.K_30M, KL_TYPE.K_5M],
+        [KL_TYPE.K_DAY, KL_TYPE.K_60M, KL_TYPE.K_15M, KL_TYPE.K_5M, KL_TYPE.K_1M],
+    ]
+    print(f"{'lv_list':<28}{'bars':>10}{'recursive(s)':>15}{'iterative(s)':>15}{'speedup':>10}")
+    for lv_list in scenarios:
+        kl_dict = gen_kl_dict(lv_list, day_cnt=args.days, seed=0)
+        cost = {}
+        fp = {}
+        bar_cnt = 0
+        for iterative_load in (False, True):
+            cost[iterative_load] = float("inf")
+            for _ in range(args.repeat):
+                t, fp[iterative_load], bar_cnt = run_once(chan_cls, kl_dict, iterative_load, trigger_step, args.batch)
+                cost[iterative_load] = min(cost[iterative_load], t)
+        assert fp[True] == fp[False], f"{lv_list}: iterative result differs from recursive"
+        name = "+".join(lv.name[2:] for lv in lv_list)
+        print(f"{name:<28}{bar_cnt:>10}{cost[False]:>15.3f}{cost[True]:>15.3f}{cost[False]/cost[True]:>9.2f}x")
+
+
+if __name__ == "__main__":
+    main()
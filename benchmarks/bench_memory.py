@@ -0,0 +1,63 @@
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import argparse
+import gc
+import tracemalloc
+from typing import Dict, List
+
+from chan import Chan
+from chan_config import ChanConfig
+from common.enums import KL_TYPE
+from kline.kline_unit import KLineUnit
+
+from benchmarks.synthetic import gen_kl_dict
+
+STORE_MODE = {
+    "object": {},
+    "array": {"array_store": True},
+}
+
+
+def measure(kl_dict: Dict[KL_TYPE, List[dict]], conf: dict) -> float:
+    # 返回加载完成后Chan常驻内存，单位字节/根K线
+    lv_list = list(kl_dict.keys())
+    config = ChanConfig({"trigger_step": True, "print_warning": False, **conf})
+    chan = Chan(code="synthetic", lv_list=lv_list, config=config)
+    chan.conf.trigger_step = False  # 构造时不加载，trigger_load喂完再一次性算线段中枢
+    chan.do_init()
+    bar_cnt = sum(len(lst) for lst in kl_dict.values())
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    # 数据源生成的KLineUnit也在统计范围内：object模式下直接保存，array模式下转存后释放，两种模式口径一致
+    inp = {lv: [KLineUnit(item) for item in lst] for lv, lst in kl_dict.items()}
+    chan.trigger_load(inp)
+    del inp
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / bar_cnt
+
+
+def main():
+    parser = argparse.ArgumentParser(description="各存储模式下每根K线的内存占用")
+    parser.add_argument("--daily-days", type=int, default=2500, help="日线天数，默认约10年")
+    parser.add_argument("--minute-days", type=int, default=250, help="1分钟线天数，默认约1年")
+    parser.add_argument("--mode", nargs="*", default=list(STORE_MODE.keys()), choices=list(STORE_MODE.keys()))
+    args = parser.parse_args()
+
+    scenarios = {
+        f"DAY x {args.daily_days}": gen_kl_dict([KL_TYPE.K_DAY], day_cnt=args.daily_days, seed=0),
+        f"1M x {args.minute_days} days": gen_kl_dict([KL_TYPE.K_1M], day_cnt=args.minute_days, seed=0),
+    }
+    print(f"{'scenario':<24}{'bars':>10}" + "".join(f"{mode + '(B/bar)':>18}" for mode in args.mode))
+    for name, kl_dict in scenarios.items():
+        bar_cnt = sum(len(lst) for lst in kl_dict.values())
+        res = [measure(kl_dict, STORE_MODE[mode]) for mode in args.mode]
+        print(f"{name:<24}{bar_cnt:>10}" + "".join(f"{v:>18.1f}" for v in res))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import argparse
+import gc
+import json
+import platform
+import statistics
+import subprocess
+import time
+from typing import Dict, List, Optional
+
+from chan import Chan
+from chan_config import ChanConfig
+from common.enums import KL_TYPE
+from kline.kline_unit import KLineUnit
+
+from benchmarks.synthetic import gen_kl_dict
+
+BASELINE_PATH = Path(__file__).resolve().parent / "baseline.json"
+
+HEAVY_CONF = {
+    "cal_demark": True,
+    "cal_rsi": True,
+    "cal_kdj": True,
+    "mean_metrics": [5, 20, 60],
+    "trend_metrics": [20, 60],
+    "bs_type": "1,1p,2,2s,3a,3b",
+}
+
+# 名称 -> (级别, 天数, 是否逐K线计算, 额外配置)
+SCENARIOS = {
+    "load_day": ([KL_TYPE.K_DAY], 2500, False, {}),
+    "step_day": ([KL_TYPE.K_DAY], 1000, True, {}),
+    "load_multi": ([KL_TYPE.K_DAY, KL_TYPE.K_30M, KL_TYPE.K_5M], 250, False, {}),
+    "step_multi": ([KL_TYPE.K_DAY, KL_TYPE.K_30M, KL_TYPE.K_5M], 60, True, {}),
+    "load_heavy": ([KL_TYPE.K_DAY], 2500, False, HEAVY_CONF),
+    "step_heavy": ([KL_TYPE.K_DAY], 1000, True, HEAVY_CONF),
+}
+
+
+def peak_rss_mb() -> Optional[float]:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024  # macOS单位是字节，Linux是KB
+
+
+def reference_work() -> int:
+    # 固定的纯Python负载，和场景交替计时，用来抵消机器当前速度的波动
+    cnt: Dict[int, int] = {}
+    res = 0
+    for i in range(200000):
+        cnt[i % 1000] = cnt.get(i % 1000, 0) + i
+        res += i * i % 7
+    return res
+
+
+def run_scenario(name: str, repeat: int, seed: int, min_time: float) -> dict:
+    """
+    每次重复循环计算直到累计耗时不少于min_time秒，各次重复取中位数
+    计时用进程CPU时间(计算是单线程的)；每轮计算前跑一次reference_work，
+    bars_per_ref是跑一次reference_work的时间内能处理的K线数，和机器当前的快慢无关，基线比较用它
+    """
+    lv_list, day_cnt, step, conf = SCENARIOS[name]
+    kl_dict = gen_kl_dict(lv_list, day_cnt=day_cnt, seed=seed, regime_len=40)
+    bar_cnt = sum(len(lst) for lst in kl_dict.values())
+    speed_lst, relative_lst = [], []
+    for _ in range(repeat):
+        cost, ref_cost, loop_cnt = 0.0, 0.0, 0
+        while cost < min_time:
+            config = ChanConfig({"trigger_step": True, "print_warning": False, **conf})  # 构造时不加载，数据通过trigger_load喂入
+            chan = Chan(code="synthetic", lv_list=lv_list, config=config)
+            chan.conf.trigger_step = step  # 非逐K线模式trigger_load最后统一算一次线段中枢，对应load()
+            chan.do_init()
+            inp = {lv: [KLineUnit(item) for item in lst] for lv, lst in kl_dict.items()}
+            gc.collect()
+            start = time.process_time()
+            reference_work()
+            ref_cost += time.process_time() - start
+            start = time.process_time()
+            chan.trigger_load(inp)
+            cost += time.process_time() - start
+            loop_cnt += 1
+        speed_lst.append(bar_cnt * loop_cnt / cost)
+        relative_lst.append(bar_cnt * ref_cost / cost)
+    return {
+        "bars": bar_cnt,
+        "bars_per_sec": statistics.median(speed_lst),
+        "bars_per_ref": statistics.median(relative_lst),
+        "spread": (max(relative_lst) - min(relative_lst)) / statistics.median(relative_lst),  # 各次重复的极差/中位数
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def run_in_subprocess(name: str, repeat: int, seed: int, min_time: float) -> dict:
+    # 每个场景单独一个进程，峰值内存互不影响
+    output = subprocess.run(
+        [sys.executable, __file__, "--run-one", name, "--repeat", str(repeat), "--seed", str(seed), "--min-time", str(min_time)],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def compare(res: Dict[str, dict], baseline: Dict[str, dict], tolerance: float) -> List[str]:
+    # 按bars_per_ref比较，返回变慢超过tolerance的场景
+    regression = []
+    print(f"{'scenario':<14}{'bars':>10}{'bars/s':>12}{'bars/ref':>10}{'spread':>8}{'base bars/ref':>15}{'ratio':>8}{'peak RSS(MB)':>14}")
+    for name, item in res.items():
+        base = baseline.get(name)
+        ratio = item["bars_per_ref"] / base["bars_per_ref"] if base else None
+        base_str = f"{base['bars_per_ref']:.1f}" if base else "-"
+        ratio_str = f"{ratio:.2f}" if ratio is not None else "-"
+        rss_str = f"{item['peak_rss_mb']:.1f}" if item["peak_rss_mb"] is not None else "-"
+        print(f"{name:<14}{item['bars']:>10}{item['bars_per_sec']:>12.0f}{item['bars_per_ref']:>10.1f}{item['spread']:>8.2f}{base_str:>15}{ratio_str:>8}{rss_str:>14}")
+        if ratio is not None and ratio < 1 - tolerance:
+            regression.append(name)
+    return regression
+
+
+def main():
+    parser = argparse.ArgumentParser(description="缠论计算性能基准，结果和本机的baseline.json比较")
+    parser.add_argument("--scenario", nargs="*", default=list(SCENARIOS.keys()), choices=list(SCENARIOS.keys()))
+    parser.add_argument("--repeat", type=int, default=5, help="每个场景重复次数，取中位数")
+    parser.add_argument("--min-time", type=float, default=1.0, help="每次重复至少计时的秒数，场景耗时不足时循环计算")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save-baseline", action="store_true", help="把本次结果写入baseline.json，基线和机器相关，不提交到仓库")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="bars/ref低于基线的比例超过该值视为退化，返回码为1")
+    parser.add_argument("--run-one", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_one:
+        print(json.dumps(run_scenario(args.run_one, args.repeat, args.seed, args.min_time)))
+        return
+
+    res = {name: run_in_subprocess(name, args.repeat, args.seed, args.min_time) for name in args.scenario}
+    if args.save_baseline:
+        compare(res, {}, args.tolerance)
+        baseline = json.loads(BASELINE_PATH.read_text())["scenario"] if BASELINE_PATH.exists() else {}
+        BASELINE_PATH.write_text(json.dumps({
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "scenario": {**baseline, **res},
+        }, indent=2) + "\n")
+        return
+    if not BASELINE_PATH.exists():
+        print(f"no baseline at {BASELINE_PATH}, run with --save-baseline on this machine first")
+        sys.exit(2)
+    regression = compare(res, json.loads(BASELINE_PATH.read_text())["scenario"], args.tolerance)
+    if regression:
+        print(f"performance regression: {', '.join(regression)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
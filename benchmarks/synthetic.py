@@ -0,0 +1,118 @@
+import datetime
+import random
+from typing import Dict, Iterable, List
+
+from common.enums import DATA_FIELD, KL_TYPE
+from common.chan_exception import ChanException, ErrCode
+from common.ctime import CTime
+from kline.kline_unit import KLineUnit
+
+# A股交易时段，单位分钟：9:30-11:30, 13:00-15:00
+SESSION_LST = [(9*60+30, 11*60+30), (13*60, 15*60)]
+DAY_MINUTES = sum(end-begin for begin, end in SESSION_LST)
+
+KL_MINUTES = {
+    KL_TYPE.K_1M: 1,
+    KL_TYPE.K_3M: 3,
+    KL_TYPE.K_5M: 5,
+    KL_TYPE.K_15M: 15,
+    KL_TYPE.K_30M: 30,
+    KL_TYPE.K_60M: 60,
+    KL_TYPE.K_DAY: DAY_MINUTES,
+}
+
+
+# 行情状态：(名称, 每日漂移, 波动率倍数, 均值回复强度)
+REGIME_LST = [
+    ("up", 0.003, 1.0, 0.0),
+    ("down", -0.003, 1.0, 0.0),
+    ("range", 0.0, 0.7, 0.05),
+    ("volatile", 0.0, 2.0, 0.0),
+]
+
+
+def trade_days(begin: datetime.date, day_cnt: int) -> Iterable[datetime.date]:
+    date = begin
+    while day_cnt > 0:
+        if date.weekday() < 5:
+            yield date
+            day_cnt -= 1
+        date += datetime.timedelta(days=1)
+
+
+def bar_end_minutes(period: int) -> List[int]:
+    # 天以下级别K线时间为结束时间，每个交易时段内独立切分
+    res = []
+    for begin, end in SESSION_LST:
+        res.extend(range(begin+period, end+1, period))
+    return res
+
+
+def to_kl_dict(t: CTime, bar: List[float]) -> dict:
+    return {
+        DATA_FIELD.FIELD_TIME: t,
+        DATA_FIELD.FIELD_OPEN: bar[0],
+        DATA_FIELD.FIELD_HIGH: bar[1],
+        DATA_FIELD.FIELD_LOW: bar[2],
+        DATA_FIELD.FIELD_CLOSE: bar[3],
+        DATA_FIELD.FIELD_VOLUME: bar[4],
+    }
+
+
+def merge_bar(bars: List[List[float]]) -> List[float]:
+    return [bars[0][0], max(bar[1] for bar in bars), min(bar[2] for bar in bars), bars[-1][3], sum(bar[4] for bar in bars)]
+
+
+def gen_kl_dict(
+    lv_list: List[KL_TYPE],
+    day_cnt: int,
+    seed: int = 0,
+    begin: datetime.date = datetime.date(2010, 1, 4),
+    price: float = 10.0,
+    day_vol: float = 0.02,
+    regime_len: int = 0,
+) -> Dict[KL_TYPE, List[dict]]:
+    """
+    随机游走生成多级别K线，高级别K线由最小级别K线合并而来，保证各级别严格对齐
+    regime_len>0时在REGIME_LST的行情状态间随机切换，平均每个状态持续regime_len天
+    相同参数生成的数据完全一致
+    """
+    for lv in lv_list:
+        if lv not in KL_MINUTES:
+            raise ChanException(f"synthetic data not support {lv}", ErrCode.PARA_ERROR)
+    base = min(KL_MINUTES[lv] for lv in lv_list)
+    for lv in lv_list:
+        if KL_MINUTES[lv] % base != 0:
+            raise ChanException(f"{lv} is not multiple of {base} minutes", ErrCode.PARA_ERROR)
+    rnd = random.Random(seed)
+    bar_cnt = DAY_MINUTES // base
+    bar_vol = day_vol * (base / DAY_MINUTES) ** 0.5
+    drift, vol_mul, revert = 0.0, 1.0, 0.0  # 不切换时为无漂移的随机游走
+    anchor = price
+    res: Dict[KL_TYPE, List[dict]] = {lv: [] for lv in lv_list}
+    for date in trade_days(begin, day_cnt):
+        if regime_len > 0 and (date == begin or rnd.random() < 1 / regime_len):
+            _, drift, vol_mul, revert = rnd.choice(REGIME_LST)
+            anchor = price
+        base_bars = []
+        for _ in range(bar_cnt):
+            ret = drift / bar_cnt + revert / bar_cnt * (anchor / price - 1) + rnd.gauss(0, bar_vol * vol_mul)
+            close = max(0.01, price * (1 + ret))
+            high = max(price, close) * (1 + abs(rnd.gauss(0, bar_vol * vol_mul / 2)))
+            low = min(price, close) * (1 - abs(rnd.gauss(0, bar_vol * vol_mul / 2)))
+            base_bars.append([price, high, low, close, float(rnd.randint(100, 10000))])
+            price = close
+        for lv in lv_list:
+            if lv == KL_TYPE.K_DAY:
+                res[lv].append(to_kl_dict(CTime(date.year, date.month, date.day, 0, 0), merge_bar(base_bars)))
+                continue
+            merge_cnt = KL_MINUTES[lv] // base
+            for idx, end_minute in enumerate(bar_end_minutes(KL_MINUTES[lv])):
+                t = CTime(date.year, date.month, date.day, end_minute // 60, end_minute % 60)
+                res[lv].append(to_kl_dict(t, merge_bar(base_bars[idx*merge_cnt:(idx+1)*merge_cnt])))
+    return res
+
+
+def gen_klu(lv_list: List[KL_TYPE], day_cnt: int, seed: int = 0, **kwargs) -> Dict[KL_TYPE, List[KLineUnit]]:
+    # 结果可以直接传给Chan.trigger_load
+    return {lv: [KLineUnit(kl_dict) for kl_dict in kl_dict_lst] for lv, kl_dict_lst in gen_kl_dict(lv_list, day_cnt, seed, **kwargs).items()}
@@ -1,8 +1,9 @@
-from typing import Dict, Generic, Iterable, List, Optional, Tuple, TypeVar
+from typing import Callable, Dict, Generic, Iterable, Iterator, List, Optional, Tuple, TypeVar, Union
 
 from bi.bi import Bi
 from bi.bi_list import BiList
-from common.enums import BSP_TYPE
+from common.ctime import CTime
+from common.enums import BSP_EVENT_TYPE, BSP_TYPE, KL_TYPE
 from common.func_util import has_overlap
 from seg.seg import Seg
 from seg.seg_list_comm import SegListComm
@@ -10,6 +11,8 @@ from zs.zs import ZS
 
 from .bs_point import BSPoint
 from .bs_point_config import BSPointConfig, PointConfig
+from .bsp_event import BSPEvent
+from .bsp_index import BSPIndex
 
 LINE_TYPE = TypeVar('LINE_TYPE', Bi, Seg[Bi])
 LINE_LIST_TYPE = TypeVar('LINE_LIST_TYPE', BiList, SegListComm[Bi])
@@ -19,6 +22,7 @@ class BSPointList(Generic[LINE_TYPE, LINE_LIST_TYPE]):
     def __init__(self, bs_point_config: BSPointConfig):
         self.bsp_store_dict: Dict[BSP_TYPE, Tuple[List[BSPoint[LINE_TYPE]], List[BSPoint[LINE_TYPE]]]] = {}
         self.bsp_store_flat_dict: Dict[int, BSPoint[LINE_TYPE]] = {}
+        self.bsp_index = BSPIndex[LINE_TYPE]()  # 按时间排序的已存储买卖点，供查询用
 
         self.bsp1_list: List[BSPoint[LINE_TYPE]] = []
         self.bsp1_dict: Dict[int, BSPoint[LINE_TYPE]] = {}
@@ -27,6 +31,91 @@ class BSPointList(Generic[LINE_TYPE, LINE_LIST_TYPE]):
         self.last_sure_pos = -1
         self.last_sure_seg_idx = 0
 
+        self.event_handler: Optional[Callable[[BSPEvent], None]] = None  # 买卖点变化回调，None时不产生事件
+        self.event_lv: Optional[KL_TYPE] = None
+        self.is_seg_bsp = False
+        self.confirm_pos = -1  # 所在笔结束于此之前的买卖点已通知BSP_CONFIRMED
+        self.event_buf: List[Tuple[BSP_EVENT_TYPE, BSPoint[LINE_TYPE], Optional[BSP_TYPE]]] = []  # 一轮cal中的原始变化
+
+    def __getstate__(self):
+        # 回调不随对象复制和序列化
+        state = self.__dict__.copy()
+        state["event_handler"] = None
+        return state
+
+    def set_event_handler(self, handler: Optional[Callable[[BSPEvent], None]], lv: Optional[KL_TYPE] = None, is_seg_bsp=False):
+        self.event_handler = handler
+        self.event_lv = lv
+        self.is_seg_bsp = is_seg_bsp
+
+    def emit(self, event_type: BSP_EVENT_TYPE, bsp: BSPoint[LINE_TYPE], bs_type: Optional[BSP_TYPE] = None):
+        # cal过程中先缓存，结束时由flush_events合并成净变化再通知
+        if self.event_handler is not None:
+            self.event_buf.append((event_type, bsp, bs_type))
+
+    def notify(self, event_type: BSP_EVENT_TYPE, bsp: BSPoint[LINE_TYPE], bs_type: Optional[BSP_TYPE] = None):
+        self.event_handler(BSPEvent(event_type, self.event_lv, self.is_seg_bsp, bsp, bs_type))
+
+    def flush_events(self):
+        # 每轮cal都会先删掉末尾不确定的买卖点再重新算出来(新对象)，这里按(笔序号, 买/卖)对比删除和重新加入的，
+        # 类型相同的不通知，类型只多不少的只通知BSP_TYPE_ADDED，其余按BSP_REMOVED/BSP_ADDED通知
+        event_lst, self.event_buf = self.event_buf, []
+        removed: Dict[Tuple[int, bool], BSPoint[LINE_TYPE]] = {}
+        new_types: Dict[int, List[BSP_TYPE]] = {}  # 本轮新建的买卖点 -> 类型，按加入顺序
+        changed_lst: List[Tuple[BSP_EVENT_TYPE, BSPoint[LINE_TYPE], Optional[BSP_TYPE]]] = []
+        for event_type, bsp, bs_type in event_lst:
+            if event_type == BSP_EVENT_TYPE.BSP_REMOVED:
+                removed[(bsp.bi.idx, bsp.is_buy)] = bsp
+            elif event_type == BSP_EVENT_TYPE.BSP_ADDED:
+                new_types[id(bsp)] = [bs_type]
+                changed_lst.append((event_type, bsp, bs_type))
+            elif id(bsp) in new_types:
+                new_types[id(bsp)].append(bs_type)
+            else:
+                changed_lst.append((event_type, bsp, bs_type))  # 已确定部分的买卖点增加类型
+        net_lst: List[Tuple[BSP_EVENT_TYPE, BSPoint[LINE_TYPE], Optional[BSP_TYPE]]] = []
+        for event_type, bsp, bs_type in changed_lst:
+            if event_type != BSP_EVENT_TYPE.BSP_ADDED:
+                net_lst.append((event_type, bsp, bs_type))
+                continue
+            type_lst = new_types[id(bsp)]
+            old_bsp = removed.pop((bsp.bi.idx, bsp.is_buy), None)
+            if old_bsp is not None and set(old_bsp.type) <= set(type_lst):
+                net_lst.extend((BSP_EVENT_TYPE.BSP_TYPE_ADDED, bsp, _type) for _type in type_lst if _type not in old_bsp.type)
+                continue
+            if old_bsp is not None:
+                net_lst.append((BSP_EVENT_TYPE.BSP_REMOVED, old_bsp, None))
+            net_lst.append((BSP_EVENT_TYPE.BSP_ADDED, bsp, type_lst[0]))
+            net_lst.extend((BSP_EVENT_TYPE.BSP_TYPE_ADDED, bsp, _type) for _type in type_lst[1:])
+        for bsp in removed.values():
+            self.notify(BSP_EVENT_TYPE.BSP_REMOVED, bsp)
+        for event_type, bsp, bs_type in net_lst:
+            self.notify(event_type, bsp, bs_type)
+
+    def update_confirm_pos(self, seg_list: SegListComm):
+        # 最后一个确定线段在其分形元素含不确定笔时会被重算，last_sure_pos可能回退，倒数第二个确定线段之前的买卖点才不会再失效
+        sure_cnt = 0
+        for seg in seg_list.range_view(len(seg_list)-1, None, -1):
+            if seg.is_sure:
+                sure_cnt += 1
+                if sure_cnt == 2:
+                    break
+        else:
+            return
+        confirm_pos = seg.end_bi.get_begin_klu().idx
+        if confirm_pos <= self.confirm_pos:
+            return
+        confirmed_lst = []
+        for bsp in reversed(self.bsp_index.lst):
+            end_klu_idx = bsp.bi.get_end_klu().idx
+            if end_klu_idx <= self.confirm_pos:
+                break
+            if end_klu_idx <= confirm_pos:
+                confirmed_lst.append(bsp)
+        self.confirm_pos = confirm_pos
+        for bsp in reversed(confirmed_lst):
+            self.notify(BSP_EVENT_TYPE.BSP_CONFIRMED, bsp)
+
     def store_add_bsp(self, bsp_type: BSP_TYPE, bsp: BSPoint[LINE_TYPE]):
         if bsp_type not in self.bsp_store_dict:
             self.bsp_store_dict[bsp_type] = ([], [])
@@ -34,6 +123,7 @@ class BSPointList(Generic[LINE_TYPE, LINE_LIST_TYPE]):
             assert self.bsp_store_dict[bsp_type][bsp.is_buy][-1].bi.idx < bsp.bi.idx, f"{bsp_type}, {bsp.is_buy} {self.bsp_store_dict[bsp_type][bsp.is_buy][-1].bi.idx} {bsp.bi.idx}"
         self.bsp_store_dict[bsp_type][bsp.is_buy].append(bsp)
         self.bsp_store_flat_dict[bsp.bi.idx] = bsp
+        self.bsp_index.add(bsp)
 
     def add_bsp1(self, bsp: BSPoint[LINE_TYPE]):
         if len(self.bsp1_list) > 0:
@@ -50,9 +140,11 @@ class BSPointList(Generic[LINE_TYPE, LINE_LIST_TYPE]):
                     del self.bsp_store_flat_dict[bsp_list[is_buy][-1].bi.idx]
                     # 同时把失效买卖点从Bi删除
                     bsp_list[is_buy][-1].bi.bsp = None
-                    bsp_list[is_buy].pop()
+                    self.emit(BSP_EVENT_TYPE.BSP_REMOVED, bsp_list[is_buy].pop())
+        self.bsp_index.remove_after(self.last_sure_pos)
 
     def clear_bsp1_end(self):
+        # bsp1_list只用于关联relate_bsp1，其中目标买卖点的失效已在clear_store_end中通知，这里不再产生事件
         while len(self.bsp1_list) > 0:
             if self.bsp1_list[-1].bi.get_end_klu().idx <= self.last_sure_pos:
                 break
@@ -65,38 +157,16 @@ class BSPointList(Generic[LINE_TYPE, LINE_LIST_TYPE]):
             yield from bsp_list[False]
 
     def bsp_iter_v2(self) -> Iterable[BSPoint[LINE_TYPE]]:
-        list_indices = []
-        for bsp_type, bsp_list in self.bsp_store_dict.items():
-            if bsp_list[True]:
-                list_indices.append([bsp_type, True, len(bsp_list[True]) - 1])
-            if bsp_list[False]:
-                list_indices.append([bsp_type, False, len(bsp_list[False]) - 1])
-
-        while list_indices:
-            max_idx = -1
-            max_bi_idx = -1
-            max_bsp = None
-
-            for i, (bsp_type, is_buy, idx) in enumerate(list_indices):
-                if idx >= 0:
-                    bsp = self.bsp_store_dict[bsp_type][is_buy][idx]
-                    if bsp.bi.idx > max_bi_idx:
-                        max_bi_idx = bsp.bi.idx
-                        max_idx = i
-                        max_bsp = bsp
-
-            if max_bsp is None:
-                break
-
-            yield max_bsp
-
-            list_indices[max_idx][2] -= 1
-            if list_indices[max_idx][2] < 0:
-                list_indices.pop(max_idx)
+        # 从新到旧
+        return reversed(self.bsp_index.lst)
 
     def __len__(self):
         return len(self.bsp_store_flat_dict)
 
+    def __iter__(self) -> Iterator[BSPoint[LINE_TYPE]]:
+        # 从旧到新
+        return iter(self.bsp_index)
+
     def cal(self, bi_list: LINE_LIST_TYPE, seg_list: SegListComm[LINE_TYPE]):
         self.clear_store_end()
         self.clear_bsp1_end()
@@ -105,6 +175,9 @@ class BSPointList(Generic[LINE_TYPE, LINE_LIST_TYPE]):
         self.cal_seg_bs3point(seg_list, bi_list)
 
         self.update_last_pos(seg_list)
+        if self.event_handler is not None:
+            self.flush_events()
+            self.update_confirm_pos(seg_list)
 
     def update_last_pos(self, seg_list: SegListComm):
         self.last_sure_pos = -1
@@ -133,6 +206,8 @@ class BSPointList(Generic[LINE_TYPE, LINE_LIST_TYPE]):
         if exist_bsp := self.bsp_store_flat_dict.get(bi.idx):
             assert exist_bsp.is_buy == is_buy
             exist_bsp.add_another_bsp_prop(bs_type, relate_bsp1)
+            self.bsp_index.add_type(exist_bsp, bs_type)
+            self.emit(BSP_EVENT_TYPE.BSP_TYPE_ADDED, exist_bsp, bs_type)
             return
         if bs_type not in self.config.get_bs_config(is_buy).target_types:
             is_target_bsp = False
@@ -149,13 +224,14 @@ class BSPointList(Generic[LINE_TYPE, LINE_LIST_TYPE]):
             return
         if is_target_bsp:
             self.store_add_bsp(bs_type, bsp)
+            self.emit(BSP_EVENT_TYPE.BSP_ADDED, bsp, bs_type)
         else:
             bsp.bi.bsp = None
         if bs_type in [BSP_TYPE.T1, BSP_TYPE.T1P]:
             self.add_bsp1(bsp)
 
     def cal_seg_bs1point(self, seg_list: SegListComm[LINE_TYPE], bi_list: LINE_LIST_TYPE):
-        for seg in seg_list[self.last_sure_seg_idx:]:
+        for seg in seg_list.range_view(self.last_sure_seg_idx):
             if not self.seg_need_cal(seg):
                 continue
             self.cal_single_bs1point(seg, bi_list)
@@ -205,7 +281,7 @@ class BSPointList(Generic[LINE_TYPE, LINE_LIST_TYPE]):
         self.add_bs(bs_type=BSP_TYPE.T1P, bi=last_bi, relate_bsp1=None, is_target_bsp=is_target_bsp, feature_dict=feature_dict)
 
     def cal_seg_bs2point(self, seg_list: SegListComm[LINE_TYPE], bi_list: LINE_LIST_TYPE):
-        for seg in seg_list[self.last_sure_seg_idx:]:
+        for seg in seg_list.range_view(self.last_sure_seg_idx):
             config = self.config.get_bs_config(seg.is_down())
             if BSP_TYPE.T2 not in config.target_types and BSP_TYPE.T2S not in config.target_types:
                 continue
@@ -277,7 +353,7 @@ class BSPointList(Generic[LINE_TYPE, LINE_LIST_TYPE]):
             bias += 2
 
     def cal_seg_bs3point(self, seg_list: SegListComm[LINE_TYPE], bi_list: LINE_LIST_TYPE):
-        for seg in seg_list[self.last_sure_seg_idx:]:
+        for seg in seg_list.range_view(self.last_sure_seg_idx):
             if not self.seg_need_cal(seg):
                 continue
             config = self.config.get_bs_config(seg.is_down())
@@ -356,7 +432,7 @@ class BSPointList(Generic[LINE_TYPE, LINE_LIST_TYPE]):
         if BSP_CONF.strict_bsp3 and (cmp_zs.bi_out is None or cmp_zs.bi_out.idx != bsp1_bi.idx):
             return
         end_bi_idx = cal_bsp3_bi_end_idx(next_seg)
-        for bsp3_bi in bi_list[bsp1_bi.idx+2::2]:
+        for bsp3_bi in bi_list.range_view(bsp1_bi.idx+2, None, 2):
             if bsp3_bi.idx > end_bi_idx:
                 break
             assert bsp3_bi.seg_idx is not None
@@ -368,15 +444,28 @@ class BSPointList(Generic[LINE_TYPE, LINE_LIST_TYPE]):
             break
 
     def getSortedBspList(self) -> List[BSPoint[LINE_TYPE]]:
-        return sorted(self.bsp_iter(), key=lambda bsp: bsp.bi.idx)
+        return list(self.bsp_index)
 
-    def get_latest_bsp(self, number: int) -> List[BSPoint[LINE_TYPE]]:
-        res = []
-        for bsp in self.bsp_iter_v2():
-            res.append(bsp)
-            if number != 0 and len(res) >= number:
-                break
-        return res
+    def get_latest_bsp(
+        self,
+        number: int,
+        bs_type: Union[BSP_TYPE, Iterable[BSP_TYPE], None] = None,
+        is_buy: Optional[bool] = None,
+    ) -> List[BSPoint[LINE_TYPE]]:
+        # 从新到旧，number=0则取全部；可按类型(任一类型匹配即可)和买卖方向过滤
+        if isinstance(bs_type, BSP_TYPE):
+            bs_type = [bs_type]
+        return self.bsp_index.latest(number, bs_type, is_buy)
+
+    def get_bsp_by_idx(self, begin_idx: int, end_idx: int) -> List[BSPoint[LINE_TYPE]]:
+        # 所在笔/线段序号在[begin_idx, end_idx]内，从旧到新
+        return self.bsp_index.range_by_idx(begin_idx, end_idx)
+
+    def get_bsp_by_klu(self, begin: Union[int, CTime], end: Union[int, CTime]) -> List[BSPoint[LINE_TYPE]]:
+        # 买卖点K线(bsp.klu)序号或时间在[begin, end]内，从旧到新
+        if isinstance(begin, CTime):
+            return self.bsp_index.range_by_time(begin, end)  # type: ignore
+        return self.bsp_index.range_by_klu_idx(begin, end)  # type: ignore
 
 
 def bsp2s_break_bsp1(bsp2s_bi: LINE_TYPE, bsp2_break_bi: LINE_TYPE) -> bool:
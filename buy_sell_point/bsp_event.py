@@ -0,0 +1,29 @@
+from typing import Generic, Optional, TypeVar
+
+from bi.bi import Bi
+from common.enums import BSP_EVENT_TYPE, BSP_TYPE, KL_TYPE
+from seg.seg import Seg
+
+from .bs_point import BSPoint
+
+LINE_TYPE = TypeVar('LINE_TYPE', Bi, Seg)
+
+
+class BSPEvent(Generic[LINE_TYPE]):
+    """
+    买卖点变化事件，在BSPointList.cal过程中按发生顺序产生
+    idx是买卖点所在笔(is_seg_bsp时为线段)的序号，bs_type是本次新增的类型，BSP_REMOVED/BSP_CONFIRMED时为None
+    """
+    __slots__ = ("type", "lv", "is_seg_bsp", "idx", "bsp", "bs_type")
+
+    def __init__(self, event_type: BSP_EVENT_TYPE, lv: Optional[KL_TYPE], is_seg_bsp: bool, bsp: BSPoint[LINE_TYPE], bs_type: Optional[BSP_TYPE] = None):
+        self.type = event_type
+        self.lv = lv
+        self.is_seg_bsp = is_seg_bsp
+        self.idx: int = bsp.bi.idx
+        self.bsp = bsp
+        self.bs_type = bs_type
+
+    def __str__(self):
+        lv_name = self.lv.name if self.lv else None
+        return f"{self.type.name} {lv_name} {'seg' if self.is_seg_bsp else 'bi'}[{self.idx}] {self.bsp.type2str()} {'buy' if self.bsp.is_buy else 'sell'}"
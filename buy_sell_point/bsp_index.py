@@ -0,0 +1,104 @@
+import heapq
+from bisect import bisect_left, bisect_right, insort
+from typing import Dict, Generic, Iterable, Iterator, List, Optional, Tuple, TypeVar
+
+from bi.bi import Bi
+from common.ctime import CTime
+from common.enums import BSP_TYPE
+from seg.seg import Seg
+
+from .bs_point import BSPoint
+
+LINE_TYPE = TypeVar('LINE_TYPE', Bi, Seg)
+
+
+def bsp_key(bsp: BSPoint) -> int:
+    return bsp.bi.idx
+
+
+class BSPIndex(Generic[LINE_TYPE]):
+    """
+    已存储买卖点按bi.idx升序的索引，另外按买/卖、按(类型, 买/卖)各维护一份有序列表
+    买卖点失效只会发生在尾部(clear_store_end)，新增大多也在尾部，所以用有序list + bisect维护
+    一个买卖点有多个类型时(add_another_bsp_prop)会出现在每个类型的列表里
+    """
+    def __init__(self):
+        self.lst: List[BSPoint[LINE_TYPE]] = []
+        self.side_lst: Tuple[List[BSPoint[LINE_TYPE]], List[BSPoint[LINE_TYPE]]] = ([], [])  # [is_buy]
+        self.type_dict: Dict[Tuple[BSP_TYPE, bool], List[BSPoint[LINE_TYPE]]] = {}
+
+    def __len__(self):
+        return len(self.lst)
+
+    def __iter__(self) -> Iterator[BSPoint[LINE_TYPE]]:
+        return iter(self.lst)
+
+    def add(self, bsp: BSPoint[LINE_TYPE]):
+        insort_tail(self.lst, bsp)
+        insort_tail(self.side_lst[bsp.is_buy], bsp)
+        self.add_type(bsp, bsp.type[0])
+
+    def add_type(self, bsp: BSPoint[LINE_TYPE], bs_type: BSP_TYPE):
+        type_lst = self.type_dict.setdefault((bs_type, bsp.is_buy), [])
+        pos = bisect_left(type_lst, bsp.bi.idx, key=bsp_key)
+        if pos < len(type_lst) and type_lst[pos] is bsp:
+            return
+        type_lst.insert(pos, bsp)
+
+    def remove_after(self, last_sure_pos: int):
+        # 和clear_store_end条件一致：删除所在笔结束于last_sure_pos之后的买卖点，按bi.idx有序所以都在尾部
+        for lst in [self.lst, *self.side_lst, *self.type_dict.values()]:
+            while lst and lst[-1].bi.get_end_klu().idx > last_sure_pos:
+                lst.pop()
+
+    def latest(self, number: int = 1, bs_type: Optional[Iterable[BSP_TYPE]] = None, is_buy: Optional[bool] = None) -> List[BSPoint[LINE_TYPE]]:
+        # 从新到旧，number=0则取全部；bs_type为None时不按类型过滤
+        if bs_type is None:
+            lst = self.lst if is_buy is None else self.side_lst[is_buy]
+            return lst[:-number-1:-1] if number else lst[::-1]
+        res: List[BSPoint[LINE_TYPE]] = []
+        for bsp in self.iter_by_type(bs_type, is_buy, reverse=True):
+            res.append(bsp)
+            if number and len(res) >= number:
+                break
+        return res
+
+    def iter_by_type(self, bs_type: Iterable[BSP_TYPE], is_buy: Optional[bool] = None, reverse=False) -> Iterator[BSPoint[LINE_TYPE]]:
+        # 多个类型列表堆归并，同一个买卖点有多个类型时只返回一次
+        side_lst = [True, False] if is_buy is None else [is_buy]
+        lst_to_merge = [self.type_dict[(_type, _is_buy)] for _type in bs_type for _is_buy in side_lst if self.type_dict.get((_type, _is_buy))]
+        if reverse:
+            merged = heapq.merge(*(reversed(lst) for lst in lst_to_merge), key=bsp_key, reverse=True)
+        else:
+            merged = heapq.merge(*lst_to_merge, key=bsp_key)
+        last_bsp = None
+        for bsp in merged:
+            if bsp is not last_bsp:
+                yield bsp
+            last_bsp = bsp
+
+    def range_by_idx(self, begin_idx: int, end_idx: int) -> List[BSPoint[LINE_TYPE]]:
+        # bi.idx在[begin_idx, end_idx]内的买卖点，按时间升序
+        return self.lst[bisect_left(self.lst, begin_idx, key=bsp_key):bisect_right(self.lst, end_idx, key=bsp_key)]
+
+    def range_by_klu_idx(self, begin_klu_idx: int, end_klu_idx: int) -> List[BSPoint[LINE_TYPE]]:
+        # 买卖点所在K线(bsp.klu)序号在[begin_klu_idx, end_klu_idx]内
+        return self.lst[bisect_left(self.lst, begin_klu_idx, key=klu_idx_key):bisect_right(self.lst, end_klu_idx, key=klu_idx_key)]
+
+    def range_by_time(self, begin_time: CTime, end_time: CTime) -> List[BSPoint[LINE_TYPE]]:
+        return self.lst[bisect_left(self.lst, begin_time, key=klu_time_key):bisect_right(self.lst, end_time, key=klu_time_key)]
+
+
+def klu_idx_key(bsp: BSPoint) -> int:
+    return bsp.klu.idx
+
+
+def klu_time_key(bsp: BSPoint) -> CTime:
+    return bsp.klu.time
+
+
+def insort_tail(lst: List[BSPoint], bsp: BSPoint):
+    if not lst or lst[-1].bi.idx < bsp.bi.idx:
+        lst.append(bsp)
+    else:
+        insort(lst, bsp, key=bsp_key)
@@ -0,0 +1,241 @@
+import os
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from typing import Dict, Generator, Iterable, List, Optional, Set, Union
+
+from chan import Chan
+from chan_config import ChanConfig
+from common.enums import AUTYPE, DATA_SRC, KL_TYPE
+from common.chan_exception import ChanException, ErrCode
+from kline.kline_list import KLineList
+
+
+@dataclass
+class BspSummary:
+    time: str
+    klu_idx: int
+    bi_idx: int
+    is_buy: bool
+    type: str
+    price: float
+    is_sure: bool
+
+
+@dataclass
+class LineSummary:
+    idx: int
+    dir: str
+    begin_time: str
+    end_time: str
+    begin_val: float
+    end_val: float
+    is_sure: bool
+
+
+@dataclass
+class ZSSummary:
+    begin_time: str
+    end_time: str
+    low: float
+    high: float
+    begin_bi_idx: int
+    end_bi_idx: int
+    is_sure: bool
+
+
+@dataclass
+class LevelSummary:
+    kl_type: KL_TYPE
+    klu_cnt: int
+    klc_cnt: int
+    bi_cnt: int
+    seg_cnt: int
+    zs_cnt: int
+    latest_bsp: List[BspSummary] = field(default_factory=list)
+    latest_bi: List[LineSummary] = field(default_factory=list)
+    latest_seg: List[LineSummary] = field(default_factory=list)
+    latest_zs: List[ZSSummary] = field(default_factory=list)
+
+
+@dataclass
+class ChanBatchResult:
+    code: str
+    levels: Dict[KL_TYPE, LevelSummary] = field(default_factory=dict)
+    errcode: Optional[ErrCode] = None  # 非ChanException时为COMMON_ERROR
+    err_msg: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.errcode is None
+
+    def __getitem__(self, lv: KL_TYPE) -> LevelSummary:
+        return self.levels[lv]
+
+
+def summary_line(line) -> LineSummary:
+    return LineSummary(
+        idx=line.idx,
+        dir=line.dir.name,
+        begin_time=str(line.get_begin_klu().time),
+        end_time=str(line.get_end_klu().time),
+        begin_val=line.get_begin_val(),
+        end_val=line.get_end_val(),
+        is_sure=line.is_sure,
+    )
+
+
+def summary_level(kl_list: KLineList, number: int) -> LevelSummary:
+    res = LevelSummary(
+        kl_type=kl_list.kl_type,
+        klu_cnt=sum(len(klc.lst) for klc in kl_list.lst),
+        klc_cnt=len(kl_list.lst),
+        bi_cnt=len(kl_list.bi_list),
+        seg_cnt=len(kl_list.seg_list),
+        zs_cnt=len(kl_list.zs_list),
+    )
+    for bsp in kl_list.bs_point_lst.get_latest_bsp(number):
+        res.latest_bsp.append(BspSummary(
+            time=str(bsp.klu.time),
+            klu_idx=bsp.klu.idx,
+            bi_idx=bsp.bi.idx,
+            is_buy=bsp.is_buy,
+            type=bsp.type2str(),
+            price=bsp.klu.low if bsp.is_buy else bsp.klu.high,
+            is_sure=bsp.bi.is_sure,
+        ))
+    res.latest_bi = [summary_line(bi) for bi in kl_list.bi_list[-number:]] if number else [summary_line(bi) for bi in kl_list.bi_list]
+    res.latest_seg = [summary_line(seg) for seg in kl_list.seg_list[-number:]] if number else [summary_line(seg) for seg in kl_list.seg_list]
+    for zs in (kl_list.zs_list[-number:] if number else kl_list.zs_list):
+        res.latest_zs.append(ZSSummary(
+            begin_time=str(zs.begin.time),
+            end_time=str(zs.end.time),
+            low=zs.low,
+            high=zs.high,
+            begin_bi_idx=zs.begin_bi.idx,
+            end_bi_idx=zs.end_bi.idx,
+            is_sure=zs.is_sure,
+        ))
+    return res
+
+
+def run_single_code(code, lv_list, config, data_src, begin_time, end_time, autype, number) -> ChanBatchResult:
+    # 子进程入口，只返回可pickle的精简结果，不返回Chan对象
+    try:
+        chan = Chan(
+            code=code,
+            begin_time=begin_time,
+            end_time=end_time,
+            data_src=data_src,
+            lv_list=list(lv_list),
+            config=config,
+            autype=autype,
+        )
+        if config.trigger_step:
+            for _ in chan.step_load():
+                ...
+        return ChanBatchResult(code=code, levels={lv: summary_level(chan[lv], number) for lv in chan.lv_list})
+    except ChanException as e:
+        return ChanBatchResult(code=code, errcode=e.errcode, err_msg=e.msg)
+    except Exception as e:
+        return ChanBatchResult(code=code, errcode=ErrCode.COMMON_ERROR, err_msg=f"{type(e).__name__}: {e}")
+
+
+def _run_code_chunk(args_lst: List[tuple]) -> List[ChanBatchResult]:
+    return [run_single_code(*args) for args in args_lst]
+
+
+class ChanBatch:
+    def __init__(
+        self,
+        codes: Iterable[str],
+        lv_list=None,
+        config: Optional[ChanConfig] = None,
+        data_src: Union[DATA_SRC, str] = DATA_SRC.FUTU,
+        begin_time=None,
+        end_time=None,
+        autype: AUTYPE = AUTYPE.QFQ,
+        max_workers: Optional[int] = None,
+        chunksize: int = 1,
+        bsp_number: int = 1,
+        raise_on_error: bool = False,
+    ):
+        # max_workers=1时不开进程池，直接在当前进程串行计算，方便调试
+        # bsp_number: 每个级别返回最新多少个买卖点/笔/线段/中枢，0则返回全部
+        # codes中重复的代码只计算一次
+        if lv_list is None:
+            lv_list = [KL_TYPE.K_DAY]
+        if config is None:
+            config = ChanConfig({"trigger_step": False})
+        if chunksize < 1:
+            raise ChanException(f"chunksize={chunksize} must be positive", ErrCode.PARA_ERROR)
+        self.codes: List[str] = list(dict.fromkeys(codes))
+        self.lv_list: List[KL_TYPE] = lv_list
+        self.config = config
+        self.data_src = data_src
+        self.begin_time = begin_time
+        self.end_time = end_time
+        self.autype = autype
+        self.max_workers = max_workers if max_workers is not None else (os.cpu_count() or 1)
+        self.chunksize = chunksize
+        self.bsp_number = bsp_number
+        self.raise_on_error = raise_on_error
+
+    def task_args(self, code):
+        return (code, self.lv_list, self.config, self.data_src, self.begin_time, self.end_time, self.autype, self.bsp_number)
+
+    def iter_result(self) -> Iterable[ChanBatchResult]:
+        # 串行时按codes顺序返回，并行时按完成顺序返回
+        if self.max_workers <= 1 or len(self.codes) <= 1:
+            for code in self.codes:
+                yield self.check_result(run_single_code(*self.task_args(code)))
+            return
+        chunks = [self.codes[chunk_begin:chunk_begin+self.chunksize] for chunk_begin in range(0, len(self.codes), self.chunksize)]
+        serial = False
+        while chunks:
+            # 有子进程崩溃(BrokenProcessPool)时整个进程池不可用，没算完的代码换新的进程池逐个重算
+            broken = yield from self.iter_pool_result(chunks, 1 if serial else self.max_workers)
+            if serial and broken:
+                # 单进程按提交顺序执行，第一个中断的代码就是让进程崩溃的代码，只有它记为失败
+                yield self.check_result(ChanBatchResult(code=broken[0], errcode=ErrCode.COMMON_ERROR, err_msg="BrokenProcessPool: worker process terminated abruptly"))
+                broken = broken[1:]
+                serial = False
+            else:
+                # 一个代码都没算完时改为单进程，找出崩溃的代码
+                serial = len(broken) == sum(len(chunk) for chunk in chunks)
+            chunks = [[code] for code in broken]
+
+    def iter_pool_result(self, chunks: List[List[str]], max_workers: int) -> Generator[ChanBatchResult, None, List[str]]:
+        # 返回因进程池损坏没有算完的代码，按提交顺序排列
+        broken_chunk: Set[int] = set()
+        with ProcessPoolExecutor(max_workers=min(max_workers, len(chunks))) as executor:
+            futures: Dict[Future, int] = {
+                executor.submit(_run_code_chunk, [self.task_args(code) for code in chunk]): chunk_idx
+                for chunk_idx, chunk in enumerate(chunks)
+            }
+            try:
+                for future in as_completed(futures):
+                    try:
+                        res_lst = future.result()
+                    except BrokenProcessPool:
+                        broken_chunk.add(futures[future])
+                        continue
+                    except Exception as e:
+                        # 参数无法pickle等错误每次都会出现，不重算
+                        res_lst = [ChanBatchResult(code=code, errcode=ErrCode.COMMON_ERROR, err_msg=f"{type(e).__name__}: {e}") for code in chunks[futures[future]]]
+                    for res in res_lst:
+                        yield self.check_result(res)
+            finally:
+                for future in futures:
+                    future.cancel()
+        return [code for chunk_idx, chunk in enumerate(chunks) if chunk_idx in broken_chunk for code in chunk]
+
+    def check_result(self, res: ChanBatchResult) -> ChanBatchResult:
+        if not res.ok and self.raise_on_error:
+            raise ChanException(f"[{res.code}]{res.err_msg}", res.errcode)  # type: ignore
+        return res
+
+    def run(self) -> Dict[str, ChanBatchResult]:
+        # 按codes顺序排列
+        res_dict = {res.code: res for res in self.iter_result()}
+        return {code: res_dict[code] for code in self.codes}
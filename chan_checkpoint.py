@@ -0,0 +1,71 @@
+"""
+trigger_load长时间运行时的断点保存与恢复
+
+保存的是Chan的完整增量状态(K线、笔、线段、中枢、买卖点、指标模型的EMA/Demark等内部状态、klu_cache/klu_last_t)，
+恢复后继续trigger_load新K线，结果和不中断运行完全一致
+
+K线/合并K线/笔/线段之间互相引用(pre/next、parent_seg、特征序列里的笔等)，直接pickle时递归深度和数据量成正比，
+所以这些对象统一登记到节点表里，pickle时先按表顺序把它们写成空对象，各节点的内容再按表顺序平铺保存，递归深度和K线数无关
+"""
+import copyreg
+import os
+import pickle
+import struct
+from typing import Any, Dict, List
+
+from common.chan_exception import ChanException, ErrCode
+from common.func_util import get_state, set_state
+
+CHECKPOINT_MAGIC = b"CHANCKPT"
+CHECKPOINT_VERSION = 2
+
+
+def collect_nodes(chan) -> List[Any]:
+    nodes: Dict[int, Any] = {}
+    for kl_list in chan.kl_datas.values():
+        for klu in kl_list.klu_iter():
+            nodes.setdefault(id(klu), klu)
+        for klc in kl_list.lst:
+            nodes.setdefault(id(klc), klc)
+        for line_list in kl_list.iter_line_lists():
+            for line in line_list:
+                nodes.setdefault(id(line), line)
+    return list(nodes.values())
+
+
+class NodePickler(pickle.Pickler):
+    """
+    节点只pickle成空对象(之后的引用走memo)，内容由节点状态表单独保存
+    用reducer_override而不是persistent_id：前者对int/float/list等内置类型不回调，快很多
+    """
+    def __init__(self, file, nodes: List[Any]):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.node_ids = {id(node) for node in nodes}
+
+    def reducer_override(self, obj):
+        if id(obj) in self.node_ids:
+            return copyreg.__newobj__, (type(obj),)
+        return NotImplemented
+
+
+def save_checkpoint(chan, file_path: str):
+    nodes = collect_nodes(chan)
+    tmp_path = f"{file_path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(CHECKPOINT_MAGIC)
+        f.write(struct.pack("<I", CHECKPOINT_VERSION))
+        NodePickler(f, nodes).dump((nodes, [get_state(node) for node in nodes], chan))
+    os.replace(tmp_path, file_path)  # 先写临时文件，保存过程中崩溃不会破坏上一个断点
+
+
+def load_checkpoint(file_path: str):
+    with open(file_path, "rb") as f:
+        if f.read(len(CHECKPOINT_MAGIC)) != CHECKPOINT_MAGIC:
+            raise ChanException(f"not a chan checkpoint file: {file_path}", ErrCode.SRC_DATA_FORMAT_ERROR)
+        version, = struct.unpack("<I", f.read(4))
+        if version != CHECKPOINT_VERSION:
+            raise ChanException(f"checkpoint version={version} is not supported, expect {CHECKPOINT_VERSION}", ErrCode.SRC_DATA_FORMAT_ERROR)
+        nodes, states, chan = pickle.load(f)
+    for node, state in zip(nodes, states):
+        set_state(node, state)
+    return chan
@@ -2,15 +2,9 @@ from typing import List
 
 from bi.bi_config import BiConfig
 from buy_sell_point.bs_point_config import BSPointConfig
-from common.enums import TREND_TYPE
 from common.chan_exception import ChanException, ErrCode
 from common.func_util import _parse_inf
-from math_util.boll import BollModel
-from math_util.demark import DemarkEngine
-from math_util.kdj import KDJ
-from math_util.macd import MACD
-from math_util.rsi import RSI
-from math_util.trend_model import TrendModel
+from math_util.metric_registry import create_metric_models
 from seg.seg_config import SegConfig
 from zs.zs_config import ZSConfig
 
@@ -31,6 +25,8 @@ class ChanConfig:
         self.seg_conf = SegConfig(
             seg_algo=conf.get("seg_algo", "chan"),
             left_method=conf.get("left_seg_method", "peak"),
+            incremental=conf.get("seg_incremental", True),
+            verify=conf.get("seg_verify", False),
         )
         self.zs_conf = ZSConfig(
             need_combine=conf.get("zs_combine", True),
@@ -41,6 +37,8 @@ class ChanConfig:
 
         self.trigger_step = conf.get("trigger_step", True)
         self.skip_step = conf.get("skip_step", 0)
+        self.skip_step_batch = conf.get("skip_step_batch", False)  # skip_step的K线用非逐步方式算完再切换到逐步模式
+        self.iterative_load = conf.get("iterative_load", True)  # False则使用递归的load_iterator
 
         self.kl_data_check = conf.get("kl_data_check", True)
         self.max_kl_misalign_cnt = conf.get("max_kl_misalign_cnt", 2)
@@ -67,40 +65,20 @@ class ChanConfig:
             'countdown_cmp2close': True,
         })
         self.boll_n = conf.get("boll_n", 20)
+        self.metric_history_len = conf.get("metric_history_len", 0)  # MACD/RSI/KDJ保存的历史结果数，None不限
+        self.batch_metric = conf.get("batch_metric", True)  # 非逐K线模式下指标在算线段中枢前统一批量计算
+        self.array_store = conf.get("array_store", False)  # K线数据和指标用numpy列式存储，省内存
+        self.profile = conf.get("profile", False)  # 统计各计算阶段耗时，见Chan.get_profile_report
+        self.metric_index = conf.get("metric_index", True)  # 笔的背驰指标用前缀和/区间最值计算，False时逐根遍历
+        self.metric_verify = conf.get("metric_verify", False)  # 笔的背驰指标同时用逐根遍历算一遍并校验
 
         self.set_bsp_config(conf)
 
         conf.check()
 
     def get_metric_model(self):
-        res: List[MACD | TrendModel | BollModel | DemarkEngine | RSI | KDJ] = [
-            MACD(
-                fastperiod=self.macd_config['fast'],
-                slowperiod=self.macd_config['slow'],
-                signalperiod=self.macd_config['signal'],
-            )
-        ]
-        res.extend(TrendModel(TREND_TYPE.MEAN, mean_T) for mean_T in self.mean_metrics)
-
-        for trend_T in self.trend_metrics:
-            res.append(TrendModel(TREND_TYPE.MAX, trend_T))
-            res.append(TrendModel(TREND_TYPE.MIN, trend_T))
-        res.append(BollModel(self.boll_n))
-        if self.cal_demark:
-            res.append(DemarkEngine(
-                demark_len=self.demark_config['demark_len'],
-                setup_bias=self.demark_config['setup_bias'],
-                countdown_bias=self.demark_config['countdown_bias'],
-                max_countdown=self.demark_config['max_countdown'],
-                tiaokong_st=self.demark_config['tiaokong_st'],
-                setup_cmp2close=self.demark_config['setup_cmp2close'],
-                countdown_cmp2close=self.demark_config['countdown_cmp2close'],
-            ))
-        if self.cal_rsi:
-            res.append(RSI(self.rsi_cycle))
-        if self.cal_kdj:
-            res.append(KDJ(self.kdj_cycle))
-        return res
+        # 按math_util.metric_registry中注册的指标插件创建，自定义指标用register_metric注册
+        return create_metric_models(self)
 
     def set_bsp_config(self, conf):
         para_dict = {
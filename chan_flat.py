@@ -0,0 +1,400 @@
+"""
+Chan计算结果的扁平二进制格式，替代chan_dump_pickle
+
+文件结构：8字节MAGIC + 版本号(uint32) + 头部长度(uint32) + json头部，之后是按ALIGN对齐的定长记录数组
+每个级别一组数组，对象之间的引用(笔->合并K线、线段->笔、中枢->笔、买卖点->笔等)都存成所在列表的下标，-1表示None
+头部记录了每个数组的偏移、dtype和长度，以及枚举的名称顺序，读取时mmap映射，只访问用到的级别
+"""
+import json
+import os
+from typing import Dict, Iterable, List, Optional, Union
+
+import numpy as np
+
+from chan_config import ChanConfig
+from chan_snapshot import BiRecord, BSPRecord, KLCRecord, LevelState, SegRecord, ZSRecord
+from common.enums import BI_DIR, BSP_TYPE, DATA_FIELD, DATA_SRC, FX_TYPE, KL_TYPE, KLINE_DIR, TRADE_INFO_LST
+from common.chan_exception import ChanException, ErrCode
+from kline.kline_list import KLineList
+from kline.kline_store import decode_time_bulk, encode_time
+from kline.kline_unit import KLineUnit
+
+FLAT_MAGIC = b"CHANFLAT"
+FLAT_VERSION = 1
+ALIGN = 64
+
+FLAT_ENUMS = {
+    "KLINE_DIR": KLINE_DIR,
+    "FX_TYPE": FX_TYPE,
+    "BI_DIR": BI_DIR,
+    "BSP_TYPE": BSP_TYPE,
+}
+
+KLU_DTYPE = np.dtype([
+    ("time_code", "<i8"),
+    ("time_ts", "<f8"),
+    ("time_auto", "?"),
+    (DATA_FIELD.FIELD_OPEN, "<f8"),
+    (DATA_FIELD.FIELD_HIGH, "<f8"),
+    (DATA_FIELD.FIELD_LOW, "<f8"),
+    (DATA_FIELD.FIELD_CLOSE, "<f8"),
+] + [(metric_name, "<f8") for metric_name in TRADE_INFO_LST] + [  # 缺失的成交信息为nan
+    ("limit_flag", "i1"),
+    ("macd_dif", "<f8"),  # 没有计算MACD时为nan
+    ("macd_dea", "<f8"),
+    ("macd", "<f8"),
+    ("klc_idx", "<i4"),
+    ("sup_idx", "<i4"),  # 父级别KLU的idx
+])
+
+KLC_DTYPE = np.dtype([
+    ("begin_klu", "<i4"),
+    ("end_klu", "<i4"),
+    ("high", "<f8"),
+    ("low", "<f8"),
+    ("fx", "i1"),
+    ("dir", "i1"),
+])
+
+# 线段的线段中begin/end指向线段列表
+BI_DTYPE = np.dtype([
+    ("begin_klc", "<i4"),
+    ("end_klc", "<i4"),
+    ("begin_klu", "<i4"),
+    ("end_klu", "<i4"),
+    ("begin_val", "<f8"),
+    ("end_val", "<f8"),
+    ("dir", "i1"),
+    ("is_sure", "?"),
+    ("seg_idx", "<i4"),
+])
+
+# 线段的线段中start_bi/end_bi指向线段列表，zs_begin/zs_end是线段内中枢在中枢数组中的下标区间[zs_begin, zs_end)
+SEG_DTYPE = np.dtype([
+    ("start_bi", "<i4"),
+    ("end_bi", "<i4"),
+    ("begin_klu", "<i4"),
+    ("end_klu", "<i4"),
+    ("dir", "i1"),
+    ("is_sure", "?"),
+    ("zs_begin", "<i4"),
+    ("zs_end", "<i4"),
+])
+
+ZS_DTYPE = np.dtype([
+    ("begin_bi", "<i4"),
+    ("end_bi", "<i4"),
+    ("begin_klu", "<i4"),
+    ("end_klu", "<i4"),
+    ("low", "<f8"),
+    ("high", "<f8"),
+    ("peak_low", "<f8"),
+    ("peak_high", "<f8"),
+    ("bi_in", "<i4"),
+    ("bi_out", "<i4"),
+    ("is_sure", "?"),
+])
+
+# types是BSP_TYPE在FLAT_ENUMS中顺序的位掩码，首个类型单独记在main_type
+BSP_DTYPE = np.dtype([
+    ("bi_idx", "<i4"),
+    ("klu_idx", "<i4"),
+    ("is_buy", "?"),
+    ("main_type", "i1"),
+    ("types", "<u2"),
+    ("relate_bsp1", "<i4"),  # 关联一类买卖点所在笔的idx
+])
+
+ENUM_CODE = {item: code for enum_cls in FLAT_ENUMS.values() for code, item in enumerate(enum_cls)}
+
+
+def enum_code(value) -> int:
+    return -1 if value is None else ENUM_CODE[value]
+
+
+def line_idx(line) -> int:
+    return -1 if line is None else line.idx
+
+
+def klu_array(kl_list: KLineList) -> np.ndarray:
+    rows = []
+    for klu in kl_list.klu_iter():
+        trade_info = [klu.trade_info.metric.get(metric_name) for metric_name in TRADE_INFO_LST]
+        macd = getattr(klu, "macd", None)
+        rows.append((
+            encode_time(klu.time), klu.time.ts, klu.time.auto, klu.open, klu.high, klu.low, klu.close,
+            *(np.nan if v is None else v for v in trade_info),
+            klu.limit_flag,
+            np.nan if macd is None else macd.DIF,
+            np.nan if macd is None else macd.DEA,
+            np.nan if macd is None else macd.macd,
+            klu.klc.idx,
+            line_idx(klu.sup_kl),
+        ))
+    return np.array(rows, dtype=KLU_DTYPE)
+
+
+def klc_array(kl_list: KLineList) -> np.ndarray:
+    return np.array([(klc.lst[0].idx, klc.lst[-1].idx, klc.high, klc.low, enum_code(klc.fx), enum_code(klc.dir)) for klc in kl_list.lst], dtype=KLC_DTYPE)
+
+
+def bi_array(bi_list) -> np.ndarray:
+    return np.array([
+        (
+            bi.begin_klc.idx,
+            bi.end_klc.idx,
+            bi.get_begin_klu().idx,
+            bi.get_end_klu().idx,
+            bi.get_begin_val(),
+            bi.get_end_val(),
+            enum_code(bi.dir),
+            bi.is_sure,
+            -1 if bi.seg_idx is None else bi.seg_idx,
+        ) for bi in bi_list
+    ], dtype=BI_DTYPE)
+
+
+def seg_array(seg_list, zs_list) -> np.ndarray:
+    zs_pos = {id(zs): pos for pos, zs in enumerate(zs_list)}
+    rows = []
+    for seg in seg_list:
+        pos_lst = [zs_pos.get(id(zs), -1) for zs in seg.zs_lst]
+        if pos_lst and (-1 in pos_lst or pos_lst != list(range(pos_lst[0], pos_lst[0] + len(pos_lst)))):
+            raise ChanException(f"zs of seg {seg.idx} is not a continuous range of zs_list", ErrCode.COMMON_ERROR)
+        zs_begin = pos_lst[0] if pos_lst else 0
+        rows.append((seg.start_bi.idx, seg.end_bi.idx, seg.get_begin_klu().idx, seg.get_end_klu().idx, enum_code(seg.dir), seg.is_sure, zs_begin, zs_begin + len(pos_lst)))
+    return np.array(rows, dtype=SEG_DTYPE)
+
+
+def zs_array(zs_list) -> np.ndarray:
+    return np.array([
+        (zs.begin_bi.idx, zs.end_bi.idx, zs.begin.idx, zs.end.idx, zs.low, zs.high, zs.peak_low, zs.peak_high, line_idx(zs.bi_in), line_idx(zs.bi_out), zs.is_sure)
+        for zs in zs_list
+    ], dtype=ZS_DTYPE)
+
+
+def bsp_array(bsp_lst) -> np.ndarray:
+    rows = []
+    for bsp in bsp_lst:
+        types = 0
+        for bs_type in bsp.type:
+            types |= 1 << enum_code(bs_type)
+        relate_bsp1 = -1 if bsp.relate_bsp1 is None else bsp.relate_bsp1.bi.idx
+        rows.append((bsp.bi.idx, bsp.klu.idx, bsp.is_buy, enum_code(bsp.type[0]), types, relate_bsp1))
+    return np.array(rows, dtype=BSP_DTYPE)
+
+
+def level_arrays(kl_list: KLineList) -> Dict[str, np.ndarray]:
+    return {
+        "klu": klu_array(kl_list),
+        "klc": klc_array(kl_list),
+        "bi": bi_array(kl_list.bi_list),
+        "seg": seg_array(kl_list.seg_list, kl_list.zs_list),
+        "zs": zs_array(kl_list.zs_list),
+        "bsp": bsp_array(kl_list.bs_point_lst),
+        "segseg": seg_array(kl_list.segseg_list, kl_list.segzs_list),
+        "segzs": zs_array(kl_list.segzs_list),
+        "seg_bsp": bsp_array(kl_list.seg_bs_point_lst),
+    }
+
+
+def align(pos: int) -> int:
+    return (pos + ALIGN - 1) // ALIGN * ALIGN
+
+
+def dump_chan_flat(chan, file_path: str):
+    level_data = {lv: level_arrays(chan[lv]) for lv in chan.lv_list}
+    header: dict = {
+        "version": FLAT_VERSION,
+        "code": chan.code,
+        "data_src": chan.data_src.name if isinstance(chan.data_src, DATA_SRC) else chan.data_src,
+        "lv_list": [lv.name for lv in chan.lv_list],
+        "enums": {name: [item.name for item in enum_cls] for name, enum_cls in FLAT_ENUMS.items()},
+        "levels": {},
+    }
+    # 头部长度影响数组偏移，先按相对偏移记录，最后统一加上数据区起点
+    pos = 0
+    for lv, arrays in level_data.items():
+        header["levels"][lv.name] = {}
+        for name, arr in arrays.items():
+            header["levels"][lv.name][name] = {"offset": pos, "count": len(arr), "dtype": arr.dtype.descr}
+            pos = align(pos + arr.nbytes)
+    header_bytes = json.dumps(header).encode()
+    data_begin = align(len(FLAT_MAGIC) + 8 + len(header_bytes))
+
+    tmp_path = f"{file_path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(FLAT_MAGIC)
+        f.write(np.array([FLAT_VERSION, len(header_bytes)], dtype="<u4").tobytes())
+        f.write(header_bytes)
+        for lv, arrays in level_data.items():
+            for name, arr in arrays.items():
+                f.seek(data_begin + header["levels"][lv.name][name]["offset"])
+                f.write(arr.tobytes())
+        f.truncate(data_begin + pos)
+    os.replace(tmp_path, file_path)  # 先写临时文件，避免读到写了一半的文件
+
+
+def read_header(file_path: str):
+    with open(file_path, "rb") as f:
+        if f.read(len(FLAT_MAGIC)) != FLAT_MAGIC:
+            raise ChanException(f"not a chan flat file: {file_path}", ErrCode.SRC_DATA_FORMAT_ERROR)
+        version, header_len = np.frombuffer(f.read(8), dtype="<u4").tolist()
+        if version > FLAT_VERSION:
+            raise ChanException(f"chan flat file version={version} is newer than supported version={FLAT_VERSION}", ErrCode.SRC_DATA_FORMAT_ERROR)
+        header = json.loads(f.read(header_len))
+    return header, align(len(FLAT_MAGIC) + 8 + header_len)
+
+
+class FlatLevel:
+    """
+    单个级别的数据，各数组是只读的结构化numpy数组(mmap)，字段见*_DTYPE
+    """
+    def __init__(self, lv: KL_TYPE, arrays: Dict[str, np.ndarray], enums: Dict[str, list]):
+        self.lv = lv
+        self.klu = arrays["klu"]
+        self.klc = arrays["klc"]
+        self.bi = arrays["bi"]
+        self.seg = arrays["seg"]
+        self.zs = arrays["zs"]
+        self.bsp = arrays["bsp"]
+        self.segseg = arrays["segseg"]
+        self.segzs = arrays["segzs"]
+        self.seg_bsp = arrays["seg_bsp"]
+        # 按写入时的枚举名称顺序解码，枚举增删成员后旧文件仍可读
+        self.enums = {name: [getattr(FLAT_ENUMS[name], item_name) for item_name in item_names] for name, item_names in enums.items()}
+
+    def decode(self, enum_name: str, code: int):
+        return None if code < 0 else self.enums[enum_name][code]
+
+    def bsp_types(self, types: int) -> List[BSP_TYPE]:
+        return [bs_type for bit, bs_type in enumerate(self.enums["BSP_TYPE"]) if types >> bit & 1]
+
+    def klc_records(self) -> List[KLCRecord]:
+        return [
+            KLCRecord(idx, begin_klu, end_klu, high, low, self.decode("FX_TYPE", fx), self.decode("KLINE_DIR", _dir))
+            for idx, (begin_klu, end_klu, high, low, fx, _dir) in enumerate(self.klc.tolist())
+        ]
+
+    def bi_records(self) -> List[BiRecord]:
+        return [
+            BiRecord(idx, self.decode("BI_DIR", _dir), begin_klc, end_klc, begin_klu, end_klu, begin_val, end_val, is_sure)
+            for idx, (begin_klc, end_klc, begin_klu, end_klu, begin_val, end_val, _dir, is_sure, _) in enumerate(self.bi.tolist())
+        ]
+
+    def seg_records(self, is_segseg=False) -> List[SegRecord]:
+        seg_arr, zs_arr = (self.segseg, self.segzs) if is_segseg else (self.seg, self.zs)
+        zs_begin_bi = zs_arr["begin_bi"].tolist()
+        return [
+            SegRecord(idx, self.decode("BI_DIR", _dir), start_bi, end_bi, is_sure, tuple(zs_begin_bi[zs_begin:zs_end]))
+            for idx, (start_bi, end_bi, _, _, _dir, is_sure, zs_begin, zs_end) in enumerate(seg_arr.tolist())
+        ]
+
+    def zs_records(self, is_segzs=False) -> List[ZSRecord]:
+        return [
+            ZSRecord(begin_bi, end_bi, begin_klu, end_klu, low, high, peak_low, peak_high, None if bi_in < 0 else bi_in, None if bi_out < 0 else bi_out, is_sure)
+            for begin_bi, end_bi, begin_klu, end_klu, low, high, peak_low, peak_high, bi_in, bi_out, is_sure in (self.segzs if is_segzs else self.zs).tolist()
+        ]
+
+    def bsp_records(self, is_seg_bsp=False) -> List[BSPRecord]:
+        return [
+            BSPRecord(bi_idx, klu_idx, is_buy, ",".join(bs_type.value for bs_type in self.ordered_bsp_types(main_type, types)))
+            for bi_idx, klu_idx, is_buy, main_type, types, _ in (self.seg_bsp if is_seg_bsp else self.bsp).tolist()
+        ]
+
+    def ordered_bsp_types(self, main_type: int, types: int) -> List[BSP_TYPE]:
+        # 和BSPoint.type一致，首个类型在前；其余类型的加入顺序没有保存，按枚举顺序
+        first = self.enums["BSP_TYPE"][main_type]
+        return [first] + [bs_type for bs_type in self.bsp_types(types) if bs_type != first]
+
+    def to_level_state(self) -> LevelState:
+        # 转为chan_snapshot中的记录形式，可以和ChanHistory的结果直接比较
+        return LevelState(
+            klu_cnt=len(self.klu),
+            klc_lst=self.klc_records(),
+            bi_lst=self.bi_records(),
+            seg_lst=self.seg_records(),
+            zs_lst=self.zs_records(),
+            bsp_lst=self.bsp_records(),
+            segseg_lst=self.seg_records(is_segseg=True),
+            segzs_lst=self.zs_records(is_segzs=True),
+            seg_bsp_lst=self.bsp_records(is_seg_bsp=True),
+        )
+
+    def klu_iter(self) -> Iterable[KLineUnit]:
+        # 按存储的K线数据重新生成KLineUnit(不含指标)，用于回放
+        times = decode_time_bulk(self.klu["time_code"], self.klu["time_ts"])
+        for t, auto in zip(times, self.klu["time_auto"].tolist()):
+            t.auto = auto
+        columns = [self.klu[name].tolist() for name in (DATA_FIELD.FIELD_OPEN, DATA_FIELD.FIELD_HIGH, DATA_FIELD.FIELD_LOW, DATA_FIELD.FIELD_CLOSE, *TRADE_INFO_LST)]
+        for t, _open, high, low, close, *trade_info in zip(times, *columns):
+            item = {
+                DATA_FIELD.FIELD_TIME: t,
+                DATA_FIELD.FIELD_OPEN: _open,
+                DATA_FIELD.FIELD_HIGH: high,
+                DATA_FIELD.FIELD_LOW: low,
+                DATA_FIELD.FIELD_CLOSE: close,
+            }
+            for metric_name, value in zip(TRADE_INFO_LST, trade_info):
+                if value == value:  # 跳过nan
+                    item[metric_name] = value
+            yield KLineUnit(item)
+
+
+class ChanFlat:
+    """
+    dump_chan_flat写入的文件，lv_list只加载指定级别，其余级别的数据不会被读取
+    """
+    def __init__(self, file_path: str, lv_list: Union[KL_TYPE, List[KL_TYPE], None] = None):
+        header, data_begin = read_header(file_path)
+        self.file_path = file_path
+        self.version: int = header["version"]
+        self.code = header["code"]
+        self.data_src: Union[DATA_SRC, str] = DATA_SRC[header["data_src"]] if header["data_src"] in DATA_SRC.__members__ else header["data_src"]
+        self.all_lv_list = [KL_TYPE[lv_name] for lv_name in header["lv_list"]]
+        if lv_list is None:
+            lv_list = self.all_lv_list
+        elif isinstance(lv_list, KL_TYPE):
+            lv_list = [lv_list]
+        self.levels: Dict[KL_TYPE, FlatLevel] = {}
+        for lv in lv_list:
+            if lv.name not in header["levels"]:
+                raise ChanException(f"{lv} not in chan flat file, levels={header['lv_list']}", ErrCode.PARA_ERROR)
+            arrays = {}
+            for name, info in header["levels"][lv.name].items():
+                dtype = np.dtype([tuple(field) for field in info["dtype"]])
+                if info["count"] == 0:
+                    arrays[name] = np.empty(0, dtype=dtype)
+                else:
+                    arrays[name] = np.memmap(file_path, dtype=dtype, mode="r", offset=data_begin + info["offset"], shape=(info["count"],))
+            self.levels[lv] = FlatLevel(lv, arrays, header["enums"])
+        self.lv_list = [lv for lv in self.all_lv_list if lv in self.levels]
+
+    def __getitem__(self, lv: Union[KL_TYPE, int]) -> FlatLevel:
+        if isinstance(lv, int):
+            return self.levels[self.lv_list[lv]]
+        return self.levels[lv]
+
+    def to_chan(self, config: Optional[ChanConfig] = None):
+        """
+        用文件中的K线重新计算出Chan对象，之后可以继续trigger_load新的K线
+        只保存了K线和计算结果，没有中间状态，所以要重新计算；trigger_step=True时和skip_step_batch一样，
+        K线先按非逐步方式加入，最后整体算一次线段中枢买卖点再切回逐步模式，结果和逐根回放一致
+        """
+        from chan import Chan
+        if config is None:
+            config = ChanConfig({"trigger_step": True})
+        inp = {lv: list(self.levels[lv].klu_iter()) for lv in self.lv_list}
+        if not config.trigger_step:
+            # trigger_step=False时构造Chan会从数据源加载，先按逐步模式构造，再切回来
+            config.trigger_step = True
+            chan = Chan(self.code, data_src=self.data_src, lv_list=self.lv_list, config=config)
+            config.trigger_step = False
+            chan.do_init()
+            chan.trigger_load(inp)
+            return chan
+        chan = Chan(self.code, data_src=self.data_src, lv_list=self.lv_list, config=config)
+        chan.set_step_calculation(False)
+        chan.trigger_load(inp)
+        chan.set_step_calculation(True)
+        return chan
@@ -0,0 +1,338 @@
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple, TypeVar
+
+from common.enums import BI_DIR, FX_TYPE, KL_TYPE, KLINE_DIR
+from common.chan_exception import ChanException, ErrCode
+from kline.kline_list import KLineList
+from kline.kline_unit import KLineUnit
+
+T = TypeVar('T')
+
+
+@dataclass(frozen=True)
+class KLCRecord:
+    idx: int
+    begin_klu_idx: int
+    end_klu_idx: int
+    high: float
+    low: float
+    fx: FX_TYPE
+    dir: KLINE_DIR
+
+
+@dataclass(frozen=True)
+class BiRecord:
+    idx: int
+    dir: BI_DIR
+    begin_klc_idx: int
+    end_klc_idx: int
+    begin_klu_idx: int
+    end_klu_idx: int
+    begin_val: float
+    end_val: float
+    is_sure: bool
+
+
+@dataclass(frozen=True)
+class SegRecord:
+    idx: int
+    dir: BI_DIR
+    start_bi_idx: int
+    end_bi_idx: int
+    is_sure: bool
+    zs_begin_bi_idx: Tuple[int, ...]  # 线段内各中枢的begin_bi.idx，中枢详情见zs_lst
+
+
+@dataclass(frozen=True)
+class ZSRecord:
+    begin_bi_idx: int
+    end_bi_idx: int
+    begin_klu_idx: int
+    end_klu_idx: int
+    low: float
+    high: float
+    peak_low: float
+    peak_high: float
+    bi_in_idx: Optional[int]
+    bi_out_idx: Optional[int]
+    is_sure: bool
+
+
+@dataclass(frozen=True)
+class BSPRecord:
+    bi_idx: int
+    klu_idx: int
+    is_buy: bool
+    type: str
+
+
+@dataclass
+class ListDelta:
+    keep: int  # 上一步的前keep个元素保持不变
+    new: list  # keep之后的所有元素
+
+    def apply(self, lst: list):
+        del lst[self.keep:]
+        lst.extend(self.new)
+
+    def __len__(self):
+        return len(self.new)
+
+
+@dataclass
+class LevelDelta:
+    new_klu: List[KLineUnit]  # 新增的KLU，KLU本身加入后不再变化
+    klc: ListDelta
+    bi: ListDelta
+    seg: ListDelta
+    zs: ListDelta
+    bsp: ListDelta
+    segseg: ListDelta
+    segzs: ListDelta
+    seg_bsp: ListDelta
+
+
+@dataclass
+class ChanDelta:
+    step: int
+    levels: Dict[KL_TYPE, LevelDelta]
+
+    def __getitem__(self, lv: KL_TYPE) -> LevelDelta:
+        return self.levels[lv]
+
+
+@dataclass
+class LevelState:
+    klu_cnt: int = 0
+    klc_lst: List[KLCRecord] = field(default_factory=list)
+    bi_lst: List[BiRecord] = field(default_factory=list)
+    seg_lst: List[SegRecord] = field(default_factory=list)
+    zs_lst: List[ZSRecord] = field(default_factory=list)
+    bsp_lst: List[BSPRecord] = field(default_factory=list)  # 按bi.idx排序
+    # 线段级别，记录中的bi_idx/start_bi_idx等都是线段的idx
+    segseg_lst: List[SegRecord] = field(default_factory=list)
+    segzs_lst: List[ZSRecord] = field(default_factory=list)
+    seg_bsp_lst: List[BSPRecord] = field(default_factory=list)  # 按seg.idx排序
+
+    def copy(self) -> 'LevelState':
+        return LevelState(
+            klu_cnt=self.klu_cnt,
+            klc_lst=list(self.klc_lst),
+            bi_lst=list(self.bi_lst),
+            seg_lst=list(self.seg_lst),
+            zs_lst=list(self.zs_lst),
+            bsp_lst=list(self.bsp_lst),
+            segseg_lst=list(self.segseg_lst),
+            segzs_lst=list(self.segzs_lst),
+            seg_bsp_lst=list(self.seg_bsp_lst),
+        )
+
+    def apply(self, delta: LevelDelta):
+        self.klu_cnt += len(delta.new_klu)
+        delta.klc.apply(self.klc_lst)
+        delta.bi.apply(self.bi_lst)
+        delta.seg.apply(self.seg_lst)
+        delta.zs.apply(self.zs_lst)
+        delta.bsp.apply(self.bsp_lst)
+        delta.segseg.apply(self.segseg_lst)
+        delta.segzs.apply(self.segzs_lst)
+        delta.seg_bsp.apply(self.seg_bsp_lst)
+
+
+@dataclass
+class ChanState:
+    step: int
+    levels: Dict[KL_TYPE, LevelState]
+
+    def __getitem__(self, lv: KL_TYPE) -> LevelState:
+        return self.levels[lv]
+
+    def copy(self) -> 'ChanState':
+        return ChanState(step=self.step, levels={lv: state.copy() for lv, state in self.levels.items()})
+
+
+def klc_record(klc) -> KLCRecord:
+    return KLCRecord(klc.idx, klc.lst[0].idx, klc.lst[-1].idx, klc.high, klc.low, klc.fx, klc.dir)
+
+
+def bi_record(bi) -> BiRecord:
+    return BiRecord(
+        bi.idx,
+        bi.dir,
+        bi.begin_klc.idx,
+        bi.end_klc.idx,
+        bi.get_begin_klu().idx,
+        bi.get_end_klu().idx,
+        bi.get_begin_val(),
+        bi.get_end_val(),
+        bi.is_sure,
+    )
+
+
+def seg_record(seg) -> SegRecord:
+    return SegRecord(
+        seg.idx,
+        seg.dir,
+        seg.start_bi.idx,
+        seg.end_bi.idx,
+        seg.is_sure,
+        tuple(zs.begin_bi.idx for zs in seg.zs_lst),
+    )
+
+
+def zs_record(zs) -> ZSRecord:
+    return ZSRecord(
+        zs.begin_bi.idx,
+        zs.end_bi.idx,
+        zs.begin.idx,
+        zs.end.idx,
+        zs.low,
+        zs.high,
+        zs.peak_low,
+        zs.peak_high,
+        zs.bi_in.idx if zs.bi_in else None,
+        zs.bi_out.idx if zs.bi_out else None,
+        zs.is_sure,
+    )
+
+
+def bsp_record(bsp) -> BSPRecord:
+    return BSPRecord(bsp.bi.idx, bsp.klu.idx, bsp.is_buy, bsp.type2str())
+
+
+def get_frozen_pos(seg_list, ele_limit: Optional[int] = None) -> Tuple[int, int]:
+    # ele_limit: 内部元素(笔或线段)从该idx起仍可能变化，线段级别用笔级别的冻结位置
+    seg_idx = len(seg_list)
+    while seg_idx > 0 and (not seg_list[seg_idx-1].ele_inside_is_sure or (ele_limit is not None and seg_list[seg_idx-1].end_bi.idx >= ele_limit)):
+        seg_idx -= 1
+    ele_idx = seg_list[seg_idx].start_bi.idx if seg_idx < len(seg_list) else 0
+    if ele_limit is not None:
+        ele_idx = min(ele_idx, ele_limit)
+    return seg_idx, ele_idx
+
+
+def bsp_begin_pos(bsp_lst: List[BSPRecord], ele_begin: int) -> int:
+    bsp_begin = len(bsp_lst)
+    while bsp_begin > 0 and bsp_lst[bsp_begin-1].bi_idx >= ele_begin:
+        bsp_begin -= 1
+    return bsp_begin
+
+
+def zs_begin_pos(zs_list, ele_begin: int) -> int:
+    zs_begin = len(zs_list)
+    while zs_begin > 0 and zs_list[zs_begin-1].end_bi.idx >= ele_begin:
+        zs_begin -= 1
+    return zs_begin
+
+
+def diff_tail(old: list, new: list, offset: int) -> ListDelta:
+    # old/new都是从offset位置开始的尾部，offset之前保证未变化
+    keep = 0
+    while keep < len(old) and keep < len(new) and old[keep] == new[keep]:
+        keep += 1
+    return ListDelta(keep=offset+keep, new=new[keep:])
+
+
+def tail_delta(old: List[T], cur_lst, begin: int, to_record: Callable[..., T]) -> ListDelta:
+    begin = min(begin, len(old))
+    return diff_tail(old[begin:], [to_record(item) for item in cur_lst[begin:]], begin)
+
+
+class ChanHistory:
+    """
+    step_load的增量快照
+
+    每一步只记录相比上一步的变化（新增KLU，变化的合并K线/笔/线段/中枢/买卖点），
+    避免每一步deepcopy整个Chan；通过history[step]可以还原任意历史步的状态。
+    """
+    def __init__(self, checkpoint_interval: int = 256):
+        # 每隔checkpoint_interval步保存一次完整状态，还原历史状态时从最近的checkpoint开始重放
+        if checkpoint_interval < 1:
+            raise ChanException(f"checkpoint_interval={checkpoint_interval} must be positive", ErrCode.PARA_ERROR)
+        self.checkpoint_interval = checkpoint_interval
+        self.deltas: List[ChanDelta] = []
+        self.checkpoints: Dict[int, ChanState] = {}
+        self.klu_lst: Dict[KL_TYPE, List[KLineUnit]] = {}
+        self.cur_state: Optional[ChanState] = None
+        self.frozen_pos: Dict[KL_TYPE, Tuple[int, int]] = {}  # (seg.idx, bi.idx)，在此之前的线段和笔不会再变化
+        self.seg_frozen_pos: Dict[KL_TYPE, Tuple[int, int]] = {}  # (segseg.idx, seg.idx)
+
+    def __len__(self):
+        return len(self.deltas)
+
+    def __getitem__(self, step: int) -> ChanState:
+        return self.get_state(step)
+
+    def record(self, chan) -> ChanDelta:
+        step = len(self.deltas)
+        if self.cur_state is None:
+            self.cur_state = ChanState(step=-1, levels={lv: LevelState() for lv in chan.lv_list})
+        levels: Dict[KL_TYPE, LevelDelta] = {}
+        for lv in chan.lv_list:
+            if lv not in self.cur_state.levels:
+                self.cur_state.levels[lv] = LevelState()
+            levels[lv] = self.cal_level_delta(chan[lv], self.cur_state[lv], self.frozen_pos.get(lv, (0, 0)), self.seg_frozen_pos.get(lv, (0, 0)))
+            self.frozen_pos[lv] = get_frozen_pos(chan[lv].seg_list)
+            self.seg_frozen_pos[lv] = get_frozen_pos(chan[lv].segseg_list, self.frozen_pos[lv][0])
+            self.cur_state[lv].apply(levels[lv])
+            self.klu_lst.setdefault(lv, []).extend(levels[lv].new_klu)
+        self.cur_state.step = step
+        delta = ChanDelta(step=step, levels=levels)
+        self.deltas.append(delta)
+        if step % self.checkpoint_interval == 0:
+            self.checkpoints[step] = self.cur_state.copy()
+        return delta
+
+    def get_state(self, step: int) -> ChanState:
+        if step < 0:
+            step += len(self.deltas)
+        if not 0 <= step < len(self.deltas):
+            raise ChanException(f"step={step} out of range [0, {len(self.deltas)})", ErrCode.PARA_ERROR)
+        assert self.cur_state is not None
+        if step == len(self.deltas) - 1:
+            return self.cur_state.copy()
+        checkpoint_step = step - step % self.checkpoint_interval
+        state = self.checkpoints[checkpoint_step].copy()
+        for delta in self.deltas[checkpoint_step+1:step+1]:
+            for lv, level_delta in delta.levels.items():
+                state.levels.setdefault(lv, LevelState()).apply(level_delta)
+        state.step = step
+        return state
+
+    def get_delta(self, step: int) -> ChanDelta:
+        return self.deltas[step]
+
+    def get_klu(self, lv: KL_TYPE, klu_idx: int) -> KLineUnit:
+        return self.klu_lst[lv][klu_idx]
+
+    def cal_level_delta(self, kl_list: KLineList, state: LevelState, frozen_pos: Tuple[int, int], seg_frozen_pos: Tuple[int, int]) -> LevelDelta:
+        # 新增的KLU只可能在上一步最后一根合并K线及之后，合并K线也只有最后一根会变化（合并 & 分形）
+        klc_begin = max(len(state.klc_lst) - 1, 0)
+        new_klu = [klu for klu in kl_list.klu_iter(klc_begin) if klu.idx >= state.klu_cnt]
+
+        # 第一个内部元素还不确定的线段之前的笔/线段/中枢/买卖点都不会再变化，参见update_zs_in_seg
+        # 这一步新确定下来的部分本步仍可能有变化，所以用上一步记录的位置
+        seg_begin, bi_begin = frozen_pos
+        zs_begin = zs_begin_pos(kl_list.zs_list, bi_begin)
+        bsp_begin = bsp_begin_pos(state.bsp_lst, bi_begin)
+        bsp_store = kl_list.bs_point_lst.bsp_store_flat_dict
+        cur_bsp = [bsp_record(bsp_store[bi.idx]) for bi in kl_list.bi_list[bi_begin:] if bi.idx in bsp_store]
+
+        # 线段级别同理，线段的线段只会在笔级别冻结的线段之后变化
+        segseg_begin, seg_ele_begin = seg_frozen_pos
+        segzs_begin = zs_begin_pos(kl_list.segzs_list, seg_ele_begin)
+        seg_bsp_begin = bsp_begin_pos(state.seg_bsp_lst, seg_ele_begin)
+        seg_bsp_store = kl_list.seg_bs_point_lst.bsp_store_flat_dict
+        cur_seg_bsp = [bsp_record(seg_bsp_store[seg.idx]) for seg in kl_list.seg_list[seg_ele_begin:] if seg.idx in seg_bsp_store]
+
+        return LevelDelta(
+            new_klu=new_klu,
+            klc=tail_delta(state.klc_lst, kl_list.lst, klc_begin, klc_record),
+            bi=tail_delta(state.bi_lst, kl_list.bi_list, bi_begin, bi_record),
+            seg=tail_delta(state.seg_lst, kl_list.seg_list, seg_begin, seg_record),
+            zs=tail_delta(state.zs_lst, kl_list.zs_list, zs_begin, zs_record),
+            bsp=diff_tail(state.bsp_lst[bsp_begin:], cur_bsp, bsp_begin),
+            segseg=tail_delta(state.segseg_lst, kl_list.segseg_list, segseg_begin, seg_record),
+            segzs=tail_delta(state.segzs_lst, kl_list.segzs_list, segzs_begin, zs_record),
+            seg_bsp=diff_tail(state.seg_bsp_lst[seg_bsp_begin:], cur_seg_bsp, seg_bsp_begin),
+        )
@@ -1,9 +1,13 @@
 import os
+from typing import List
+
+import numpy as np
 
 from common.enums import DATA_FIELD, KL_TYPE
 from common.chan_exception import ChanException, ErrCode
 from common.ctime import CTime
 from common.func_util import str2float
+from kline.kline_store import decode_time_bulk, encode_time, time_code2ts
 from kline.kline_unit import KLineUnit
 
 from .common_stock_api import CommonStockApi
@@ -40,9 +44,95 @@ def parse_time_column(inp):
     return CTime(year, month, day, hour, minute)
 
 
+# 各时间格式中年/月/日/时/分所在的字符位置
+TIME_FORMAT_SLICE = {
+    10: ((0, 4), (5, 7), (8, 10), None, None),  # 2021-09-13
+    17: ((0, 4), (4, 6), (6, 8), (8, 10), (10, 12)),  # 20210902113000000
+    19: ((0, 4), (5, 7), (8, 10), (11, 13), (14, 16)),  # 2021-09-02 11:30:00
+}
+
+
+def parse_time_column_bulk(time_col: np.ndarray) -> np.ndarray:
+    """
+    把整列时间字符串转成YYYYMMDDHHMMSS形式的int64，支持的格式同parse_time_column
+    """
+    str_len = np.char.str_len(time_col)
+    if len(time_col) == 0 or np.any(str_len != str_len[0]) or int(str_len[0]) not in TIME_FORMAT_SLICE:
+        # 格式不统一时逐行解析
+        return np.array([encode_time(parse_time_column(inp)) for inp in time_col], dtype=np.int64)
+    width = int(str_len[0])
+    digit = time_col.astype(f"U{width}").view(np.uint32).reshape(-1, width).astype(np.int64) - ord('0')
+    res = np.zeros(len(time_col), dtype=np.int64)
+    for pos in TIME_FORMAT_SLICE[width]:
+        value = np.zeros(len(time_col), dtype=np.int64)
+        if pos is not None:
+            if np.any((digit[:, pos[0]:pos[1]] < 0) | (digit[:, pos[0]:pos[1]] > 9)):
+                raise ChanException(f"unknown time column from csv:{time_col[0]}", ErrCode.SRC_DATA_FORMAT_ERROR)
+            for i in range(*pos):
+                value = value * 10 + digit[:, i]
+        res = res * (10000 if pos == (0, 4) else 100) + value
+    return res * 100  # 秒为0
+
+
+class CsvFields:
+    """
+    整个csv文件的内容和每行每个字段的起止位置(行数 x 列数)，按需取出某一列或某些行，不需要逐行split
+    按"\n"分行，和逐行读取文件时一致；每行列数不对时和逐行解析一样报错
+    """
+    def __init__(self, file_path: str, column_cnt: int, headers_exist: bool):
+        with open(file_path, 'r') as f:
+            self.buf = np.frombuffer(f.read().encode(), dtype=np.uint8)
+        line_end = np.flatnonzero(self.buf == ord("\n"))
+        if len(self.buf) and self.buf[-1] != ord("\n"):
+            line_end = np.append(line_end, len(self.buf))
+        line_begin = np.concatenate(([0], line_end[:-1] + 1)).astype(np.int64)
+        if headers_exist:
+            line_begin, line_end = line_begin[1:], line_end[1:]
+        comma = np.flatnonzero(self.buf == ord(","))
+        comma_begin, comma_end = np.searchsorted(comma, line_begin), np.searchsorted(comma, line_end)
+        if np.any(comma_end - comma_begin != column_cnt - 1):
+            raise ChanException(f"file format error: {file_path}", ErrCode.SRC_DATA_FORMAT_ERROR)
+        comma = comma[comma_begin[0]:comma_end[-1]].reshape(len(line_begin), column_cnt - 1) if len(line_begin) else np.empty((0, column_cnt - 1), dtype=np.int64)
+        self.field_begin = np.column_stack([line_begin, comma + 1])
+        self.field_end = np.column_stack([comma, line_end])
+
+    def __len__(self):
+        return len(self.field_begin)
+
+    def column_str(self, idx: int) -> np.ndarray:
+        # 第idx列的原始字符串(bytes)，不去掉空白，和逐行解析时比较的字符串一致
+        begin, end = self.field_begin[:, idx], self.field_end[:, idx]
+        width = end - begin
+        if len(width) and np.all(width == width[0]) and width[0] > 0:
+            return self.buf[begin[:, None] + np.arange(width[0])].view(f"S{width[0]}").ravel()
+        return np.array([self.buf[b:e].tobytes() for b, e in zip(begin.tolist(), end.tolist())], dtype=bytes)
+
+    def lines(self, begin: int, end: int) -> List[str]:
+        if begin >= end:
+            return []
+        return self.buf[self.field_begin[begin, 0]:self.field_end[end-1, -1]].tobytes().decode().split("\n")
+
+    def select_lines(self, row_idx: np.ndarray) -> List[str]:
+        return [self.buf[self.field_begin[row, 0]:self.field_end[row, -1]].tobytes().decode() for row in row_idx.tolist()]
+
+
+def load_float_columns(lines: List[str], column_idx: List[int]) -> np.ndarray:
+    """
+    解析lines中column_idx这些列，返回len(lines) x len(column_idx)的float64数组
+    """
+    if not lines:
+        return np.empty((0, len(column_idx)), dtype=np.float64)
+    try:
+        return np.loadtxt(lines, delimiter=",", dtype=np.float64, usecols=column_idx, comments=None, ndmin=2).reshape(len(lines), len(column_idx))
+    except ValueError:
+        # 含非法值时和str2float一样按0处理
+        return np.array([[str2float(data[idx]) for idx in column_idx] for data in (line.split(",") for line in lines)], dtype=np.float64).reshape(len(lines), len(column_idx))
+
+
 class CSV_API(CommonStockApi):
     def __init__(self, code, k_type=KL_TYPE.K_DAY, begin_date=None, end_date=None, autype=None):
         self.headers_exist = True  # 第一行是否是标题，如果是数据，设置为False
+        self.bulk_load = True  # 整个文件用numpy一次性解析，False时逐行解析
         self.columns = [
             DATA_FIELD.FIELD_TIME,
             DATA_FIELD.FIELD_OPEN,
@@ -62,6 +152,9 @@ class CSV_API(CommonStockApi):
         file_path = f"{cur_path}/../{self.code}_{k_type}.csv"
         if not os.path.exists(file_path):
             raise ChanException(f"file not exist: {file_path}", ErrCode.SRC_DATA_NOT_FOUND)
+        if self.bulk_load:
+            yield from self.get_kl_data_bulk(file_path)
+            return
 
         for line_number, line in enumerate(open(file_path, 'r')):
             if self.headers_exist and line_number == 0:
@@ -75,6 +168,37 @@ class CSV_API(CommonStockApi):
                 continue
             yield KLineUnit(create_item_dict(data, self.columns))
 
+    def get_kl_data_bulk(self, file_path):
+        # begin/end和逐行解析一样按时间列的原始字符串比较，先按时间列截取区间，只解析区间内的行
+        csv_fields = CsvFields(file_path, len(self.columns), self.headers_exist)
+        time_str = csv_fields.column_str(self.time_column_idx)
+        begin_date = None if self.begin_date is None else self.begin_date.encode()  # utf-8字节序和字符序一致
+        end_date = None if self.end_date is None else self.end_date.encode()
+        if len(time_str) > 1 and np.any(time_str[1:] < time_str[:-1]):
+            # 文件未按时间排序，不能二分，保持原顺序过滤
+            keep = np.ones(len(time_str), dtype=bool)
+            if begin_date is not None:
+                keep &= time_str >= begin_date
+            if end_date is not None:
+                keep &= time_str <= end_date
+            row_idx = np.flatnonzero(keep)
+            lines = csv_fields.select_lines(row_idx)
+            time_str = time_str[row_idx]
+        else:
+            begin = 0 if begin_date is None else int(np.searchsorted(time_str, begin_date, side="left"))
+            end = len(time_str) if end_date is None else int(np.searchsorted(time_str, end_date, side="right"))
+            lines = csv_fields.lines(begin, end)
+            time_str = time_str[begin:end]
+
+        time_code = parse_time_column_bulk(time_str.astype(str))
+        time_lst = decode_time_bulk(time_code, time_code2ts(time_code))
+        value_idx = [idx for idx in range(len(self.columns)) if idx != self.time_column_idx]
+        value_columns = [self.columns[idx] for idx in value_idx]
+        for t, values in zip(time_lst, load_float_columns(lines, value_idx).tolist()):
+            item = dict(zip(value_columns, values))
+            item[DATA_FIELD.FIELD_TIME] = t
+            yield KLineUnit(item)
+
     def set_basic_info(self):
         pass
 
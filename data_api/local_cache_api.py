@@ -0,0 +1,145 @@
+import os
+from typing import Iterable, Optional, Type
+
+import numpy as np
+
+from common.enums import AUTYPE, DATA_FIELD, KL_TYPE, TRADE_INFO_LST
+from common.chan_exception import ChanException, ErrCode
+from kline.kline_store import date_str2time_code, decode_time, encode_time
+from kline.kline_unit import KLineUnit
+
+from .common_stock_api import CommonStockApi
+
+# 每根K线一行定长记录，time_code为YYYYMMDDHHMMSS，按时间升序存放
+# time_ts是生成缓存时按本地时区算好的时间戳，读取时不再调用datetime.timestamp()
+# time_auto即CTime.auto，和chan_flat的KLU_DTYPE一致
+KL_CACHE_DTYPE = np.dtype([
+    ("time_code", "<i8"),
+    ("time_ts", "<f8"),
+    ("time_auto", "?"),
+    (DATA_FIELD.FIELD_OPEN, "<f8"),
+    (DATA_FIELD.FIELD_HIGH, "<f8"),
+    (DATA_FIELD.FIELD_LOW, "<f8"),
+    (DATA_FIELD.FIELD_CLOSE, "<f8"),
+] + [(metric_name, "<f8") for metric_name in TRADE_INFO_LST])  # 缺失的成交信息为nan
+
+# 没有time_auto列的旧缓存，读取时time_auto按True处理
+KL_CACHE_DTYPE_V1 = np.dtype([(name, KL_CACHE_DTYPE[name]) for name in KL_CACHE_DTYPE.names if name != "time_auto"])
+
+READ_CHUNK_SIZE = 4096
+
+
+def cache_file_path(code, k_type: KL_TYPE, cache_dir: Optional[str] = None) -> str:
+    if cache_dir is None:
+        cache_dir = LocalCacheApi.cache_dir or f"{os.path.dirname(os.path.realpath(__file__))}/../local_cache"
+    k_type_name = k_type.name[2:].lower()
+    return f"{cache_dir}/{code.replace('/', '_')}_{k_type_name}.npy"
+
+
+def load_kl_cache(code, k_type: KL_TYPE, cache_dir: Optional[str] = None) -> np.ndarray:
+    file_path = cache_file_path(code, k_type, cache_dir)
+    if not os.path.exists(file_path):
+        raise ChanException(f"file not exist: {file_path}", ErrCode.SRC_DATA_NOT_FOUND)
+    data = np.load(file_path, mmap_mode="r")
+    if data.dtype != KL_CACHE_DTYPE and data.dtype != KL_CACHE_DTYPE_V1:
+        raise ChanException(f"file format error: {file_path}", ErrCode.SRC_DATA_FORMAT_ERROR)
+    return data
+
+
+def upgrade_kl_cache(data: np.ndarray) -> np.ndarray:
+    if data.dtype == KL_CACHE_DTYPE:
+        return np.array(data)
+    res = np.empty(len(data), dtype=KL_CACHE_DTYPE)
+    for name in KL_CACHE_DTYPE_V1.names:
+        res[name] = data[name]
+    res["time_auto"] = True
+    return res
+
+
+def save_kl_data(code, k_type: KL_TYPE, klu_iter: Iterable[KLineUnit], cache_dir: Optional[str] = None) -> int:
+    """
+    把KLineUnit序列写入本地缓存，和已有缓存按时间合并，同一时间以新数据为准
+    返回合并后的K线数量
+    """
+    rows = []
+    for klu in klu_iter:
+        trade_info = [klu.trade_info.metric.get(metric_name) for metric_name in TRADE_INFO_LST]
+        rows.append((encode_time(klu.time), klu.time.ts, klu.time.auto, klu.open, klu.high, klu.low, klu.close, *(np.nan if v is None else v for v in trade_info)))
+    data = np.array(rows, dtype=KL_CACHE_DTYPE)
+    file_path = cache_file_path(code, k_type, cache_dir)
+    if os.path.exists(file_path):
+        data = np.concatenate([data, upgrade_kl_cache(load_kl_cache(code, k_type, cache_dir))])
+    # 稳定排序后取每个time_code第一次出现的记录，即新数据
+    data = data[np.argsort(data["time_code"], kind="stable")]
+    keep = np.ones(len(data), dtype=bool)
+    keep[1:] = data["time_code"][1:] != data["time_code"][:-1]
+    data = data[keep]
+
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    tmp_path = f"{file_path}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, data)
+    os.replace(tmp_path, file_path)  # 先写临时文件，避免读到写了一半的缓存
+    return len(data)
+
+
+def import_kl_data(
+    stockapi_cls: Type[CommonStockApi],
+    code,
+    k_type: KL_TYPE,
+    begin_date=None,
+    end_date=None,
+    autype=AUTYPE.QFQ,
+    cache_dir: Optional[str] = None,
+) -> int:
+    """
+    从其他数据源(如CSV_API, BaoStock)拉取K线并转存为本地缓存
+    """
+    stockapi_cls.do_init()
+    try:
+        stockapi = stockapi_cls(code=code, k_type=k_type, begin_date=begin_date, end_date=end_date, autype=autype)
+        return save_kl_data(code, k_type, stockapi.get_kl_data(), cache_dir)
+    finally:
+        stockapi_cls.do_close()
+
+
+class LocalCacheApi(CommonStockApi):
+    cache_dir: Optional[str] = None  # None表示项目根目录下的local_cache/
+
+    def __init__(self, code, k_type=KL_TYPE.K_DAY, begin_date=None, end_date=None, autype=None):
+        super(LocalCacheApi, self).__init__(code, k_type, begin_date, end_date, autype)
+
+    def get_kl_data(self):
+        data = load_kl_cache(self.code, self.k_type, self.cache_dir)
+        time_code = data["time_code"]
+        # 时间列有序，二分查找起止位置，只读取区间内的数据页
+        begin = 0 if self.begin_date is None else int(np.searchsorted(time_code, date_str2time_code(self.begin_date, is_end=False), side="left"))
+        end = len(data) if self.end_date is None else int(np.searchsorted(time_code, date_str2time_code(self.end_date, is_end=True), side="right"))
+        has_auto = "time_auto" in data.dtype.names
+        field_idx = {name: idx for idx, name in enumerate(data.dtype.names)}
+        trade_field_idx = [(metric_name, field_idx[metric_name]) for metric_name in TRADE_INFO_LST]
+        open_idx = field_idx[DATA_FIELD.FIELD_OPEN]
+        for chunk_begin in range(begin, end, READ_CHUNK_SIZE):
+            for row in data[chunk_begin:min(chunk_begin+READ_CHUNK_SIZE, end)].tolist():
+                item = {
+                    DATA_FIELD.FIELD_TIME: decode_time(row[0], row[1], row[2] if has_auto else True),
+                    DATA_FIELD.FIELD_OPEN: row[open_idx],
+                    DATA_FIELD.FIELD_HIGH: row[open_idx+1],
+                    DATA_FIELD.FIELD_LOW: row[open_idx+2],
+                    DATA_FIELD.FIELD_CLOSE: row[open_idx+3],
+                }
+                for metric_name, idx in trade_field_idx:
+                    if row[idx] == row[idx]:  # 跳过nan
+                        item[metric_name] = row[idx]
+                yield KLineUnit(item)
+
+    def set_basic_info(self):
+        pass
+
+    @classmethod
+    def do_init(cls):
+        pass
+
+    @classmethod
+    def do_close(cls):
+        pass
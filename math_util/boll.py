@@ -1,4 +1,8 @@
 import math
+from collections import deque
+from typing import Deque, List
+
+import numpy as np
 
 
 def _truncate(x):
@@ -13,16 +17,63 @@ class BOLL_Metric:
         self.MID = ma
 
 
+def cal_boll_batch(values: np.ndarray, N: int):
+    """
+    整个序列一次算出每个位置的(ma, theta)，前N-1个位置窗口不满，和BollModel.add一样按已有数据计算
+    和逐个add的滑动更新在浮点尾数上可能不同(相对误差1e-12量级)
+    """
+    values = np.asarray(values, dtype=np.float64)
+    ma = np.empty(len(values))
+    theta = np.empty(len(values))
+    head = min(N - 1, len(values))
+    for i in range(head):
+        window = values[:i+1]
+        ma[i] = window.mean()
+        theta[i] = math.sqrt(((window - ma[i]) ** 2).mean())
+    if len(values) >= N:
+        windows = np.lib.stride_tricks.sliding_window_view(values, N)
+        ma[N-1:] = windows.mean(axis=1)
+        theta[N-1:] = np.sqrt(((windows - ma[N-1:, None]) ** 2).mean(axis=1))
+    return ma, theta
+
+
 class BollModel:
     def __init__(self, N=20):
         assert N > 1
         self.N = N
-        self.arr = []
+        self.arr: Deque[float] = deque(maxlen=N)
+        self.mean = 0.0
+        self.m2 = 0.0  # 窗口内离差平方和
+        self.update_cnt = 0
 
     def add(self, value) -> BOLL_Metric:
-        self.arr.append(value)
-        if len(self.arr) > self.N:
-            self.arr = self.arr[-self.N:]
-        ma = sum(self.arr)/len(self.arr)
-        theta = math.sqrt(sum((x-ma)**2 for x in self.arr) / len(self.arr))
-        return BOLL_Metric(ma, theta)
+        # 滑动窗口的Welford更新，每N次用窗口内数据重算一次，避免误差累积
+        if len(self.arr) < self.N:
+            self.arr.append(value)
+            delta = value - self.mean
+            self.mean += delta / len(self.arr)
+            self.m2 += delta * (value - self.mean)
+        else:
+            old = self.arr[0]
+            self.arr.append(value)
+            new_mean = self.mean + (value - old) / self.N
+            self.m2 += (value - old) * (value - new_mean + old - self.mean)
+            self.mean = new_mean
+            self.update_cnt += 1
+            if self.update_cnt >= self.N:
+                self.resync()
+        return BOLL_Metric(self.mean, math.sqrt(max(self.m2, 0.0) / len(self.arr)))
+
+    def resync(self):
+        self.update_cnt = 0
+        self.mean = sum(self.arr) / len(self.arr)
+        self.m2 = sum((x - self.mean) ** 2 for x in self.arr)
+
+    def add_batch(self, values) -> List[BOLL_Metric]:
+        # 一次加入多个值，之后可以继续add
+        values = np.asarray(values, dtype=np.float64)
+        ma, theta = cal_boll_batch(np.concatenate([np.asarray(self.arr, dtype=np.float64), values]), self.N)
+        skip = len(self.arr)
+        self.arr.extend(values.tolist())
+        self.resync()
+        return [BOLL_Metric(_ma, _theta) for _ma, _theta in zip(ma[skip:].tolist(), theta[skip:].tolist())]
@@ -1,23 +1,8 @@
-import copy
-from dataclasses import dataclass
 from typing import List, Literal, Optional, TypedDict
 
 from common.enums import BI_DIR
 
 
-@dataclass
-class C_KL:
-    idx: int
-    close: float
-    high: float
-    low: float
-
-    def v(self, is_close: bool, _dir: BI_DIR) -> float:
-        if is_close:
-            return self.close
-        return self.high if _dir == BI_DIR.UP else self.low
-
-
 T_DEMARK_TYPE = Literal['setup', 'countdown']
 
 
@@ -46,136 +31,146 @@ class DemarkIndex:
 
 
 class DemarkCountdown:
-    def __init__(self, _dir: BI_DIR, kl_list: List[C_KL], TDST_peak: float):
+    def __init__(self, _dir: BI_DIR, kl_cnt: int, TDST_peak: float):
         self.dir = _dir
-        self.kl_list: List[C_KL] = copy.deepcopy(kl_list)
+        self.kl_cnt = kl_cnt  # 从setup起点开始经过的K线数
         self.idx = 0
         self.TDST_peak = TDST_peak
         self.finish = False
+        self.end_kl_idx: Optional[int] = None  # 最后一根参与计算的K线
 
-    def update(self, kl: C_KL) -> bool:
+    def update(self, engine: 'DemarkEngine', kl_idx: int, close: float, high: float, low: float) -> bool:
         if self.finish:
             return False
-        self.kl_list.append(kl)
-        if len(self.kl_list) <= DemarkEngine.COUNTDOWN_BIAS:
+        self.kl_cnt += 1
+        self.end_kl_idx = kl_idx
+        if self.kl_cnt <= engine.countdown_bias:
             return False
-        if self.idx == DemarkEngine.MAX_COUNTDOWN:
+        if self.idx == engine.max_countdown:
             self.finish = True
             return False
-        if (self.dir == BI_DIR.DOWN and kl.high > self.TDST_peak) or (self.dir == BI_DIR.UP and kl.low < self.TDST_peak):
+        if (self.dir == BI_DIR.DOWN and high > self.TDST_peak) or (self.dir == BI_DIR.UP and low < self.TDST_peak):
             self.finish = True
             return False
-        if self.dir == BI_DIR.DOWN and self.kl_list[-1].close < self.kl_list[-1 - DemarkEngine.COUNTDOWN_BIAS].v(DemarkEngine.COUNTDOWN_CMP2CLOSE, self.dir):
+        if self.dir == BI_DIR.DOWN and close < engine.get_v(engine.countdown_bias, engine.countdown_cmp2close, self.dir):
             self.idx += 1
             return True
-        if self.dir == BI_DIR.UP and self.kl_list[-1].close > self.kl_list[-1 - DemarkEngine.COUNTDOWN_BIAS].v(DemarkEngine.COUNTDOWN_CMP2CLOSE, self.dir):
+        if self.dir == BI_DIR.UP and close > engine.get_v(engine.countdown_bias, engine.countdown_cmp2close, self.dir):
             self.idx += 1
             return True
         return False
 
 
 class DemarkSetup:
-    def __init__(self, _dir: BI_DIR, kl_list: List[C_KL], pre_kl: C_KL):
+    def __init__(self, engine: 'DemarkEngine', _dir: BI_DIR, pre_close: float):
+        self.engine = engine
         self.dir = _dir
-        self.kl_list: List[C_KL] = copy.deepcopy(kl_list)
-        self.pre_kl = pre_kl  # 跳空时用
-        assert len(self.kl_list) == DemarkEngine.SETUP_BIAS
+        self.kl_cnt = engine.setup_bias  # 起点前setup_bias根K线也算在序列里
+        self.pre_close = pre_close  # 跳空时用
         self.countdown: Optional[DemarkCountdown] = None
         self.setup_finished = False
         self.idx = 0
         self.TDST_peak: Optional[float] = None
-
-        self.last_demark_index = DemarkIndex()  # 缓存用
-
-    def update(self, kl: C_KL) -> DemarkIndex:
-        self.last_demark_index = DemarkIndex()
+        self.begin_kl_idx: Optional[int] = None  # setup第一根K线
+        self.end_kl_idx: Optional[int] = None  # setup最后一根K线
+        self.first_high = self.first_low = 0.0
+        self.peak = 0.0  # setup内最高价(向下)/最低价(向上)，算TDST用
+
+        self.setup_updated = False  # 本根K线是否有setup/countdown计数
+        self.countdown_updated = False
+
+    def update(self, kl_idx: int, close: float, high: float, low: float) -> bool:
+        # 返回本根K线是否刚好完成setup
+        engine = self.engine
+        self.setup_updated = False
+        self.countdown_updated = False
         if not self.setup_finished:
-            self.kl_list.append(kl)
-            if self.dir == BI_DIR.DOWN:
-                if self.kl_list[-1].close < self.kl_list[-1-DemarkEngine.SETUP_BIAS].v(DemarkEngine.SETUP_CMP2CLOSE, self.dir):
-                    self.add_setup()
-                else:
-                    self.setup_finished = True
-            elif self.kl_list[-1].close > self.kl_list[-1-DemarkEngine.SETUP_BIAS].v(DemarkEngine.SETUP_CMP2CLOSE, self.dir):
-                self.add_setup()
+            self.kl_cnt += 1
+            self.end_kl_idx = kl_idx
+            if self.begin_kl_idx is None:
+                self.begin_kl_idx = kl_idx
+                self.first_high, self.first_low = high, low
+                self.peak = high if self.dir == BI_DIR.DOWN else low
+            elif self.dir == BI_DIR.DOWN:
+                self.peak = max(self.peak, high)
+            else:
+                self.peak = min(self.peak, low)
+            ref = engine.get_v(engine.setup_bias, engine.setup_cmp2close, self.dir)
+            if (close < ref) if self.dir == BI_DIR.DOWN else (close > ref):
+                self.idx += 1
+                self.setup_updated = True
             else:
                 self.setup_finished = True
-        if self.idx == DemarkEngine.DEMARK_LEN and not self.setup_finished and self.countdown is None:
-            self.countdown = DemarkCountdown(self.dir, self.kl_list[:-1], self.cal_TDST_peak())
-        if self.countdown is not None and self.countdown.update(kl):
-            self.last_demark_index.add(self.dir, 'countdown', self.countdown.idx, self)
-        return self.last_demark_index
-
-    def add_setup(self):
-        self.idx += 1
-        self.last_demark_index.add(self.dir, 'setup', self.idx, self)
+        if self.idx == engine.demark_len and not self.setup_finished and self.countdown is None:
+            self.countdown = DemarkCountdown(self.dir, self.kl_cnt - 1, self.cal_TDST_peak())
+        if self.countdown is not None and self.countdown.update(engine, kl_idx, close, high, low):
+            self.countdown_updated = True
+        return self.setup_updated and self.idx == engine.demark_len
 
     def cal_TDST_peak(self) -> float:
-        assert len(self.kl_list) == DemarkEngine.SETUP_BIAS+DemarkEngine.DEMARK_LEN
-        arr = self.kl_list[DemarkEngine.SETUP_BIAS:DemarkEngine.SETUP_BIAS+DemarkEngine.DEMARK_LEN]
-        assert len(arr) == DemarkEngine.DEMARK_LEN
+        assert self.kl_cnt == self.engine.setup_bias + self.engine.demark_len
+        res = self.peak
         if self.dir == BI_DIR.DOWN:
-            res = max(kl.high for kl in arr)
-            if DemarkEngine.TIAOKONG_ST and arr[0].high < self.pre_kl.close:
-                res = max(res, self.pre_kl.close)
-        else:
-            res = min(kl.low for kl in arr)
-            if DemarkEngine.TIAOKONG_ST and arr[0].low > self.pre_kl.close:
-                res = min(res, self.pre_kl.close)
+            if self.engine.tiaokong_st and self.first_high < self.pre_close:
+                res = max(res, self.pre_close)
+        elif self.engine.tiaokong_st and self.first_low > self.pre_close:
+            res = min(res, self.pre_close)
         self.TDST_peak = res
         return res
 
 
 class DemarkEngine:
-    DEMARK_LEN = 9
-    SETUP_BIAS = 4
-    COUNTDOWN_BIAS = 2
-    MAX_COUNTDOWN = 13
-    TIAOKONG_ST = True  # 第一根跳空时是否跟前一根的close比
-    SETUP_CMP2CLOSE = True
-    COUNTDOWN_CMP2CLOSE = True
-
     def __init__(
         self,
         demark_len=9,
         setup_bias=4,
         countdown_bias=2,
         max_countdown=13,
-        tiaokong_st=True,
+        tiaokong_st=True,  # 第一根跳空时是否跟前一根的close比
         setup_cmp2close=True,
         countdown_cmp2close=True
     ):
-        DemarkEngine.DEMARK_LEN = demark_len
-        DemarkEngine.SETUP_BIAS = setup_bias
-        DemarkEngine.COUNTDOWN_BIAS = countdown_bias
-        DemarkEngine.MAX_COUNTDOWN = max_countdown
-        DemarkEngine.TIAOKONG_ST = tiaokong_st
-        DemarkEngine.SETUP_CMP2CLOSE = setup_cmp2close
-        DemarkEngine.COUNTDOWN_CMP2CLOSE = countdown_cmp2close
-
-        self.kl_lst: List[C_KL] = []
+        self.demark_len = demark_len
+        self.setup_bias = setup_bias
+        self.countdown_bias = countdown_bias
+        self.max_countdown = max_countdown
+        self.tiaokong_st = tiaokong_st
+        self.setup_cmp2close = setup_cmp2close
+        self.countdown_cmp2close = countdown_cmp2close
+
+        # 环形缓冲区，只保留往前比较需要的最近若干根K线
+        self.buf_size = max(setup_bias + 2, countdown_bias + 1)
+        self.close_buf = [0.0] * self.buf_size
+        self.high_buf = [0.0] * self.buf_size
+        self.low_buf = [0.0] * self.buf_size
+        self.kl_cnt = 0
         self.series: List[DemarkSetup] = []
 
+    def get_v(self, back: int, is_close: bool, _dir: BI_DIR) -> float:
+        # 往前数第back根K线的收盘价，或最高价(向上)/最低价(向下)
+        pos = (self.kl_cnt - 1 - back) % self.buf_size
+        if is_close:
+            return self.close_buf[pos]
+        return self.high_buf[pos] if _dir == BI_DIR.UP else self.low_buf[pos]
+
     def update(self, idx: int, close: float, high: float, low: float) -> DemarkIndex:
-        self.kl_lst.append(C_KL(idx, close, high, low))
-        if len(self.kl_lst) <= DemarkEngine.SETUP_BIAS+1:
+        pos = self.kl_cnt % self.buf_size
+        self.close_buf[pos], self.high_buf[pos], self.low_buf[pos] = close, high, low
+        self.kl_cnt += 1
+        if self.kl_cnt <= self.setup_bias+1:
             return DemarkIndex()
 
-        if self.kl_lst[-1].close < self.kl_lst[-1-self.SETUP_BIAS].close:
-            if not any(series.dir == BI_DIR.DOWN and not series.setup_finished for series in self.series):
-                self.series.append(DemarkSetup(BI_DIR.DOWN, self.kl_lst[-DemarkEngine.SETUP_BIAS-1:-1], self.kl_lst[-DemarkEngine.SETUP_BIAS-2]))
+        ref_close = self.close_buf[(self.kl_cnt - 1 - self.setup_bias) % self.buf_size]
+        if close != ref_close:
+            _dir = BI_DIR.DOWN if close < ref_close else BI_DIR.UP
+            if not any(series.dir == _dir and not series.setup_finished for series in self.series):
+                self.series.append(DemarkSetup(self, _dir, self.close_buf[(self.kl_cnt - 2 - self.setup_bias) % self.buf_size]))
             for series in self.series:
-                if series.dir == BI_DIR.UP and series.countdown is None and not series.setup_finished:
-                    series.setup_finished = True
-        elif self.kl_lst[-1].close > self.kl_lst[-1-self.SETUP_BIAS].close:
-            if not any(series.dir == BI_DIR.UP and not series.setup_finished for series in self.series):
-                self.series.append(DemarkSetup(BI_DIR.UP, self.kl_lst[-DemarkEngine.SETUP_BIAS-1:-1], self.kl_lst[-DemarkEngine.SETUP_BIAS-2]))
-            for series in self.series:
-                if series.dir == BI_DIR.DOWN and series.countdown is None and not series.setup_finished:
+                if series.dir != _dir and series.countdown is None and not series.setup_finished:
                     series.setup_finished = True
 
         self.clear()
-        self.clean_series_from_setup_finish()
+        self.clean_series_from_setup_finish(idx, close, high, low)
 
         result = self.cal_result()
         self.clear()
@@ -184,24 +179,23 @@ class DemarkEngine:
     def cal_result(self) -> DemarkIndex:
         demark_index = DemarkIndex()
         for series in self.series:
-            demark_index.update(series.last_demark_index)
+            if series.setup_updated:
+                demark_index.add(series.dir, 'setup', series.idx, series)
+            if series.countdown_updated:
+                demark_index.add(series.dir, 'countdown', series.countdown.idx, series)
         return demark_index
 
     def clear(self):
-        invalid_series = [series for series in self.series if series.setup_finished and series.countdown is None]
-        for s in invalid_series:
-            self.series.remove(s)
-        invalid_series = [series for series in self.series if series.countdown is not None and series.countdown.finish]
-        for s in invalid_series:
-            self.series.remove(s)
-
-    def clean_series_from_setup_finish(self):
-        finished_setup: Optional[int] = None
+        self.series = [
+            series for series in self.series
+            if not (series.setup_finished and series.countdown is None) and not (series.countdown is not None and series.countdown.finish)
+        ]
+
+    def clean_series_from_setup_finish(self, idx: int, close: float, high: float, low: float):
+        finished_setup: Optional[DemarkSetup] = None
         for series in self.series:
-            demark_idx = series.update(self.kl_lst[-1])
-            for setup_idx in demark_idx.get_setup():
-                if setup_idx['idx'] == DemarkEngine.DEMARK_LEN:
-                    assert finished_setup is None
-                    finished_setup = id(series)
+            if series.update(idx, close, high, low):
+                assert finished_setup is None
+                finished_setup = series
         if finished_setup is not None:
-            self.series = [series for series in self.series if id(series) == finished_setup]
+            self.series = [finished_setup]
@@ -1,3 +1,7 @@
+from collections import deque
+from typing import Deque, List, Optional, Tuple
+
+
 class KDJ_Item:
     def __init__(self, k, d, j):
         self.k = k
@@ -6,22 +10,45 @@ class KDJ_Item:
 
 
 class KDJ:
-    def __init__(self, period: int = 9):
+    def __init__(self, period: int = 9, history_len: Optional[int] = 0):
         super(KDJ, self).__init__()
-        self.arr = []
         self.period = period
         self.pre_kdj = KDJ_Item(50, 50, 50)
+        self.cnt = 0
+        # 单调队列，元素为(序号, 值)，队首是窗口内最高/最低价
+        self.high_queue: Deque[Tuple[int, float]] = deque()
+        self.low_queue: Deque[Tuple[int, float]] = deque()
+        # 历史KDJ，history_len=0不保存，None不限长度
+        self.history_len = history_len
+        self.history: Deque[KDJ_Item] = deque(maxlen=history_len)
 
     def add(self, high, low, close) -> KDJ_Item:
-        self.arr.append({
-            'high': high,
-            'low': low,
-        })
-        if len(self.arr) > self.period:
-            self.arr.pop(0)
-
-        hn = max([x['high'] for x in self.arr])
-        ln = min([x['low'] for x in self.arr])
+        cur_kdj = self.cal(high, low, close)
+        if self.history_len != 0:
+            self.history.append(cur_kdj)
+        return cur_kdj
+
+    def add_batch(self, high_lst, low_lst, close_lst) -> List[KDJ_Item]:
+        res = [self.cal(high, low, close) for high, low, close in zip(high_lst, low_lst, close_lst)]
+        if self.history_len != 0:
+            self.history.extend(res)
+        return res
+
+    def cal(self, high, low, close) -> KDJ_Item:
+        while self.high_queue and self.high_queue[-1][1] <= high:
+            self.high_queue.pop()
+        self.high_queue.append((self.cnt, high))
+        while self.low_queue and self.low_queue[-1][1] >= low:
+            self.low_queue.pop()
+        self.low_queue.append((self.cnt, low))
+        self.cnt += 1
+        if self.high_queue[0][0] <= self.cnt - 1 - self.period:
+            self.high_queue.popleft()
+        if self.low_queue[0][0] <= self.cnt - 1 - self.period:
+            self.low_queue.popleft()
+
+        hn = self.high_queue[0][1]
+        ln = self.low_queue[0][1]
         cn = close
         rsv = 100 * (cn - ln) / (hn - ln) if hn != ln else 0.0
 
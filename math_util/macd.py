@@ -1,4 +1,5 @@
-from typing import List
+from collections import deque
+from typing import Deque, List, Optional
 
 
 class MACDItem:
@@ -11,19 +12,44 @@ class MACDItem:
 
 
 class MACD:
-    def __init__(self, fastperiod=12, slowperiod=26, signalperiod=9):
-        self.macd_info: List[MACDItem] = []
+    def __init__(self, fastperiod=12, slowperiod=26, signalperiod=9, history_len: Optional[int] = 0):
         self.fastperiod = fastperiod
         self.slowperiod = slowperiod
         self.signalperiod = signalperiod
+        self.last: Optional[MACDItem] = None  # 计算只依赖上一根的结果
+        # 历史结果，history_len=0不保存，None不限长度
+        self.history_len = history_len
+        self.macd_info: Deque[MACDItem] = deque(maxlen=history_len)
 
     def add(self, value) -> MACDItem:
-        if not self.macd_info:
-            self.macd_info.append(MACDItem(fast_ema=value, slow_ema=value, DIF=0, DEA=0))
+        if self.last is None:
+            self.last = MACDItem(fast_ema=value, slow_ema=value, DIF=0, DEA=0)
         else:
-            _fast_ema = (2 * value + (self.fastperiod - 1) * self.macd_info[-1].fast_ema) / (self.fastperiod + 1)
-            _slow_ema = (2 * value + (self.slowperiod - 1) * self.macd_info[-1].slow_ema) / (self.slowperiod + 1)
+            _fast_ema = (2 * value + (self.fastperiod - 1) * self.last.fast_ema) / (self.fastperiod + 1)
+            _slow_ema = (2 * value + (self.slowperiod - 1) * self.last.slow_ema) / (self.slowperiod + 1)
             _dif = _fast_ema - _slow_ema
-            _dea = (2 * _dif + (self.signalperiod - 1) * self.macd_info[-1].DEA) / (self.signalperiod + 1)
-            self.macd_info.append(MACDItem(fast_ema=_fast_ema, slow_ema=_slow_ema, DIF=_dif, DEA=_dea))
-        return self.macd_info[-1]
+            _dea = (2 * _dif + (self.signalperiod - 1) * self.last.DEA) / (self.signalperiod + 1)
+            self.last = MACDItem(fast_ema=_fast_ema, slow_ema=_slow_ema, DIF=_dif, DEA=_dea)
+        if self.history_len != 0:
+            self.macd_info.append(self.last)
+        return self.last
+
+    def add_batch(self, values) -> List[MACDItem]:
+        # 和逐个add的计算顺序完全一致，结果逐位相同
+        res: List[MACDItem] = []
+        fast_ratio, slow_ratio, signal_ratio = self.fastperiod - 1, self.slowperiod - 1, self.signalperiod - 1
+        fast_div, slow_div, signal_div = self.fastperiod + 1, self.slowperiod + 1, self.signalperiod + 1
+        last = self.last
+        for value in values:
+            if last is None:
+                last = MACDItem(fast_ema=value, slow_ema=value, DIF=0, DEA=0)
+            else:
+                _fast_ema = (2 * value + fast_ratio * last.fast_ema) / fast_div
+                _slow_ema = (2 * value + slow_ratio * last.slow_ema) / slow_div
+                _dif = _fast_ema - _slow_ema
+                last = MACDItem(fast_ema=_fast_ema, slow_ema=_slow_ema, DIF=_dif, DEA=(2 * _dif + signal_ratio * last.DEA) / signal_div)
+            res.append(last)
+        self.last = last
+        if self.history_len != 0:
+            self.macd_info.extend(res)
+        return res
@@ -0,0 +1,209 @@
+import copy
+from operator import attrgetter
+from types import MethodType
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from common.enums import TREND_TYPE
+from common.chan_exception import ChanException, ErrCode
+
+from .boll import BollModel
+from .demark import DemarkEngine
+from .kdj import KDJ
+from .macd import MACD
+from .rsi import RSI
+from .trend_model import TrendModel
+
+
+class MetricPlugin:
+    """
+    指标插件：声明指标模型需要的K线字段、结果写到KLU的哪个属性，以及逐根/批量两种计算方式
+    - inputs: KLU属性名，按顺序作为stream/batch的参数
+    - slot: 结果属性名，KLU没有该属性时存入klu.ext_metric[slot]
+    - stream(model, *values) -> 结果；默认调用model.add
+    - batch(model, *value_lsts) -> 结果列表；None表示批量时也逐根调用stream
+    - create(conf) -> 模型列表，由ChanConfig.get_metric_model调用，不需要时返回空列表
+    - output(klu, model, value)：自定义写回方式，设置后忽略slot
+    """
+    def __init__(
+        self,
+        name: str,
+        model_cls: type,
+        create: Callable[[Any], List[Any]],
+        inputs: Sequence[str] = ("close",),
+        slot: Optional[str] = None,
+        stream: Optional[Callable] = None,
+        batch: Optional[Callable] = None,
+        output: Optional[Callable[[Any, Any, Any], None]] = None,
+    ):
+        if slot is None and output is None:
+            raise ChanException(f"metric plugin {name} has no output", ErrCode.PARA_ERROR)
+        self.name = name
+        self.model_cls = model_cls
+        self.create = create
+        self.inputs: Tuple[str, ...] = tuple(inputs)
+        self.slot = slot
+        self.stream = stream or model_cls.add
+        self.batch = batch
+        self.output = output
+
+    def get_writer(self, model, klu_cls: type) -> Callable[[Any, Any], None]:
+        if self.output is not None:
+            output = self.output
+            return lambda klu, value: output(klu, model, value)
+        slot = self.slot
+        if hasattr(klu_cls, slot):
+            return lambda klu, value: setattr(klu, slot, value)
+        return lambda klu, value: klu.set_ext_metric(slot, value)
+
+    def bind(self, model, klu_cls: type) -> Callable[[Any], None]:
+        # 生成单根K线的更新函数，K线加入时直接调用，不再判断模型类型；常见情况展开成一层闭包
+        get_input = attrgetter(*self.inputs)
+        update = MethodType(self.stream, model)
+        multi_input = len(self.inputs) > 1
+        if self.output is None and hasattr(klu_cls, self.slot):
+            slot = self.slot
+            if multi_input:
+                return lambda klu: setattr(klu, slot, update(*get_input(klu)))
+            return lambda klu: setattr(klu, slot, update(get_input(klu)))
+        output = self.output
+        if output is not None:
+            if multi_input:
+                return lambda klu: output(klu, model, update(*get_input(klu)))
+            return lambda klu: output(klu, model, update(get_input(klu)))
+        write = self.get_writer(model, klu_cls)
+        if multi_input:
+            return lambda klu: write(klu, update(*get_input(klu)))
+        return lambda klu: write(klu, update(get_input(klu)))
+
+    def update_batch(self, model, klu_lst: list, input_cache: Dict[str, list], verify=False) -> None:
+        # input_cache: 字段名 -> 该字段的值列表，多个指标共用
+        # verify: 批量结果和逐根stream的结果比较，相对误差超过1e-9时抛出异常，调试用
+        if not klu_lst:
+            return
+        value_lsts = []
+        for field in self.inputs:
+            if field not in input_cache:
+                input_cache[field] = [getattr(klu, field) for klu in klu_lst]
+            value_lsts.append(input_cache[field])
+        if self.batch is not None:
+            stream_model = copy.deepcopy(model) if verify else None
+            res = self.batch(model, *value_lsts)
+            if stream_model is not None:
+                stream = self.stream
+                for klu, value, stream_value in zip(klu_lst, res, (stream(stream_model, *values) for values in zip(*value_lsts))):
+                    check_metric_value(f"{self.name}@{klu.time}", value, stream_value)
+        else:
+            stream = self.stream
+            res = [stream(model, *values) for values in zip(*value_lsts)]
+        write = self.get_writer(model, type(klu_lst[0]))
+        for klu, value in zip(klu_lst, res):
+            write(klu, value)
+
+
+def metric_fields(value) -> Dict[str, Any]:
+    if isinstance(value, (int, float)):
+        return {"value": value}
+    return getattr(value, "__dict__", {})
+
+
+def check_metric_value(name: str, batch_value, stream_value) -> None:
+    stream_fields = metric_fields(stream_value)
+    for field, value in metric_fields(batch_value).items():
+        if isinstance(value, (int, float)) and abs(value - stream_fields[field]) > 1e-9 * max(1.0, abs(stream_fields[field])):
+            raise ChanException(f"metric {name}.{field} mismatch: batch={value}, stream={stream_fields[field]}", ErrCode.COMMON_ERROR)
+
+
+METRIC_REGISTRY: Dict[str, MetricPlugin] = {}  # 按注册顺序创建模型
+
+
+def register_metric(plugin: MetricPlugin) -> None:
+    if plugin.name in METRIC_REGISTRY:
+        raise ChanException(f"metric plugin {plugin.name} already registered", ErrCode.PARA_ERROR)
+    METRIC_REGISTRY[plugin.name] = plugin
+
+
+def unregister_metric(name: str) -> None:
+    METRIC_REGISTRY.pop(name, None)
+
+
+def get_metric_plugin(model) -> MetricPlugin:
+    for plugin in METRIC_REGISTRY.values():
+        if type(model) is plugin.model_cls:
+            return plugin
+    for plugin in METRIC_REGISTRY.values():  # 没有单独注册的子类用父类的插件
+        if isinstance(model, plugin.model_cls):
+            return plugin
+    raise ChanException(f"no metric plugin for {type(model).__name__}", ErrCode.PARA_ERROR)
+
+
+def create_metric_models(conf) -> List[Any]:
+    res = []
+    for plugin in METRIC_REGISTRY.values():
+        res.extend(plugin.create(conf))
+    return res
+
+
+def bind_metric_updaters(metric_model_lst: list, klu_cls: type) -> List[Callable[[Any], None]]:
+    return [get_metric_plugin(model).bind(model, klu_cls) for model in metric_model_lst]
+
+
+def _create_macd(conf) -> List[MACD]:
+    return [MACD(
+        fastperiod=conf.macd_config['fast'],
+        slowperiod=conf.macd_config['slow'],
+        signalperiod=conf.macd_config['signal'],
+        history_len=conf.metric_history_len,
+    )]
+
+
+def _create_trend(conf) -> List[TrendModel]:
+    res = [TrendModel(TREND_TYPE.MEAN, mean_T) for mean_T in conf.mean_metrics]
+    for trend_T in conf.trend_metrics:
+        res.append(TrendModel(TREND_TYPE.MAX, trend_T))
+        res.append(TrendModel(TREND_TYPE.MIN, trend_T))
+    return res
+
+
+def _set_trend(klu, model: TrendModel, value: float) -> None:
+    klu.set_trend(model.type, model.T, value)
+
+
+def _create_demark(conf) -> List[DemarkEngine]:
+    if not conf.cal_demark:
+        return []
+    return [DemarkEngine(
+        demark_len=conf.demark_config['demark_len'],
+        setup_bias=conf.demark_config['setup_bias'],
+        countdown_bias=conf.demark_config['countdown_bias'],
+        max_countdown=conf.demark_config['max_countdown'],
+        tiaokong_st=conf.demark_config['tiaokong_st'],
+        setup_cmp2close=conf.demark_config['setup_cmp2close'],
+        countdown_cmp2close=conf.demark_config['countdown_cmp2close'],
+    )]
+
+
+register_metric(MetricPlugin("macd", MACD, _create_macd, slot="macd", batch=MACD.add_batch))
+register_metric(MetricPlugin(
+    "trend",
+    TrendModel,
+    _create_trend,
+    batch=TrendModel.add_batch,
+    output=_set_trend,
+))
+register_metric(MetricPlugin("boll", BollModel, lambda conf: [BollModel(conf.boll_n)], slot="boll", batch=BollModel.add_batch))
+register_metric(MetricPlugin("demark", DemarkEngine, _create_demark, inputs=("idx", "close", "high", "low"), slot="demark", stream=DemarkEngine.update))
+register_metric(MetricPlugin(
+    "rsi",
+    RSI,
+    lambda conf: [RSI(conf.rsi_cycle, history_len=conf.metric_history_len)] if conf.cal_rsi else [],
+    slot="rsi",
+    batch=RSI.add_batch,
+))
+register_metric(MetricPlugin(
+    "kdj",
+    KDJ,
+    lambda conf: [KDJ(conf.kdj_cycle, history_len=conf.metric_history_len)] if conf.cal_kdj else [],
+    inputs=("high", "low", "close"),
+    slot="kdj",
+    batch=KDJ.add_batch,
+))
@@ -1,38 +1,63 @@
+from collections import deque
+from typing import Deque, List, Optional
+
+
 class RSI:
-    def __init__(self, period: int = 14):
+    def __init__(self, period: int = 14, history_len: Optional[int] = 0):
         super(RSI, self).__init__()
-        self.close_arr = []
         self.period = period
-        self.diff = []
-        self.up = []
-        self.down = []
+        self.pre_close: Optional[float] = None
+        self.diff_cnt = 0
+        self.up_sum = 0.0  # 前period-1个差值中涨幅/跌幅之和，之后不再使用
+        self.down_sum = 0.0
+        self.up = 0.0
+        self.down = 0.0
+        # 历史RSI值，history_len=0不保存，None不限长度
+        self.history_len = history_len
+        self.history: Deque[float] = deque(maxlen=history_len)
 
     def add(self, close):
-        self.close_arr.append(close)
-        if len(self.close_arr) == 1:
+        rsi = self.cal(close)
+        if self.history_len != 0:
+            self.history.append(rsi)
+        return rsi
+
+    def add_batch(self, values) -> List[float]:
+        res = [self.cal(close) for close in values]
+        if self.history_len != 0:
+            self.history.extend(res)
+        return res
+
+    def cal(self, close):
+        pre_close = self.pre_close
+        self.pre_close = close
+        if pre_close is None:
             return 50.0
 
-        self.diff.append(self.close_arr[-1] - self.close_arr[-2])
+        diff = close - pre_close
+        self.diff_cnt += 1
 
-        if len(self.diff) < self.period:
-            up_sum = sum(x for x in self.diff if x > 0)
-            down_sum = sum(-x for x in self.diff if x < 0)
-            self.up.append(up_sum / len(self.diff))
-            self.down.append(down_sum / len(self.diff))
+        if self.diff_cnt < self.period:
+            if diff > 0:
+                self.up_sum += diff
+            elif diff < 0:
+                self.down_sum += -diff
+            self.up = self.up_sum / self.diff_cnt
+            self.down = self.down_sum / self.diff_cnt
         else:
-            if self.diff[-1] > 0:
-                upval = self.diff[-1]
+            if diff > 0:
+                upval = diff
                 downval = 0.0
             else:
                 upval = 0.0
-                downval = -self.diff[-1]
+                downval = -diff
 
-            self.up.append((self.up[-1] * (self.period - 1) + upval) / self.period)
-            self.down.append((self.down[-1] * (self.period - 1) + downval) / self.period)
+            self.up = (self.up * (self.period - 1) + upval) / self.period
+            self.down = (self.down * (self.period - 1) + downval) / self.period
 
-        if self.down[-1] == 0:
-            return 100.0 if self.up[-1] > 0 else 0.0
+        if self.down == 0:
+            return 100.0 if self.up > 0 else 0.0
 
-        rs = self.up[-1] / self.down[-1]
+        rs = self.up / self.down
         rsi = 100.0 - 100.0 / (1.0 + rs)
         return rsi
@@ -1,22 +1,97 @@
+from collections import deque
+from typing import Deque, List, Tuple
+
+import numpy as np
+
 from common.enums import TREND_TYPE
 from common.chan_exception import ChanException, ErrCode
 
 
+def cal_trend_batch(values: np.ndarray, trend_type: TREND_TYPE, T: int) -> np.ndarray:
+    """
+    整个序列一次算出每个位置最近T个值的均值/最大值/最小值，窗口不满时按已有数据计算
+    均值和逐个add的滑动累加在浮点尾数上可能不同(相对误差1e-12量级)，最大值/最小值完全一致
+    """
+    values = np.asarray(values, dtype=np.float64)
+    res = np.empty(len(values))
+    head = min(T - 1, len(values))
+    if trend_type == TREND_TYPE.MEAN:
+        res[:head] = np.cumsum(values[:head]) / np.arange(1, head + 1)
+    elif trend_type == TREND_TYPE.MAX:
+        res[:head] = np.maximum.accumulate(values[:head])
+    elif trend_type == TREND_TYPE.MIN:
+        res[:head] = np.minimum.accumulate(values[:head])
+    else:
+        raise ChanException(f"Unknown trendModel Type = {trend_type}", ErrCode.PARA_ERROR)
+    if len(values) >= T:
+        windows = np.lib.stride_tricks.sliding_window_view(values, T)
+        if trend_type == TREND_TYPE.MEAN:
+            res[T-1:] = windows.mean(axis=1)
+        elif trend_type == TREND_TYPE.MAX:
+            res[T-1:] = windows.max(axis=1)
+        else:
+            res[T-1:] = windows.min(axis=1)
+    return res
+
+
 class TrendModel:
     def __init__(self, trend_type: TREND_TYPE, T: int):
+        if trend_type not in (TREND_TYPE.MEAN, TREND_TYPE.MAX, TREND_TYPE.MIN):
+            raise ChanException(f"Unknown trendModel Type = {trend_type}", ErrCode.PARA_ERROR)
         self.T = T
-        self.arr = []
         self.type = trend_type
+        self.arr: Deque[float] = deque(maxlen=T)  # MEAN用，最近T个值
+        self.sum = 0.0
+        self.update_cnt = 0
+        self.mono: Deque[Tuple[int, float]] = deque()  # MAX/MIN用，(序号, 值)，值单调
+        self.cnt = 0
 
     def add(self, value) -> float:
-        self.arr.append(value)
-        if len(self.arr) > self.T:
-            self.arr = self.arr[-self.T:]
         if self.type == TREND_TYPE.MEAN:
-            return sum(self.arr)/len(self.arr)
-        elif self.type == TREND_TYPE.MAX:
-            return max(self.arr)
-        elif self.type == TREND_TYPE.MIN:
-            return min(self.arr)
+            if len(self.arr) == self.T:
+                self.sum -= self.arr[0]
+                self.update_cnt += 1
+            self.arr.append(value)
+            self.sum += value
+            if self.update_cnt >= self.T:  # 定期重算，避免增减累积误差
+                self.update_cnt = 0
+                self.sum = sum(self.arr)
+            return self.sum/len(self.arr)
+        # 单调队列：MAX时队列递减，MIN时递增，队首即窗口最值
+        mono = self.mono
+        if self.type == TREND_TYPE.MAX:
+            while mono and mono[-1][1] <= value:
+                mono.pop()
+        else:
+            while mono and mono[-1][1] >= value:
+                mono.pop()
+        mono.append((self.cnt, value))
+        self.cnt += 1
+        if mono[0][0] <= self.cnt - 1 - self.T:
+            mono.popleft()
+        return mono[0][1]
+
+    def add_batch(self, values) -> List[float]:
+        # 一次加入多个值，之后可以继续add
+        values = np.asarray(values, dtype=np.float64)
+        if self.type == TREND_TYPE.MEAN:
+            history = np.asarray(self.arr, dtype=np.float64)
+        else:
+            # 不在单调队列里的值已经被后面的值覆盖，不会再成为最值，用±inf占位即可
+            history = np.full(min(self.cnt, self.T - 1), -np.inf if self.type == TREND_TYPE.MAX else np.inf)
+            for idx, value in self.mono:
+                if idx >= self.cnt - len(history):
+                    history[idx - self.cnt + len(history)] = value
+        res = cal_trend_batch(np.concatenate([history, values]), self.type, self.T)[len(history):].tolist()
+        if self.type == TREND_TYPE.MEAN:
+            self.arr.extend(values.tolist())
+            self.update_cnt = 0
+            self.sum = sum(self.arr)
         else:
-            raise ChanException(f"Unknown trendModel Type = {self.type}", ErrCode.PARA_ERROR)
+            if len(values) >= self.T:
+                self.mono.clear()
+                self.cnt += len(values) - self.T
+                values = values[-self.T:]
+            for value in values.tolist():
+                self.add(value)
+        return res
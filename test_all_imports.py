@@ -30,6 +30,9 @@ if __name__ == "__main__":
         ("common.enums", "from common.enums import AUTYPE, DATA_SRC, KL_TYPE, BI_DIR, FX_TYPE, BSP_TYPE"),
         ("common.ctime", "from common.ctime import CTime"),
         ("common.chan_exception", "from common.chan_exception import ChanException"),
+        ("common.profiler", "from common.profiler import ChanProfiler"),
+        ("common.range_extreme", "from common.range_extreme import RangeExtreme"),
+        ("common.line_range", "from common.line_range import LineRange"),
         
         # bi 模块
         ("bi.bi", "from bi.bi import Bi"),
@@ -55,12 +58,16 @@ if __name__ == "__main__":
         ("kline.kline", "from kline.kline import KLine"),
         ("kline.kline_unit", "from kline.kline_unit import KLineUnit"),
         ("kline.kline_list", "from kline.kline_list import KLineList"),
+        ("kline.metric_index", "from kline.metric_index import KLUMetricIndex"),
         ("kline.trade_info", "from kline.trade_info import TradeInfo"),
+        ("kline.kline_store", "from kline.kline_store import KLineStore, ArrayKLineUnit"),
         
         # buy_sell_point 模块
         ("buy_sell_point.bs_point", "from buy_sell_point.bs_point import BSPoint"),
         ("buy_sell_point.bs_point_config", "from buy_sell_point.bs_point_config import BSPointConfig, PointConfig"),
         ("buy_sell_point.bs_point_list", "from buy_sell_point.bs_point_list import BSPointList"),
+        ("buy_sell_point.bsp_index", "from buy_sell_point.bsp_index import BSPIndex"),
+        ("buy_sell_point.bsp_event", "from buy_sell_point.bsp_event import BSPEvent"),
         
         # combiner 模块
         ("combiner.combine_item", "from combiner.combine_item import CombineItem"),
@@ -71,6 +78,7 @@ if __name__ == "__main__":
         ("math_util.demark", "from math_util.demark import DemarkEngine, DemarkIndex"),
         ("math_util.trend_line", "from math_util.trend_line import TrendLine"),
         ("math_util.trend_model", "from math_util.trend_model import TrendModel"),
+        ("math_util.metric_registry", "from math_util.metric_registry import MetricPlugin, register_metric"),
         
         # chan_model 模块
         ("chan_model.features", "from chan_model.features import Features"),
@@ -79,6 +87,7 @@ if __name__ == "__main__":
         ("data_api.common_stock_api", "from data_api.common_stock_api import CommonStockApi"),
         ("data_api.bao_stock_api", "from data_api.bao_stock_api import BaoStock"),
         ("data_api.csv_api", "from data_api.csv_api import CSV_API"),
+        ("data_api.local_cache_api", "from data_api.local_cache_api import LocalCacheApi"),
         # 以下是可选依赖，需要安装第三方库
         # ("data_api.ccxt", "from data_api.ccxt import CCXT"),  # 需要 pip install ccxt
         # ("data_api.futu_api", "from data_api.futu_api import FutuApi"),  # 需要 pip install futu-api
@@ -0,0 +1,50 @@
+import pytest
+
+from chan_snapshot import ChanHistory
+
+# 背驰指标和非背驰的均线/BOLL/RSI/KDJ都打开，覆盖批量和逐根两条计算路径
+HEAVY_CONF = {
+    "mean_metrics": [5, 20],
+    "trend_metrics": [5, 20],
+    "cal_rsi": True,
+    "cal_kdj": True,
+}
+
+
+def chan_state(chan):
+    # 当前所有级别的合并K线/笔/线段/中枢/买卖点记录，记录是不可变的，可直接比较
+    history = ChanHistory()
+    history.record(chan)
+    return history[-1]
+
+
+def klu_metric(klu) -> tuple:
+    return (
+        klu.time.ts, klu.open, klu.high, klu.low, klu.close,
+        klu.macd.DIF, klu.macd.DEA, klu.macd.macd,
+        klu.boll.MID, klu.boll.UP, klu.boll.DOWN,
+        getattr(klu, "rsi", None),
+        None if getattr(klu, "kdj", None) is None else (klu.kdj.k, klu.kdj.d, klu.kdj.j),
+        tuple((trend_type.name, T, value) for trend_type, item in sorted(klu.trend.items(), key=lambda x: x[0].name) for T, value in sorted(item.items())),
+    )
+
+
+def assert_metric_close(lhs, rhs, rel=1e-9):
+    # BOLL/均线批量计算和逐根计算有浮点尾差，其余指标逐位一致
+    assert len(lhs) == len(rhs)
+    for klu_idx, (left, right) in enumerate(zip(lhs, rhs)):
+        assert flatten(left) == pytest.approx(flatten(right), rel=rel, abs=1e-12, nan_ok=True), klu_idx
+
+
+def flatten(item) -> list:
+    res = []
+    for value in item:
+        if isinstance(value, tuple):
+            res.extend(flatten(value))
+        elif not isinstance(value, str):
+            res.append(value)
+    return res
+
+
+def chan_metric(chan):
+    return {lv: [klu_metric(klu) for klu in chan[lv].klu_iter()] for lv in chan.lv_list}
@@ -0,0 +1,48 @@
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pytest
+
+from benchmarks.synthetic import gen_kl_dict
+from chan import Chan
+from chan_config import ChanConfig
+from common.enums import DATA_FIELD, DATA_SRC
+from data_api import csv_api
+
+
+@pytest.fixture(scope="session")
+def synthetic_code(tmp_path_factory):
+    """
+    把benchmarks.synthetic生成的K线写成CSV，返回CSV_API可用的code，同参数的数据完全一致
+    """
+    tmp_path = tmp_path_factory.mktemp("synthetic")
+
+    def _write(lv_list, day_cnt, seed=0):
+        name = f"synthetic_{'_'.join(lv.name[2:].lower() for lv in lv_list)}_{day_cnt}_{seed}"
+        if (tmp_path / f"{name}_{lv_list[0].name[2:].lower()}.csv").exists():
+            return code_of(tmp_path / name)
+        for lv, kl_lst in gen_kl_dict(lv_list, day_cnt=day_cnt, seed=seed, regime_len=40).items():
+            lines = ["time,open,high,low,close"]
+            for kl in kl_lst:
+                t = kl[DATA_FIELD.FIELD_TIME]
+                lines.append(f"{t.year:04}-{t.month:02}-{t.day:02} {t.hour:02}:{t.minute:02}:00,{kl[DATA_FIELD.FIELD_OPEN]},{kl[DATA_FIELD.FIELD_HIGH]},{kl[DATA_FIELD.FIELD_LOW]},{kl[DATA_FIELD.FIELD_CLOSE]}")
+            (tmp_path / f"{name}_{lv.name[2:].lower()}.csv").write_text("\n".join(lines) + "\n")
+        return code_of(tmp_path / name)
+    return _write
+
+
+def code_of(path) -> str:
+    # CSV_API按 data_api/../{code}_{k_type}.csv 找文件
+    root = os.path.join(os.path.dirname(os.path.realpath(csv_api.__file__)), "..")
+    return os.path.relpath(str(path), root)
+
+
+@pytest.fixture(scope="session")
+def make_chan():
+    def _make(code, lv_list, conf=None, **kwargs):
+        config = ChanConfig({"trigger_step": False, "print_warning": False, **(conf or {}), **kwargs})
+        return Chan(code, data_src=DATA_SRC.CSV, lv_list=lv_list, config=config)
+    return _make
@@ -0,0 +1,58 @@
+import pytest
+
+from chan_checkpoint import load_checkpoint, save_checkpoint
+from chan_helper import HEAVY_CONF, assert_metric_close, chan_metric, chan_state
+from chan_snapshot import ChanHistory
+from common.chan_exception import ChanException
+from common.enums import KL_TYPE
+from data_api.csv_api import CSV_API
+
+
+def step_history(chan) -> ChanHistory:
+    history = ChanHistory()
+    for snapshot in chan.step_load():
+        history.record(snapshot)
+    return history
+
+
+def stop_at(chan, stop_step: int):
+    for step, _ in enumerate(chan.step_load()):
+        if step == stop_step:
+            return chan
+
+
+@pytest.mark.parametrize("lv_list, day_cnt", [([KL_TYPE.K_5M], 30), ([KL_TYPE.K_30M, KL_TYPE.K_5M], 20)])
+@pytest.mark.parametrize("array_store", [False, True])
+def test_checkpoint_round_trip(tmp_path, synthetic_code, make_chan, lv_list, day_cnt, array_store):
+    chan = make_chan(synthetic_code(lv_list, day_cnt), lv_list, HEAVY_CONF, trigger_step=True, array_store=array_store)
+    chan = stop_at(chan, 100)  # 多级别按最高级别K线计步
+    save_checkpoint(chan, str(tmp_path / "chan.ckpt"))
+    restored = load_checkpoint(str(tmp_path / "chan.ckpt"))
+    assert restored.lv_list == chan.lv_list
+    assert chan_state(restored).levels == chan_state(chan).levels
+    assert chan_metric(restored) == chan_metric(chan)
+
+
+@pytest.mark.parametrize("array_store", [False, True])
+def test_checkpoint_continue(tmp_path, synthetic_code, make_chan, array_store):
+    # 从断点恢复后继续逐根trigger_load，每一步都和不中断的逐步计算一致
+    code = synthetic_code([KL_TYPE.K_5M], 30)
+    conf = {**HEAVY_CONF, "array_store": array_store}
+    reference = make_chan(code, [KL_TYPE.K_5M], conf, trigger_step=True)
+    history = step_history(reference)
+    stop_step = 500
+    save_checkpoint(stop_at(make_chan(code, [KL_TYPE.K_5M], conf, trigger_step=True), stop_step), str(tmp_path / "chan.ckpt"))
+    chan = load_checkpoint(str(tmp_path / "chan.ckpt"))
+    restored_history = ChanHistory()
+    restored_history.record(chan)
+    klu_lst = list(CSV_API(code, KL_TYPE.K_5M).get_kl_data())
+    for step in range(stop_step + 1, len(klu_lst)):
+        chan.trigger_load({KL_TYPE.K_5M: [klu_lst[step]]})
+        restored_history.record(chan)
+        assert restored_history[-1].levels == history[step].levels, step
+    assert_metric_close(chan_metric(chan)[KL_TYPE.K_5M], chan_metric(reference)[KL_TYPE.K_5M])
+
+def test_checkpoint_format_error(tmp_path):
+    (tmp_path / "bad.ckpt").write_bytes(b"not a checkpoint")
+    with pytest.raises(ChanException):
+        load_checkpoint(str(tmp_path / "bad.ckpt"))
@@ -0,0 +1,66 @@
+import pytest
+
+from chan_helper import HEAVY_CONF, assert_metric_close, chan_metric, chan_state
+from chan_snapshot import ChanHistory
+from common.enums import KL_TYPE
+
+# 5分钟K线约每20根一笔，150天约60个线段，线段级别的中枢和买卖点也都有
+LEVEL_CASE = [
+    ([KL_TYPE.K_5M], 150),
+    ([KL_TYPE.K_30M, KL_TYPE.K_5M], 150),
+]
+
+# 各优化开关和默认配置的结果必须一致
+SWITCH_CONF = [
+    {"array_store": True},
+    {"batch_metric": False},
+    {"seg_incremental": False},
+    {"metric_index": False},
+    {"iterative_load": False},
+    {"seg_verify": True, "metric_verify": True},  # 内部和原算法逐步对照，不一致时抛异常
+]
+
+
+def load_result(chan):
+    # trigger_step=False时构造Chan即完成加载
+    return chan_state(chan), chan_metric(chan)
+
+
+def step_result(chan):
+    history = ChanHistory()
+    for snapshot in chan.step_load():
+        history.record(snapshot)
+    return [history[step].levels for step in range(len(history))], chan_metric(chan)
+
+
+@pytest.mark.parametrize("lv_list, day_cnt", LEVEL_CASE)
+@pytest.mark.parametrize("switch", SWITCH_CONF)
+def test_load_same_as_default(synthetic_code, make_chan, lv_list, day_cnt, switch):
+    code = synthetic_code(lv_list, day_cnt)
+    state, metric = load_result(make_chan(code, lv_list, HEAVY_CONF))
+    switch_state, switch_metric = load_result(make_chan(code, lv_list, {**HEAVY_CONF, **switch}))
+    assert switch_state == state
+    for lv in lv_list:
+        assert_metric_close(switch_metric[lv], metric[lv])
+
+
+@pytest.mark.parametrize("lv_list, day_cnt", LEVEL_CASE)
+@pytest.mark.parametrize("switch", SWITCH_CONF)
+def test_step_load_same_as_default(synthetic_code, make_chan, lv_list, day_cnt, switch):
+    code = synthetic_code(lv_list, day_cnt // 10)  # 逐K线回放较慢，用较短的数据
+    state_lst, metric = step_result(make_chan(code, lv_list, HEAVY_CONF, trigger_step=True))
+    switch_state_lst, switch_metric = step_result(make_chan(code, lv_list, {**HEAVY_CONF, **switch}, trigger_step=True))
+    assert len(switch_state_lst) == len(state_lst)
+    for step, (switch_state, state) in enumerate(zip(switch_state_lst, state_lst)):
+        assert switch_state == state, step
+    for lv in lv_list:
+        assert_metric_close(switch_metric[lv], metric[lv])
+
+
+def test_load_same_as_step_load(synthetic_code, make_chan):
+    # 非逐K线模式最后算一次的结果和逐K线回放最后一步一致
+    code = synthetic_code([KL_TYPE.K_5M], 30)
+    state, metric = load_result(make_chan(code, [KL_TYPE.K_5M], HEAVY_CONF))
+    state_lst, step_metric = step_result(make_chan(code, [KL_TYPE.K_5M], HEAVY_CONF, trigger_step=True))
+    assert state_lst[-1] == state.levels
+    assert_metric_close(metric[KL_TYPE.K_5M], step_metric[KL_TYPE.K_5M])
@@ -0,0 +1,65 @@
+import pytest
+
+from chan_config import ChanConfig
+from chan_flat import ChanFlat, dump_chan_flat
+from chan_helper import HEAVY_CONF, assert_metric_close, chan_metric, chan_state
+from chan_snapshot import ChanHistory
+from common.chan_exception import ChanException
+from common.enums import KL_TYPE
+from data_api.csv_api import CSV_API
+
+LV_LIST = [KL_TYPE.K_30M, KL_TYPE.K_5M]
+
+
+@pytest.mark.parametrize("array_store", [False, True])
+def test_flat_round_trip(tmp_path, synthetic_code, make_chan, array_store):
+    chan = make_chan(synthetic_code(LV_LIST, 150), LV_LIST, HEAVY_CONF, array_store=array_store)
+    dump_chan_flat(chan, str(tmp_path / "chan.flat"))
+    flat = ChanFlat(str(tmp_path / "chan.flat"))
+    assert flat.lv_list == LV_LIST
+    state = chan_state(chan)
+    for lv in LV_LIST:
+        assert flat[lv].to_level_state() == state[lv]
+        assert [(klu.time.ts, klu.open, klu.high, klu.low, klu.close) for klu in flat[lv].klu_iter()] == \
+            [(klu.time.ts, klu.open, klu.high, klu.low, klu.close) for klu in chan[lv].klu_iter()]
+
+    # 只读取部分级别
+    sub_flat = ChanFlat(str(tmp_path / "chan.flat"), KL_TYPE.K_5M)
+    assert sub_flat.lv_list == [KL_TYPE.K_5M]
+    assert sub_flat[0].to_level_state() == state[KL_TYPE.K_5M]
+    with pytest.raises(ChanException):
+        ChanFlat(str(tmp_path / "chan.flat"), KL_TYPE.K_DAY)
+
+
+def test_flat_to_chan(tmp_path, synthetic_code, make_chan):
+    chan = make_chan(synthetic_code(LV_LIST, 150), LV_LIST, HEAVY_CONF)
+    dump_chan_flat(chan, str(tmp_path / "chan.flat"))
+    restored = ChanFlat(str(tmp_path / "chan.flat")).to_chan(ChanConfig({"trigger_step": False, "print_warning": False, **HEAVY_CONF}))
+    assert chan_state(restored).levels == chan_state(chan).levels
+    for lv in LV_LIST:
+        assert_metric_close(chan_metric(restored)[lv], chan_metric(chan)[lv])
+
+
+def test_flat_to_chan_continue(tmp_path, synthetic_code, make_chan):
+    # to_chan之后继续逐根trigger_load，每一步都和不中断的逐步计算一致
+    code = synthetic_code([KL_TYPE.K_5M], 30)
+    reference = make_chan(code, [KL_TYPE.K_5M], HEAVY_CONF, trigger_step=True)
+    history = ChanHistory()
+    for snapshot in reference.step_load():
+        history.record(snapshot)
+    stop_step = 500
+    chan = make_chan(code, [KL_TYPE.K_5M], HEAVY_CONF, trigger_step=True)
+    for step, _ in enumerate(chan.step_load()):
+        if step == stop_step:
+            break
+    dump_chan_flat(chan, str(tmp_path / "chan.flat"))
+    restored = ChanFlat(str(tmp_path / "chan.flat")).to_chan(ChanConfig({"trigger_step": True, "print_warning": False, **HEAVY_CONF}))
+    restored_history = ChanHistory()
+    restored_history.record(restored)
+    assert restored_history[-1].levels == history[stop_step].levels
+    klu_lst = list(CSV_API(code, KL_TYPE.K_5M).get_kl_data())
+    for step in range(stop_step + 1, len(klu_lst)):
+        restored.trigger_load({KL_TYPE.K_5M: [klu_lst[step]]})
+        restored_history.record(restored)
+        assert restored_history[-1].levels == history[step].levels, step
+    assert_metric_close(chan_metric(restored)[KL_TYPE.K_5M], chan_metric(reference)[KL_TYPE.K_5M])
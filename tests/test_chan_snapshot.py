@@ -0,0 +1,59 @@
+import pytest
+
+from chan_helper import HEAVY_CONF, assert_metric_close, chan_metric, chan_state
+from chan_snapshot import ChanHistory
+from common.chan_exception import ChanException
+from common.enums import KL_TYPE
+
+
+@pytest.mark.parametrize("lv_list, day_cnt, seg_field", [
+    ([KL_TYPE.K_5M], 60, "seg_bsp_lst"),
+    ([KL_TYPE.K_30M, KL_TYPE.K_5M], 20, "segseg_lst"),
+])
+def test_history_round_trip(synthetic_code, make_chan, lv_list, day_cnt, seg_field):
+    # history[step]由checkpoint加增量还原，和当时完整记录的状态一致
+    chan = make_chan(synthetic_code(lv_list, day_cnt), lv_list, HEAVY_CONF, trigger_step=True)
+    history = ChanHistory(checkpoint_interval=16)
+    full_state = {}
+    for step, snapshot in enumerate(chan.step_load()):
+        history.record(snapshot)
+        if step % 7 == 0:
+            full_state[step] = chan_state(snapshot)
+    full_state[len(history) - 1] = chan_state(chan)
+    for step, state in full_state.items():
+        assert history[step].levels == state.levels, step
+        assert history[step].step == step
+    # 数据够长，线段级别的记录也要覆盖到
+    assert any(len(getattr(state, seg_field)) > 0 for state in history[-1].levels.values())
+    assert sum(len(history.klu_lst[lv]) for lv in lv_list) == sum(len(list(chan[lv].klu_iter())) for lv in lv_list)
+
+
+def test_history_step_out_of_range(synthetic_code, make_chan):
+    chan = make_chan(synthetic_code([KL_TYPE.K_5M], 2), [KL_TYPE.K_5M], trigger_step=True)
+    history = ChanHistory()
+    for snapshot in chan.step_load():
+        history.record(snapshot)
+    assert history[-1].levels == history[len(history) - 1].levels
+    with pytest.raises(ChanException):
+        history[len(history)]
+    with pytest.raises(ChanException):
+        ChanHistory(checkpoint_interval=0)
+
+
+@pytest.mark.parametrize("skip_step", [1, 200, 1439, 5000])
+@pytest.mark.parametrize("conf", [HEAVY_CONF, {"array_store": True}])
+def test_skip_step_batch_same_as_skip_step(synthetic_code, make_chan, skip_step, conf):
+    # skip_step_batch先按非逐步方式算完前skip_step根K线，之后每一步都和逐步计算一致
+    code = synthetic_code([KL_TYPE.K_5M], 30)
+    res = []
+    for skip_step_batch in [False, True]:
+        chan = make_chan(code, [KL_TYPE.K_5M], conf, trigger_step=True, skip_step=skip_step, skip_step_batch=skip_step_batch)
+        history = ChanHistory()
+        for snapshot in chan.step_load():
+            history.record(snapshot)
+        res.append(([history[step].levels for step in range(len(history))], chan_metric(chan)))
+    (state_lst, metric), (batch_state_lst, batch_metric) = res
+    assert len(batch_state_lst) == len(state_lst)
+    for step, (batch_state, state) in enumerate(zip(batch_state_lst, state_lst)):
+        assert batch_state == state, step
+    assert_metric_close(batch_metric[KL_TYPE.K_5M], metric[KL_TYPE.K_5M])
@@ -0,0 +1,66 @@
+import os
+
+import pytest
+
+from benchmarks.synthetic import gen_kl_dict
+from common.enums import DATA_FIELD, KL_TYPE
+from data_api import csv_api
+from data_api.csv_api import CSV_API
+
+TIME_FORMAT = {
+    10: "{t.year:04}-{t.month:02}-{t.day:02}",
+    17: "{t.year:04}{t.month:02}{t.day:02}{t.hour:02}{t.minute:02}00000",
+    19: "{t.year:04}-{t.month:02}-{t.day:02} {t.hour:02}:{t.minute:02}:00",
+}
+
+DATE_RANGE = [
+    (None, None),
+    ("2010-02-01", "2010-02-05"),  # 只给日期的end
+    ("2010-02-01", None),
+    (None, "20100203"),
+    ("20100201000000000", "20100203093100000"),  # 17位紧凑格式
+    ("2010-02-01 10:00", "2010-02-03 10:00:00"),
+    ("2030-01-01", None),
+]
+
+
+def write_csv(tmp_path, name, k_type, width, shuffle=False, bad_volume=False):
+    kl_lst = gen_kl_dict([k_type], day_cnt=30, seed=1)[k_type]
+    if shuffle:
+        kl_lst = kl_lst[1::2] + kl_lst[::2]
+    lines = ["time,open,high,low,close,volume"]
+    for idx, kl in enumerate(kl_lst):
+        volume = "abc" if bad_volume and idx % 7 == 0 else kl[DATA_FIELD.FIELD_VOLUME]
+        time_str = TIME_FORMAT[width].format(t=kl[DATA_FIELD.FIELD_TIME])
+        lines.append(f"{time_str},{kl[DATA_FIELD.FIELD_OPEN]},{kl[DATA_FIELD.FIELD_HIGH]},{kl[DATA_FIELD.FIELD_LOW]},{kl[DATA_FIELD.FIELD_CLOSE]},{volume}")
+    (tmp_path / f"{name}_{k_type.name[2:].lower()}.csv").write_text("\n".join(lines) + "\n")
+    # CSV_API按 data_api/../{code}_{k_type}.csv 找文件
+    root = os.path.join(os.path.dirname(os.path.realpath(csv_api.__file__)), "..")
+    return os.path.relpath(str(tmp_path / name), root)
+
+
+def load(code, k_type, begin, end, bulk_load):
+    api = CSV_API(code, k_type, begin, end)
+    api.columns.append(DATA_FIELD.FIELD_VOLUME)
+    api.bulk_load = bulk_load
+    return [
+        (str(klu.time), klu.time.ts, klu.time.auto, klu.open, klu.high, klu.low, klu.close, klu.trade_info.metric)
+        for klu in api.get_kl_data()
+    ]
+
+
+@pytest.mark.parametrize("k_type, width", [(KL_TYPE.K_DAY, 10), (KL_TYPE.K_5M, 17), (KL_TYPE.K_5M, 19)])
+@pytest.mark.parametrize("shuffle, bad_volume", [(False, False), (True, False), (False, True)])
+def test_bulk_load_same_as_line_load(tmp_path, k_type, width, shuffle, bad_volume):
+    code = write_csv(tmp_path, "sample", k_type, width, shuffle, bad_volume)
+    for begin, end in DATE_RANGE:
+        assert load(code, k_type, begin, end, True) == load(code, k_type, begin, end, False), (begin, end)
+
+
+def test_bulk_load_column_count_error(tmp_path):
+    code = write_csv(tmp_path, "sample", KL_TYPE.K_DAY, 10)
+    path = tmp_path / "sample_day.csv"
+    path.write_text(path.read_text() + "2030-01-01,1,2\n")
+    for bulk_load in (True, False):
+        with pytest.raises(Exception, match="file format error"):
+            load(code, KL_TYPE.K_DAY, None, None, bulk_load)
@@ -0,0 +1,61 @@
+import numpy as np
+
+from benchmarks.synthetic import gen_kl_dict
+from common.ctime import CTime
+from common.enums import DATA_FIELD, KL_TYPE
+from data_api.local_cache_api import KL_CACHE_DTYPE_V1, LocalCacheApi, cache_file_path, load_kl_cache, save_kl_data, upgrade_kl_cache
+from kline.kline_unit import KLineUnit
+
+
+def make_klu_lst(auto):
+    res = []
+    for item in gen_kl_dict([KL_TYPE.K_DAY], day_cnt=20, seed=2)[KL_TYPE.K_DAY]:
+        t = item[DATA_FIELD.FIELD_TIME]
+        res.append(KLineUnit({**item, DATA_FIELD.FIELD_TIME: CTime(t.year, t.month, t.day, t.hour, t.minute, auto=auto)}))
+    return res
+
+
+def load(tmp_path, begin=None, end=None):
+    LocalCacheApi.cache_dir = str(tmp_path)
+    try:
+        api = LocalCacheApi("sample", KL_TYPE.K_DAY, begin, end)
+        return [
+            (str(klu.time), klu.time.ts, klu.time.auto, klu.open, klu.high, klu.low, klu.close, klu.trade_info.metric)
+            for klu in api.get_kl_data()
+        ]
+    finally:
+        LocalCacheApi.cache_dir = None
+
+
+def expected(klu_lst):
+    return [
+        (str(klu.time), klu.time.ts, klu.time.auto, klu.open, klu.high, klu.low, klu.close, klu.trade_info.metric)
+        for klu in klu_lst
+    ]
+
+
+def test_round_trip_time_auto(tmp_path):
+    for auto in [True, False]:
+        klu_lst = make_klu_lst(auto)
+        save_kl_data("sample", KL_TYPE.K_DAY, klu_lst, str(tmp_path))
+        assert load(tmp_path) == expected(klu_lst)
+
+
+def test_legacy_cache(tmp_path):
+    klu_lst = make_klu_lst(False)
+    save_kl_data("sample", KL_TYPE.K_DAY, klu_lst, str(tmp_path))
+    data = load_kl_cache("sample", KL_TYPE.K_DAY, str(tmp_path))
+    legacy = np.empty(len(data), dtype=KL_CACHE_DTYPE_V1)
+    for name in KL_CACHE_DTYPE_V1.names:
+        legacy[name] = data[name]
+    np.save(cache_file_path("sample", KL_TYPE.K_DAY, str(tmp_path)), legacy)
+
+    # 旧缓存没有time_auto，读取时按True处理
+    res = load(tmp_path, "2000-01-01")
+    assert [row[2] for row in res] == [True] * len(klu_lst)
+    assert [row[3:] for row in res] == [row[3:] for row in expected(klu_lst)]
+
+    # 合并写入后升级为新格式
+    save_kl_data("sample", KL_TYPE.K_DAY, klu_lst[-3:], str(tmp_path))
+    assert load_kl_cache("sample", KL_TYPE.K_DAY, str(tmp_path)).dtype == upgrade_kl_cache(legacy).dtype
+    assert [row[2] for row in load(tmp_path)] == [True] * (len(klu_lst) - 3) + [False] * 3